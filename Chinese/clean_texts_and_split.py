@@ -1,7 +1,23 @@
-import pdfplumber
+import argparse
+import itertools
 import os
 import re
+import sys
+import time
 import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_layout import layout_engine
+from pdf_layout.page_cache import (
+    DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, PageLayoutCache,
+    file_sha256, iter_page_geometry, print_peak_rss,
+)
+from pdf_layout.layout_profile import DEFAULT_PROFILE_DIR, LayoutProfiler, load_profile, save_profile
+from pdf_layout.build_manifest import BuildManifest, write_if_changed
+from pdf_layout.pdf_backend import BACKENDS
+from pdf_layout.catalog import DEFAULT_CATALOG_PATH, zh_rules
 
 # 抑制 pdfminer.pdffont 的警告訊息
 logging.getLogger('pdfminer.pdffont').setLevel(logging.ERROR)
@@ -10,40 +26,38 @@ logging.getLogger('pdfminer.pdffont').setLevel(logging.ERROR)
 # 1. 配置區域 (Configuration)
 # ==========================================
 
-# 段落間距閾值 (已確認)
+# 段落間距閾值 (已確認；有版面 profile 時改用 profile 推算的值)
 GAP_THRESHOLD = 10
 
-# 特殊檔案內容處理 (不提取，直接寫入)
-# Key: 檔名開頭 (前三碼), Value: (完整檔名識別用, 硬編碼內容)
-SPECIAL_CONTENT_RULES = {
-    "022": ("022_搞砸婚禮的當天", "今天是星期天。現在是凌晨一點。這意味著搞砸婚禮的那天已經過去了,新的一天開始了。")
-}
+# 相鄰 word 的 top 差距小於此值視為同一行
+LINE_TOP_TOLERANCE = 5
 
-# 去除開頭段落數規則
-# Key: 檔名開頭 (前三碼), Value: 去除的段落數量
-SKIP_PARAGRAPH_RULES = {
-    # 去除 6 段
-    "001": 6,
+# extract_words 參數
+WORD_PARAMS = {"x_tolerance": 5, "y_tolerance": 3, "keep_blank_chars": False}
 
-    # 去除 3 段
-    "015": 3, "017": 3, "024": 3, "030": 3, "032": 3, "035": 3, "038": 3,
+# PDF 解析方式 (見 pdf_layout/pdf_backend.py)："pdfplumber" 為基準，"pdfium" 較快
+PDF_BACKEND = "pdfplumber"
 
-    # 去除 5 段 (除了上述規則外的預設值也是 5，但 036 明確指定了)
-    "036": 5
-}
+# 這本書的清理規則 (特殊檔案內容、去除開頭段落數) 只記錄在 catalog.json 的 editions.zh.rules，
+# 格式見 pdf_layout/catalog.py 的 EMPTY_BOOK_RULES。直接執行本檔時使用 DEFAULT_BOOK_ID 這本書的規則
+DEFAULT_BOOK_ID = "trust_no_one"
+DEFAULT_BOOK_RULES = zh_rules(DEFAULT_BOOK_ID)
 
-# 預設去除段落數 (其餘檔案)
-DEFAULT_SKIP_COUNT = 5
+# 提取程式版本：修改段落 / 頁碼判斷邏輯 (非上方設定值) 時要 +1，
+# 輸出資料夾 manifest.json 記錄的舊輸出會全部重建
+EXTRACTOR_VERSION = 1
 
 # ==========================================
 # 2. 核心功能函數
 # ==========================================
 
-def extract_chinese_by_spacing_filtered(pdf_path, paragraph_gap_threshold=10):
+def iter_chinese_paragraphs(pdf_path, paragraph_gap_threshold=10, cache=None, profiler=None, backend=PDF_BACKEND):
     """
-    提取中文段落，並去除頁碼 (n/m 格式)
+    提取中文段落，並去除頁碼 (n/m 格式)；段落一完成就 yield，記憶體用量與檔案長度無關
+    cache: PageLayoutCache，有給時頁面幾何從快取讀取，調整 GAP_THRESHOLD 後重跑不需要重新解析 PDF
+    profiler: LayoutProfiler，有給時順便累積版面直方圖
+    backend: PDF 解析方式 (見 PDF_BACKEND)
     """
-    all_paragraphs = []
     buffer_paragraph = ""
     prev_line_bottom = None
 
@@ -51,130 +65,358 @@ def extract_chinese_by_spacing_filtered(pdf_path, paragraph_gap_threshold=10):
     # 例如: "1/200", "1 / 200", "15/30"
     page_num_pattern = re.compile(r'^\d+\s*/\s*\d+$')
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            words = page.extract_words(x_tolerance=5, y_tolerance=3, keep_blank_chars=False)
-
-            if not words: continue
-
-            # --- 過濾頁碼邏輯 ---
-            # 策略：檢查頁面最底部(最後幾個物件)是否符合頁碼格式
-            # 為了保險，我們過濾掉所有單獨成行且符合 n/m 格式的文字
-            filtered_words = []
-            for w in words:
-                text = w['text'].strip()
-                # 如果該字串完全符合頁碼格式，則跳過 (視為頁碼)
-                if page_num_pattern.match(text):
-                    continue
-                filtered_words.append(w)
-            words = filtered_words
-
-            if not words: continue
-            # ------------------
-
-            # 組裝行 (Lines)
-            lines = []
-            current_line_words = [words[0]]
-            for word in words[1:]:
-                if abs(word['top'] - current_line_words[-1]['top']) < 5:
-                    current_line_words.append(word)
-                else:
-                    lines.append(current_line_words)
-                    current_line_words = [word]
-            lines.append(current_line_words)
-
-            # 逐行分析間距 (Gap)
-            for line_words in lines:
-                line_text = "".join([w['text'] for w in line_words])
-                line_top = min([w['top'] for w in line_words])
-                line_bottom = max([w['bottom'] for w in line_words])
-
-                is_new_paragraph = False
-
-                if prev_line_bottom is not None:
-                    gap = line_top - prev_line_bottom
-                    if gap > paragraph_gap_threshold:
-                        is_new_paragraph = True
-
-                if is_new_paragraph:
-                    if buffer_paragraph:
-                        all_paragraphs.append(buffer_paragraph)
-                    buffer_paragraph = line_text
-                else:
-                    buffer_paragraph += line_text
-
-                prev_line_bottom = line_bottom
-
-            prev_line_bottom = None # 換頁重置
+    for _, geometry in iter_page_geometry(pdf_path, WORD_PARAMS, cache, backend=backend):
+        if profiler:
+            profiler.add_page(geometry)
+        words = geometry['words']
+
+        if not words: continue
+
+        # --- 過濾頁碼邏輯 ---
+        # 策略：檢查頁面最底部(最後幾個物件)是否符合頁碼格式
+        # 為了保險，我們過濾掉所有單獨成行且符合 n/m 格式的文字
+        filtered_words = []
+        for w in words:
+            text = w['text'].strip()
+            # 如果該字串完全符合頁碼格式，則跳過 (視為頁碼)
+            if page_num_pattern.match(text):
+                continue
+            filtered_words.append(w)
+        words = filtered_words
+
+        if not words: continue
+        # ------------------
+
+        # 組裝行 (Lines)：相鄰 word 的 top 差距 < LINE_TOP_TOLERANCE 視為同一行
+        lines = [words[start:end] for start, end in layout_engine.group_lines(words, LINE_TOP_TOLERANCE)]
+
+        # 逐行分析間距 (Gap)
+        for line_words in lines:
+            line_text = "".join([w['text'] for w in line_words])
+            line_top = min([w['top'] for w in line_words])
+            line_bottom = max([w['bottom'] for w in line_words])
+
+            is_new_paragraph = False
+
+            if prev_line_bottom is not None:
+                gap = line_top - prev_line_bottom
+                if gap > paragraph_gap_threshold:
+                    is_new_paragraph = True
+
+            if is_new_paragraph:
+                if buffer_paragraph:
+                    yield buffer_paragraph
+                buffer_paragraph = line_text
+            else:
+                buffer_paragraph += line_text
+
+            prev_line_bottom = line_bottom
+
+        prev_line_bottom = None # 換頁重置
 
     if buffer_paragraph:
-        all_paragraphs.append(buffer_paragraph)
+        yield buffer_paragraph
 
-    return all_paragraphs
+def extract_chinese_by_spacing_filtered(pdf_path, paragraph_gap_threshold=10, cache=None, backend=PDF_BACKEND):
+    """
+    提取中文段落，並去除頁碼 (n/m 格式)
+    回傳: 整份檔案的段落 list (iter_chinese_paragraphs 的 list 版)
+    """
+    return list(iter_chinese_paragraphs(pdf_path, paragraph_gap_threshold, cache, backend=backend))
 
-def get_skip_count(filename):
+def get_skip_count(filename, book_rules=None):
     """根據檔名決定要跳過前幾個段落"""
+    book_rules = book_rules or DEFAULT_BOOK_RULES
     prefix = filename[:3] # 取得前三碼 (例如 "015")
 
-    if prefix in SKIP_PARAGRAPH_RULES:
-        return SKIP_PARAGRAPH_RULES[prefix]
+    if prefix in book_rules["skip_paragraphs"]:
+        return book_rules["skip_paragraphs"][prefix]
 
-    return DEFAULT_SKIP_COUNT
+    return book_rules["default_skip"]
 
-def process_all_files(INPUT_FOLDER,OUTPUT_FOLDER):
+def is_special_file(filename, book_rules=None):
+    """是否為直接寫入指定內容的特殊檔案 (不需要提取)"""
+    special_rules = (book_rules or DEFAULT_BOOK_RULES)["special_content"]
+    prefix = filename[:3]
+    return prefix in special_rules and special_rules[prefix][0] in filename
 
-    # 取得 PDF 檔案列表並排序
+def iter_file_paragraphs(filename, INPUT_FOLDER, cache=None, logs=None, gap_threshold=GAP_THRESHOLD, profiler=None,
+                         book_rules=None, backend=PDF_BACKEND):
+    """
+    串流 API：依特殊檔案內容 / 去除開頭段落規則，
+    邊解析邊 yield (章節 id, 段落)，章節 id 即輸出檔名 (去除 .pdf)。
+    logs: 有給 list 時，處理訊息會 append 進去 (全部段落 yield 完後才會有統計訊息)
+    book_rules: 這本書的規則 (格式同 DEFAULT_BOOK_RULES)，None 代表使用 DEFAULT_BOOK_RULES
+    """
+    logs = [] if logs is None else logs
+    book_rules = book_rules or DEFAULT_BOOK_RULES
+    special_rules = book_rules["special_content"]
+
+    prefix = filename[:3]
+    file_base_name = os.path.splitext(filename)[0] # 去除 .pdf
+    pdf_path = os.path.join(INPUT_FOLDER, filename)
+
+    # --- 規則 A: 特殊檔案直接寫入 ---
+    if prefix in special_rules:
+        # 確認檔名是否包含特定關鍵字 (多重確認)
+        target_name_part = special_rules[prefix][0]
+        if target_name_part in filename:
+            content = special_rules[prefix][1]
+            logs.append(f"[{filename}] -> 特殊檔案，寫入指定內容")
+            yield file_base_name, content
+            return
+        # 如果編號是 022 但檔名不對，則走一般流程(或報錯)，這裡假設走一般流程
+        logs.append(f"[{filename}] -> 編號特殊但檔名不匹配，走一般流程")
+        skip_n = get_skip_count(filename, book_rules)
+        for p in itertools.islice(iter_chinese_paragraphs(pdf_path, gap_threshold, cache, profiler, backend), skip_n, None):
+            yield file_base_name, p
+        return
+
+    # --- 規則 B: 一般檔案提取並刪減 ---
+    # 1. 決定去除行數
+    skip_n = get_skip_count(filename, book_rules)
+
+    # 2. 提取段落 (含去除頁碼功能)，並去除前 skip_n 段
+    n_raw = 0
+    for p in iter_chinese_paragraphs(pdf_path, gap_threshold, cache, profiler, backend):
+        n_raw += 1
+        if n_raw > skip_n:
+            yield file_base_name, p
+
+    if n_raw <= skip_n:
+        # 如果段落數少於要去除的數量，則寫入空檔或保留最後一段(視需求)
+        # 這裡設定為寫入空內容
+        logs.append(f"Warning: [{filename}] 段落數 ({n_raw}) 少於需去除數 ({skip_n})")
+
+    logs.append(f"[{filename}] -> 去除前 {skip_n} 段 (原始 {n_raw} -> 剩餘 {max(0, n_raw - skip_n)})")
+
+def list_pdf_files(INPUT_FOLDER):
+    """取得 PDF 檔案列表並排序 (確保依照數字順序處理)"""
     pdf_files = [f for f in os.listdir(INPUT_FOLDER) if f.lower().endswith('.pdf')]
-    pdf_files.sort() # 確保依照數字順序處理
+    pdf_files.sort()
+    return pdf_files
 
-    print(f"找到 {len(pdf_files)} 個 PDF 檔案，開始處理...\n")
+def resolve_gap_threshold(INPUT_FOLDER, pdf_files, cache=None, profile_dir=DEFAULT_PROFILE_DIR, book_rules=None,
+                          backend=PDF_BACKEND):
+    """
+    以版面 profile 推算段落間距閾值。profile 逐檔儲存，推算時合併整本書 (資料夾) 的直方圖，
+    避免只有幾頁的短章節資料不足：
+    - 已儲存的 profile 直接使用
+    - 沒有 profile 但有頁面快取 -> 逐頁累積 (解析結果寫入快取，主流程直接讀快取，不會解析第二次)
+    - 仍有檔案缺 profile -> 本次使用 GAP_THRESHOLD，主流程順便累積 profile 供下次使用
+    回傳: (段落間距閾值, 主流程是否需要累積 profile)
+    """
+    book_profiler = LayoutProfiler(LINE_TOP_TOLERANCE)
+    missing = 0
 
     for filename in pdf_files:
-        prefix = filename[:3]
-        file_base_name = os.path.splitext(filename)[0] # 去除 .pdf
-        output_path = os.path.join(OUTPUT_FOLDER, f"{file_base_name}.txt")
+        if is_special_file(filename, book_rules):
+            continue
         pdf_path = os.path.join(INPUT_FOLDER, filename)
+        pdf_hash = file_sha256(pdf_path)
+        profiler = load_profile(pdf_hash, WORD_PARAMS, profile_dir, backend)
+        if profiler is None and cache is not None:
+            profiler = LayoutProfiler(LINE_TOP_TOLERANCE)
+            for _, geometry in iter_page_geometry(pdf_path, WORD_PARAMS, cache, None, pdf_hash, backend=backend):
+                profiler.add_page(geometry)
+            save_profile(pdf_hash, WORD_PARAMS, profiler, profile_dir, backend)
+        if profiler is None:
+            missing += 1
+            continue
+        book_profiler.merge(profiler)
+
+    if missing:
+        print(f"預設段落間距閾值: {GAP_THRESHOLD} ({missing} 個檔案尚無版面 profile，本次處理時建立)")
+        return GAP_THRESHOLD, True
+
+    derived = book_profiler.derive()
+    gap_threshold = derived["gap_threshold"] or GAP_THRESHOLD
+    print(f"版面 profile: 行距 {derived['line_gap']}，段距 {derived['paragraph_gap']}，段落間距閾值 {gap_threshold}")
+    return gap_threshold, False
+
+def get_file_rules(filename, gap_threshold, book_rules=None, backend=PDF_BACKEND):
+    """影響單一檔案輸出的所有規則值 (寫入 manifest，任一項改變該檔就會重建)"""
+    book_rules = book_rules or DEFAULT_BOOK_RULES
+    return {
+        "gap_threshold": gap_threshold,
+        "line_top_tolerance": LINE_TOP_TOLERANCE,
+        "word_params": WORD_PARAMS,
+        "skip_count": get_skip_count(filename, book_rules),
+        "special_content": book_rules["special_content"].get(filename[:3]),
+        "backend": backend,
+    }
+
+def iter_book_paragraphs(INPUT_FOLDER, cache=None, gap_threshold=GAP_THRESHOLD, book_rules=None, backend=PDF_BACKEND):
+    """
+    串流 API：依檔名順序 yield 整本書的 (章節 id, 段落)
+    """
+    for filename in list_pdf_files(INPUT_FOLDER):
+        yield from iter_file_paragraphs(filename, INPUT_FOLDER, cache, gap_threshold=gap_threshold,
+                                        book_rules=book_rules, backend=backend)
 
-        paragraphs_to_write = []
+def process_single_file(filename, INPUT_FOLDER, OUTPUT_FOLDER, cache=None, gap_threshold=GAP_THRESHOLD, profile_dir=None,
+                        previous_digest=None, book_rules=None, backend=PDF_BACKEND):
+    """
+    處理單一 PDF 並寫出對應 .txt (iter_file_paragraphs 的寫檔端)。
+    各檔案互相獨立，可在不同 process 中執行；
+    log 以 list 回傳，由呼叫端依檔名順序印出。
+    profile_dir: 有給時順便累積這個檔案的版面 profile 並儲存
+    previous_digest: manifest 記錄的上次輸出內容 hash，內容相同時保留原檔
+    回傳: (log 訊息 list, CPU 耗時秒數, 輸出內容 hash)
+    """
+    # 用 CPU time 而非 wall time，避免多個 process 搶同一顆核心時高估
+    start_time = time.process_time()
+    logs = []
 
-        # --- 規則 A: 特殊檔案直接寫入 ---
-        if prefix in SPECIAL_CONTENT_RULES:
-            # 確認檔名是否包含特定關鍵字 (多重確認)
-            target_name_part = SPECIAL_CONTENT_RULES[prefix][0]
-            if target_name_part in filename:
-                content = SPECIAL_CONTENT_RULES[prefix][1]
-                paragraphs_to_write = [content]
-                print(f"[{filename}] -> 特殊檔案，寫入指定內容")
-            else:
-                # 如果編號是 022 但檔名不對，則走一般流程(或報錯)，這裡假設走一般流程
-                print(f"[{filename}] -> 編號特殊但檔名不匹配，走一般流程")
-                raw_paragraphs = extract_chinese_by_spacing_filtered(pdf_path, GAP_THRESHOLD)
-                skip_n = get_skip_count(filename)
-                paragraphs_to_write = raw_paragraphs[skip_n:]
+    file_base_name = os.path.splitext(filename)[0] # 去除 .pdf
+    output_path = os.path.join(OUTPUT_FOLDER, f"{file_base_name}.txt")
+    profiler = LayoutProfiler(LINE_TOP_TOLERANCE) if profile_dir and not is_special_file(filename, book_rules) else None
 
-        # --- 規則 B: 一般檔案提取並刪減 ---
-        else:
-            # 1. 提取段落 (含去除頁碼功能)
-            raw_paragraphs = extract_chinese_by_spacing_filtered(pdf_path, GAP_THRESHOLD)
+    # --- 寫入檔案 (一行一段，邊提取邊寫) ---
+    lines = (p + "\n" for _, p in iter_file_paragraphs(filename, INPUT_FOLDER, cache, logs, gap_threshold, profiler,
+                                                             book_rules, backend))
+    digest, written = write_if_changed(output_path, lines, previous_digest)
+    if not written:
+        logs.append(f"[{filename}] -> 輸出內容與上次相同，保留原檔")
 
-            # 2. 決定去除行數
-            skip_n = get_skip_count(filename)
+    if profiler:
+        save_profile(file_sha256(os.path.join(INPUT_FOLDER, filename)), WORD_PARAMS, profiler, profile_dir,
+                     backend)
 
-            # 3. 執行去除 (Slicing)
-            if len(raw_paragraphs) > skip_n:
-                paragraphs_to_write = raw_paragraphs[skip_n:]
-            else:
-                # 如果段落數少於要去除的數量，則寫入空檔或保留最後一段(視需求)
-                # 這裡設定為寫入空內容
-                paragraphs_to_write = []
-                print(f"Warning: [{filename}] 段落數 ({len(raw_paragraphs)}) 少於需去除數 ({skip_n})")
+    return logs, time.process_time() - start_time, digest
+
+def _process_single_file_worker(args):
+    """
+    Worker 入口：子 process 中同樣抑制 pdfminer 警告，並自行建立快取物件
+    回傳: (log 訊息 list, CPU 耗時秒數, 輸出內容 hash, 快取命中數, 快取未命中數)
+    """
+    logging.getLogger('pdfminer.pdffont').setLevel(logging.ERROR)
+    (filename, INPUT_FOLDER, OUTPUT_FOLDER, cache_dir, cache_max_bytes, gap_threshold, profile_dir,
+     previous_digest, book_rules, backend) = args
+    cache = PageLayoutCache(cache_dir, cache_max_bytes) if cache_dir else None
+    logs, file_time, digest = process_single_file(filename, INPUT_FOLDER, OUTPUT_FOLDER, cache, gap_threshold,
+                                                  profile_dir, previous_digest, book_rules, backend)
+    if cache is None:
+        return logs, file_time, digest, 0, 0
+    return logs, file_time, digest, cache.hits, cache.misses
+
+def process_all_files(INPUT_FOLDER,OUTPUT_FOLDER,workers=1,cache=None,use_profile=True,force=False,book_rules=None,
+                      backend=PDF_BACKEND):
+    """
+    workers > 1 時將檔案分給 process pool 平行處理，
+    log 仍依檔名排序印出，並回報相對於序列執行的加速比。
+    cache: PageLayoutCache，有給時頁面幾何從快取讀取
+    use_profile: 段落間距閾值由版面 profile 自動推算 (見 resolve_gap_threshold)
+    force: 忽略 OUTPUT_FOLDER/manifest.json，全部重建 (預設只重建輸入或規則有變動的檔案)
+    book_rules: 這本書的規則 (格式同 DEFAULT_BOOK_RULES)，None 代表使用 DEFAULT_BOOK_RULES
+    backend: PDF 解析方式，"pdfium" 比 pdfplumber 快很多，輸出一致率見 pdf_layout/benchmark.py
+    回傳: 本次實際處理的檔名 list (已是最新而跳過的不算)
+    """
 
-            print(f"[{filename}] -> 去除前 {skip_n} 段 (原始 {len(raw_paragraphs)} -> 剩餘 {len(paragraphs_to_write)})")
+    # 取得 PDF 檔案列表並排序
+    pdf_files = list_pdf_files(INPUT_FOLDER)
+
+    print(f"找到 {len(pdf_files)} 個 PDF 檔案，開始處理...\n")
 
-        # --- 寫入檔案 (一行一段) ---
-        with open(output_path, "w", encoding="utf-8") as f:
-            for p in paragraphs_to_write:
-                f.write(p + "\n")
+    gap_threshold, collect_profile = GAP_THRESHOLD, False
+    if use_profile:
+        gap_threshold, collect_profile = resolve_gap_threshold(INPUT_FOLDER, pdf_files, cache,
+                                                               book_rules=book_rules, backend=backend)
+    profile_dir = DEFAULT_PROFILE_DIR if collect_profile else None
+
+    # --- 比對 manifest，只處理輸入 / 規則 / 提取程式版本有變動的檔案 ---
+    manifest = BuildManifest(OUTPUT_FOLDER)
+    pdf_hashes = {filename: file_sha256(os.path.join(INPUT_FOLDER, filename)) for filename in pdf_files}
+    file_rules = {filename: get_file_rules(filename, gap_threshold, book_rules, backend)
+                  for filename in pdf_files}
+    todo_files = []
+    for filename in pdf_files:
+        if not force and manifest.is_up_to_date(filename, pdf_hashes[filename], file_rules[filename], EXTRACTOR_VERSION):
+            print(f"[{filename}] -> 輸入與規則皆未變更，跳過")
+        else:
+            todo_files.append(filename)
+    if len(todo_files) < len(pdf_files):
+        print(f"共跳過 {len(pdf_files) - len(todo_files)} 個已是最新的檔案，需處理 {len(todo_files)} 個\n")
+
+    def record(filename, digest):
+        txt_name = f"{os.path.splitext(filename)[0]}.txt"
+        manifest.record(filename, pdf_hashes[filename], file_rules[filename], EXTRACTOR_VERSION, {txt_name: digest})
+
+    def previous_digest(filename):
+        return manifest.output_digests(filename).get(f"{os.path.splitext(filename)[0]}.txt")
+
+    start_time = time.perf_counter()
+    total_file_time = 0.0
+
+    if workers > 1:
+        cache_dir = cache.cache_dir if cache else None
+        cache_max_bytes = cache.max_bytes if cache else None
+        tasks = [(filename, INPUT_FOLDER, OUTPUT_FOLDER, cache_dir, cache_max_bytes, gap_threshold, profile_dir,
+                  previous_digest(filename), book_rules, backend)
+                 for filename in todo_files]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # executor.map 依提交順序回傳，log 順序與序列模式相同
+            results = executor.map(_process_single_file_worker, tasks)
+            for filename, (logs, file_time, digest, hits, misses) in zip(todo_files, results):
+                for line in logs:
+                    print(line)
+                total_file_time += file_time
+                record(filename, digest)
+                if cache:
+                    cache.hits += hits
+                    cache.misses += misses
+    else:
+        for filename in todo_files:
+            logs, file_time, digest = process_single_file(filename, INPUT_FOLDER, OUTPUT_FOLDER, cache, gap_threshold,
+                                                          profile_dir, previous_digest(filename), book_rules, backend)
+            for line in logs:
+                print(line)
+            total_file_time += file_time
+            record(filename, digest)
+
+    manifest.prune(pdf_files)
+    manifest.save()
+
+    wall_time = time.perf_counter() - start_time
+    if todo_files:
+        # 各檔案 CPU 耗時總和只是序列執行時間的估計 (不含 I/O 等待)，實測請用 compare_with_serial (--compare-serial)
+        print(f"\n耗時 {wall_time:.1f} 秒 (workers={workers}，backend={backend}，"
+              f"各檔 CPU 時間總和 {total_file_time:.1f} 秒，估計加速比 {total_file_time / wall_time:.2f}x)")
+        print_peak_rss(f"[{os.path.basename(os.path.normpath(INPUT_FOLDER))}]", with_workers=workers > 1)
+
+    if cache:
+        cache.evict()
+        cache.print_stats()
+
+    return todo_files
+
+def compare_with_serial(INPUT_FOLDER, workers, use_profile=True, book_rules=None, backend=PDF_BACKEND):
+    """
+    實測加速比：同一批檔案各以序列 (workers=1) 與 workers 個 process 完整重建一次 (輸出到暫存資料夾)，
+    比較 wall time 並確認兩邊輸出檔完全相同。
+    兩次都不使用頁面快取，避免先跑的那次把快取填好、後跑的那次佔便宜
+    """
+    wall_times = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_folders = {}
+        for n_workers in (1, workers):
+            output_folders[n_workers] = os.path.join(tmp_dir, f"workers_{n_workers}")
+            os.mkdir(output_folders[n_workers])
+            start_time = time.perf_counter()
+            process_all_files(INPUT_FOLDER, output_folders[n_workers], workers=n_workers, cache=None,
+                              use_profile=use_profile, force=True, book_rules=book_rules, backend=backend)
+            wall_times[n_workers] = time.perf_counter() - start_time
+
+        txt_names = sorted(name for name in os.listdir(output_folders[1]) if name.endswith(".txt"))
+        n_identical = 0
+        for txt_name in txt_names:
+            with open(os.path.join(output_folders[1], txt_name), "rb") as f1, \
+                 open(os.path.join(output_folders[workers], txt_name), "rb") as f2:
+                n_identical += f1.read() == f2.read()
+
+    print(f"\n[實測] 序列 {wall_times[1]:.1f} 秒 -> workers={workers} {wall_times[workers]:.1f} 秒，"
+          f"加速比 {wall_times[1] / wall_times[workers]:.2f}x，輸出檔完全相同 {n_identical}/{len(txt_names)}")
+    return wall_times
 
 # ==========================================
 # 3. 執行
@@ -182,13 +424,36 @@ def process_all_files(INPUT_FOLDER,OUTPUT_FOLDER):
 
 if __name__ == "__main__":
     # 請確保當前目錄下有 'input_pdfs' 資料夾並放入 PDF
+    parser = argparse.ArgumentParser(description="提取中文 PDF 段落並輸出 .txt")
+    parser.add_argument("--input", default=r"/paul-cleavedata/BOOK/PAUL CLEAVE_ZH")
+    parser.add_argument("--output", default="output_text_ZH")
+    parser.add_argument("--workers", type=int, default=1, help="平行處理檔案的 process 數 (1 = 序列模式)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="頁面幾何快取資料夾")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2)
+    parser.add_argument("--no-cache", action="store_true", help="不使用頁面快取，每次都重新解析 PDF")
+    parser.add_argument("--no-profile", action="store_true", help="不使用版面 profile，固定使用 GAP_THRESHOLD")
+    parser.add_argument("--force", action="store_true", help="忽略 manifest，全部檔案重新產生")
+    parser.add_argument("--backend", default=PDF_BACKEND, choices=BACKENDS, help="PDF 解析方式")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH, help="清理規則所在的書目檔")
+    parser.add_argument("--book", default=DEFAULT_BOOK_ID, help="使用書目檔中這本書的 ZH 清理規則")
+    parser.add_argument("--compare-serial", action="store_true",
+                        help="處理完後另外以序列與 --workers 各完整重建一次 (暫存資料夾、不用快取)，印出實測加速比")
+    args = parser.parse_args()
+
+    book_rules = zh_rules(args.book, args.catalog)
+    cache = None if args.no_cache else PageLayoutCache(args.cache_dir, int(args.cache_max_mb * 1024 ** 2))
 
     # 輸入與輸出資料夾
-    INPUT_FOLDER = r"/paul-cleavedata/BOOK/PAUL CLEAVE_ZH"
-    OUTPUT_FOLDER = "output_text_ZH" # 輸出的 TXT 資料夾名稱
+    INPUT_FOLDER = args.input
+    OUTPUT_FOLDER = args.output # 輸出的 TXT 資料夾名稱
 
     if not os.path.exists(OUTPUT_FOLDER):
         os.mkdir(OUTPUT_FOLDER)
     
-    process_all_files(INPUT_FOLDER,OUTPUT_FOLDER)
-    print("\n所有檔案處理完成！")
\ No newline at end of file
+    process_all_files(INPUT_FOLDER,OUTPUT_FOLDER,workers=args.workers,cache=cache,use_profile=not args.no_profile,force=args.force,
+                      book_rules=book_rules,backend=args.backend)
+    print("\n所有檔案處理完成！")
+
+    if args.compare_serial:
+        compare_with_serial(INPUT_FOLDER, args.workers, use_profile=not args.no_profile, book_rules=book_rules,
+                            backend=args.backend)
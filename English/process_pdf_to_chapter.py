@@ -1,15 +1,51 @@
-import pdfplumber
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+import itertools
+import argparse
 import re
 import os
+import sys
+import time
 import logging
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_layout import layout_engine
+from pdf_layout.page_cache import (
+    DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, PageLayoutCache,
+    file_sha256, get_page_count, iter_page_geometry, print_peak_rss,
+)
+from pdf_layout.layout_profile import DEFAULT_PROFILE_DIR, PROFILE_VERSION, LayoutProfiler, load_profile, save_profile
+from pdf_layout.build_manifest import BuildManifest, write_if_changed
+from pdf_layout.pdf_backend import BACKENDS
+
 # 抑制 pdfminer.pdffont 的警告訊息
 logging.getLogger('pdfminer.pdffont').setLevel(logging.ERROR)
 
-# 設定字體大小閾值
+# 設定字體大小閾值 (預設值；有版面 profile 時改用 profile 推算的值)
 FONT_SIZE_THRESHOLD = 15
 
+# 相鄰 word 的 top 差距小於此值視為同一行
+LINE_TOP_TOLERANCE = 10
+
+# 左邊界偵測使用的頁面範圍 (跳過書名頁、目錄等)，只在沒有版面 profile 時使用
+MARGIN_SCAN_PAGES = slice(4, 18)
+
+# extract_words 參數：內文提取 / 左邊界偵測 (pdfplumber 預設值)
+CONTENT_WORD_PARAMS = {"x_tolerance": 3, "y_tolerance": 6}
+MARGIN_WORD_PARAMS = {}
+
+# 低記憶體模式：每 PAGE_WINDOW 頁重新開啟一次 PDF (None = 整份只開一次)，
+# 合輯等超長 PDF 可設 50 左右，峰值記憶體不再隨頁數成長
+PAGE_WINDOW = None
+
+# PDF 解析方式 (見 pdf_layout/pdf_backend.py)："pdfplumber" 為基準，"pdfium" 較快
+PDF_BACKEND = "pdfplumber"
+
+# 提取程式版本：修改標題 / 分段判斷邏輯 (非上方設定值) 時要 +1，
+# 輸出資料夾 manifest.json 記錄的舊輸出會全部重建
+EXTRACTOR_VERSION = 1
+
 def clean_filename(text):
     """
     清理標題以作為合法的檔名 (移除 / \ : * ? " < > |)
@@ -20,48 +56,57 @@ def clean_filename(text):
     text = text.replace("\n", " ").replace("\r", "")
     return text.strip()
 
-def get_chapter_header(page):
+def get_chapter_header(char_arrays, font_size_threshold=FONT_SIZE_THRESHOLD):
     """
-    掃描頁面，尋找連續大於 FONT_SIZE_THRESHOLD 的字元。
+    掃描頁面字元陣列 (layout_engine.chars_to_arrays)，尋找連續大於 font_size_threshold 的字元。
     回傳: (標題文字, 標題底端Y座標)
     如果沒找到，回傳 (None, 0)
     """
-    large_chars = [c for c in page.chars if c["size"] > FONT_SIZE_THRESHOLD]
+    # 找出這些大字元組成的文字，以及標題佔據的區域最底端 (bottom)，內文應從這裡之後開始
+    header_text, header_bottom = layout_engine.find_header(char_arrays, font_size_threshold)
 
-    if not large_chars:
+    if header_text is None:
         return None, 0
 
-    # 找出這些大字元組成的文字
-    header_text = "".join([c["text"] for c in large_chars])
-
-    # 找出標題佔據的區域最底端 (bottom)，內文應從這裡之後開始
-    # 我們取所有大字元中最大的 bottom 值
-    header_bottom = max([c["bottom"] for c in large_chars])
-
     return clean_filename(header_text), header_bottom
 
-def save_chapter(output_dir,filename, paragraphs):
+def save_chapter(output_dir,filename, paragraphs, previous_digest=None):
     """
     將段落寫入檔案，並過濾浮水印
+    paragraphs 可以是 list 或 generator (逐段寫入，不需要整章留在記憶體)，
+    沒有任何段落時不建立檔案
+    previous_digest: manifest 記錄的上次內容 hash，內容相同時保留原檔
+    回傳: 內容 hash (沒有段落時回傳 None)
     """
-    if not paragraphs:
-        return
+    full_path = os.path.join(output_dir, f"{filename}.txt")
+    paragraphs = iter(paragraphs)
+    first = next(paragraphs, None)
+    if first is None:
+        return None
 
     # 確保輸出目錄存在
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    full_path = os.path.join(output_dir, f"{filename}.txt")
+    n_paragraphs = 0
+
+    def iter_lines():
+        nonlocal n_paragraphs
+        for p in itertools.chain([first], paragraphs):
+            n_paragraphs += 1
 
-    with open(full_path, "w", encoding="utf-8") as f:
-        for p in paragraphs:
             # 任務要求：刪去內容字段 "OceanofPDF.com"
             clean_p = p.replace("OceanofPDF.com", "")
             # 如果刪除後只剩空白，則不寫入
             if clean_p.strip():
-                f.write(clean_p + "\n")
+                yield clean_p + "\n"
 
-    print(f"已儲存章節: {full_path} (段落數: {len(paragraphs)})")
+    digest, written = write_if_changed(full_path, iter_lines(), previous_digest)
+    if written:
+        print(f"已儲存章節: {full_path} (段落數: {n_paragraphs})")
+    else:
+        print(f"章節內容未變更，保留原檔: {full_path} (段落數: {n_paragraphs})")
+    return digest
 
 def is_new_paragraph_logic(line_obj, prev_line_obj, left_margin_mode, page_width):
     """
@@ -85,121 +130,354 @@ def is_new_paragraph_logic(line_obj, prev_line_obj, left_margin_mode, page_width
 
     return False
 
-def process_pdf_to_chapters(pdf_path,output_dir):
-    '''
-    使用方式
-    output_dir = "output_text_EN" 多個.txt
-    process_pdf_to_chapters("PAUL CLEAVE/Trust_No_One.pdf",output_dir)
-    '''
+def build_page_info(geometry, page_index, font_size_threshold=FONT_SIZE_THRESHOLD):
+    """
+    由單頁幾何 (chars / words，來自 PDF 或頁面快取) 建立版面資訊 (標題、內文行、頁寬)，
+    只依賴單頁內容，因此可以在不同 process 中平行執行。
+    回傳: dict，交給 iter_chapter_paragraphs() 依頁序合併
+    """
+    # 1.【軌道一】檢查是否有章節標題 (文字大小 > font_size_threshold)
+    header_text, header_bottom = get_chapter_header(layout_engine.chars_to_arrays(geometry['chars']), font_size_threshold)
+
+    # 2.【軌道二】提取內文 Words
+    # 關鍵：只提取 header_bottom 之後的文字，避免把標題重複抓進內文
+    words = geometry['words']
+
+    # 過濾掉標題區域的字 (只保留 top > header_bottom 的字)
+    # 加上一個小緩衝區 (+5) 避免切太齊
+    content_words = [w for w in words if w['top'] > header_bottom + 5]
+
+    # 3. 組裝行 (Lines)：相鄰 word 的 top 差距 < LINE_TOP_TOLERANCE 視為同一行
+    lines = [content_words[start:end] for start, end in layout_engine.group_lines(content_words, LINE_TOP_TOLERANCE)]
+
+    line_objs = []
+    for line in lines:
+        line_text = " ".join([w['text'] for w in line])
+
+        # 在這裡也可以先做一次簡單過濾，雖然 save_chapter 也會做
+        if "OceanofPDF.com" in line_text:
+            line_text = line_text.replace("OceanofPDF.com", "").strip()
+            if not line_text: continue
+
+        line_objs.append({'x0': line[0]['x0'], 'x1': line[-1]['x1'], 'text': line_text})
+
+    return {
+        'index': page_index,
+        'width': geometry['width'],
+        'header_text': header_text,
+        'lines': line_objs,
+    }
 
+def detect_left_margin(pdf_path, n_pages, cache=None, pdf_hash=None, page_window=None, backend=PDF_BACKEND):
+    """
+    全域左邊界偵測 (簡化版，只跑 MARGIN_SCAN_PAGES 範圍內的頁面)
+    """
+    starts = []
+    scan_pages = range(n_pages)[MARGIN_SCAN_PAGES]
+    for _, geometry in iter_page_geometry(pdf_path, MARGIN_WORD_PARAMS, cache, scan_pages, pdf_hash,
+                                              page_window=page_window, backend=backend):
+        words = geometry['words']
+        if words: starts.append(words[0]['x0'])
+    if starts:
+        return Counter([int(x) for x in starts]).most_common(1)[0][0]
+    return 0
+
+def _extract_page_chunk(pdf_path, start, end, cache_dir, cache_max_bytes, pdf_hash, font_size_threshold, collect_profile,
+                        page_window=None, backend=PDF_BACKEND):
+    """
+    Worker: 在子 process 中自行開啟 PDF (或讀取快取)，提取 [start, end) 頁的資訊
+    回傳: (頁面資訊 list, 快取命中數, 快取未命中數, 版面 profiler 或 None)
+    """
+    logging.getLogger('pdfminer.pdffont').setLevel(logging.ERROR)
+    cache = PageLayoutCache(cache_dir, cache_max_bytes) if cache_dir else None
+    profiler = LayoutProfiler(LINE_TOP_TOLERANCE) if collect_profile else None
+    infos = []
+    for i, geometry in iter_page_geometry(pdf_path, CONTENT_WORD_PARAMS, cache, range(start, end), pdf_hash,
+                                          page_window=page_window, backend=backend):
+        if profiler:
+            profiler.add_page(geometry)
+        infos.append(build_page_info(geometry, i, font_size_threshold))
+    if cache is None:
+        return infos, 0, 0, profiler
+    return infos, cache.hits, cache.misses, profiler
+
+def _extract_pages_parallel(pdf_path, n_pages, workers, cache=None, pdf_hash=None,
+                            font_size_threshold=FONT_SIZE_THRESHOLD, profiler=None, page_window=None,
+                            backend=PDF_BACKEND):
+    """
+    將頁面切成連續區塊分給 process pool，
+    executor.map 會依提交順序回傳，因此合併時頁序是確定的。
+    profiler: 有給時合併各 worker 累積的版面直方圖
+    yield: 頁面資訊 (依頁序，區塊一完成即可往下游送)
+    """
+    # 每個 worker 分到數個區塊，讓負載較平均
+    chunk_size = max(1, -(-n_pages // (workers * 4)))
+    starts = list(range(0, n_pages, chunk_size))
+    ends = [min(s + chunk_size, n_pages) for s in starts]
+    n_chunks = len(starts)
+
+    cache_dir = cache.cache_dir if cache else None
+    cache_max_bytes = cache.max_bytes if cache else None
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_extract_page_chunk, [pdf_path] * n_chunks, starts, ends,
+                               [cache_dir] * n_chunks, [cache_max_bytes] * n_chunks, [pdf_hash] * n_chunks,
+                               [font_size_threshold] * n_chunks, [profiler is not None] * n_chunks,
+                               [page_window] * n_chunks, [backend] * n_chunks)
+        for chunk, hits, misses, chunk_profiler in results:
+            if cache:
+                cache.hits += hits
+                cache.misses += misses
+            if profiler:
+                profiler.merge(chunk_profiler)
+            yield from chunk
+
+def iter_chapter_paragraphs(page_infos, common_x0):
+    """
+    依頁序合併頁面資訊：跨頁延續 buffer_paragraph / prev_line_obj，
+    段落一完成就 yield，不必等整章結束。序列與平行模式共用，確保輸出一致。
+    yield: (章節 id, 段落)，章節 id 即輸出檔名 (例如: 000_Prologue, 001_Chapter One)
+    """
     current_chapter_name = "Prologue_or_Start" # 預設第一章之前的檔名
     chapter_index = 0 #新增計數器
-    current_paragraphs = []
 
     # 用來跨頁合併段落的 buffer
     buffer_paragraph = ""
     prev_line_obj = None
 
-    # 全域左邊界偵測 (簡化版，只跑前幾頁)
-    common_x0 = 0
-    with pdfplumber.open(pdf_path) as pdf:
-        # --- 預先偵測左邊界 ---
-        starts = []
-        for p in pdf.pages[4:18]:
-            words = p.extract_words()
-            if words: starts.append(words[0]['x0'])
-        if starts:
-            common_x0 = Counter([int(x) for x in starts]).most_common(1)[0][0]
-
-        # --- 開始逐頁處理 ---
-        for i, page in enumerate(pdf.pages):
-            width = page.width
-
-            # 1.【軌道一】檢查是否有章節標題 (文字大小 > 15)
-            header_text, header_bottom = get_chapter_header(page)
-
-            if header_text:
-                # 發現新章節！
-                # A. 先把"上一章"殘留的 buffer 收尾存入 list
-                if buffer_paragraph:
-                    current_paragraphs.append(buffer_paragraph.strip())
-                    buffer_paragraph = ""
-                    prev_line_obj = None
-
-                # B. 寫入上一章的檔案：使用 f-string 將序號格式化為 3 位數 (例如: 000_Prologue, 001_Chapter One)
-                numbered_filename = f"{chapter_index:03d}_{current_chapter_name}"
-                save_chapter(output_dir,numbered_filename, current_paragraphs)
-
-                chapter_index += 1  # 儲存完畢後，序號加 1，準備給下一個章節標題使用
-
-                # C. 重置狀態，準備開始新章節
-                current_chapter_name = header_text
-                current_paragraphs = []
-                print(f"--- 發現新章節: {header_text} (頁數: {i+1}) ---")
-
-            # 2.【軌道二】提取內文 Words
-            # 關鍵：只提取 header_bottom 之後的文字，避免把標題重複抓進內文
-            words = page.extract_words(x_tolerance=3, y_tolerance=6)
-
-            # 過濾掉標題區域的字 (只保留 top > header_bottom 的字)
-            # 加上一個小緩衝區 (+5) 避免切太齊
-            content_words = [w for w in words if w['top'] > header_bottom + 5]
-
-            if not content_words:
-                continue
-
-            # 3. 組裝行 (Lines)
-            lines = []
-            current_line = [content_words[0]]
-            for word in content_words[1:]:
-                if abs(word['top'] - current_line[-1]['top']) < 10:
-                    current_line.append(word)
-                else:
-                    lines.append(current_line)
-                    current_line = [word]
-            lines.append(current_line)
+    for info in page_infos:
+        header_text = info['header_text']
+
+        if header_text:
+            # 發現新章節！
+            # A. 先把"上一章"殘留的 buffer 收尾
+            if buffer_paragraph:
+                yield f"{chapter_index:03d}_{current_chapter_name}", buffer_paragraph.strip()
+                buffer_paragraph = ""
+                prev_line_obj = None
 
-            # 4. 段落判斷 (Paragraphs)
-            for line in lines:
-                line_text = " ".join([w['text'] for w in line])
+            # B. 序號加 1，準備給下一個章節標題使用 (序號格式化為 3 位數)
+            chapter_index += 1
 
-                # 在這裡也可以先做一次簡單過濾，雖然 save_chapter 也會做
-                if "OceanofPDF.com" in line_text:
-                    line_text = line_text.replace("OceanofPDF.com", "").strip()
-                    if not line_text: continue
+            # C. 重置狀態，準備開始新章節
+            current_chapter_name = header_text
+            print(f"--- 發現新章節: {header_text} (頁數: {info['index']+1}) ---")
 
-                line_x0 = line[0]['x0']
-                line_x1 = line[-1]['x1']
-                current_line_obj = {'x0': line_x0, 'x1': line_x1, 'text': line_text}
+        chapter_id = f"{chapter_index:03d}_{current_chapter_name}"
 
-                is_new = is_new_paragraph_logic(current_line_obj, prev_line_obj, common_x0, width)
+        # 4. 段落判斷 (Paragraphs)
+        for current_line_obj in info['lines']:
+            line_text = current_line_obj['text']
+            is_new = is_new_paragraph_logic(current_line_obj, prev_line_obj, common_x0, info['width'])
 
-                if is_new:
-                    if buffer_paragraph:
-                        current_paragraphs.append(buffer_paragraph.strip())
-                    buffer_paragraph = line_text
+            if is_new:
+                if buffer_paragraph:
+                    yield chapter_id, buffer_paragraph.strip()
+                buffer_paragraph = line_text
+            else:
+                if buffer_paragraph.endswith("-"):
+                    buffer_paragraph = buffer_paragraph[:-1] + line_text
                 else:
-                    if buffer_paragraph.endswith("-"):
-                        buffer_paragraph = buffer_paragraph[:-1] + line_text
-                    else:
-                        buffer_paragraph += " " + line_text
+                    buffer_paragraph += " " + line_text
 
-                prev_line_obj = current_line_obj
+            prev_line_obj = current_line_obj
 
-    # 5. 迴圈結束後，別忘了儲存最後一章
+    # 5. 迴圈結束後，別忘了最後一章殘留的 buffer
     if buffer_paragraph:
-        current_paragraphs.append(buffer_paragraph.strip())
+        yield f"{chapter_index:03d}_{current_chapter_name}", buffer_paragraph.strip()
+
+def resolve_layout(pdf_path, cache=None, pdf_hash=None, use_profile=True, profile_dir=DEFAULT_PROFILE_DIR,
+                   page_window=None, backend=PDF_BACKEND):
+    """
+    決定標題字體閾值與左邊界：
+    1. 已儲存的版面 profile -> 直接使用
+    2. 沒有 profile 但有頁面快取 -> 逐頁累積直方圖 (解析結果寫入快取，主流程直接讀快取，不會解析第二次)
+    3. 都沒有 -> 本次使用 FONT_SIZE_THRESHOLD 與左邊界預掃描，主流程順便累積 profile 供下次使用
+    回傳: (font_size_threshold, common_x0, 主流程要累積的 profiler 或 None)
+    """
+    profiler = load_profile(pdf_hash, CONTENT_WORD_PARAMS, profile_dir, backend) if use_profile else None
+
+    if use_profile and profiler is None and cache is not None:
+        profiler = LayoutProfiler(LINE_TOP_TOLERANCE)
+        for _, geometry in iter_page_geometry(pdf_path, CONTENT_WORD_PARAMS, cache, None, pdf_hash,
+                                              page_window=page_window, backend=backend):
+            profiler.add_page(geometry)
+        save_profile(pdf_hash, CONTENT_WORD_PARAMS, profiler, profile_dir, backend)
+
+    if profiler is not None:
+        derived = profiler.derive()
+        font_size_threshold = derived["font_size_threshold"] or FONT_SIZE_THRESHOLD
+        common_x0 = derived["left_margin"] or 0
+        print(f"版面 profile: 內文字體 {derived['body_font_size']}，標題字體 > {font_size_threshold}，左邊界 {common_x0}")
+        return font_size_threshold, common_x0, None
+
+    # --- 預先偵測左邊界 ---
+    n_pages = get_page_count(pdf_path, cache, pdf_hash, backend)
+    common_x0 = detect_left_margin(pdf_path, n_pages, cache, pdf_hash, page_window, backend)
+    print(f"預設版面參數: 標題字體 > {FONT_SIZE_THRESHOLD}，左邊界 {common_x0}")
+    return FONT_SIZE_THRESHOLD, common_x0, LayoutProfiler(LINE_TOP_TOLERANCE) if use_profile else None
+
+def iter_pdf_chapter_paragraphs(pdf_path, workers=1, cache=None, pdf_hash=None, n_pages=None,
+                                use_profile=True, profile_dir=DEFAULT_PROFILE_DIR, page_window=PAGE_WINDOW,
+                                backend=PDF_BACKEND, layout=None):
+    """
+    串流 API：邊解析頁面邊 yield (章節 id, 段落)，
+    下游 (寫檔、對齊) 可以在提取結束前就開始，記憶體用量與書的長度無關。
+    use_profile: 以版面 profile 自動推算閾值 (False 則固定使用 FONT_SIZE_THRESHOLD)
+    page_window: 每幾頁重新開啟一次 PDF (見 PAGE_WINDOW)
+    backend: PDF 解析方式 (見 PDF_BACKEND)
+    layout: 呼叫端已經以 resolve_layout 決定好的 (font_size_threshold, common_x0, profiler)，None 則在這裡決定
+    """
+    pdf_hash = pdf_hash or file_sha256(pdf_path)
+    if n_pages is None:
+        n_pages = get_page_count(pdf_path, cache, pdf_hash, backend)
+
+    if layout is None:
+        layout = resolve_layout(pdf_path, cache, pdf_hash, use_profile, profile_dir, page_window, backend)
+    font_size_threshold, common_x0, profiler = layout
+
+    if workers > 1:
+        page_infos = _extract_pages_parallel(pdf_path, n_pages, workers, cache, pdf_hash, font_size_threshold,
+                                             profiler, page_window, backend)
+    else:
+        # --- 開始逐頁處理 (generator，逐頁提取逐頁合併) ---
+        def iter_page_infos():
+            for i, geometry in iter_page_geometry(pdf_path, CONTENT_WORD_PARAMS, cache, None, pdf_hash,
+                                                  page_window=page_window, backend=backend):
+                if profiler:
+                    profiler.add_page(geometry)
+                yield build_page_info(geometry, i, font_size_threshold)
+        page_infos = iter_page_infos()
+    yield from iter_chapter_paragraphs(page_infos, common_x0)
+
+    if profiler:
+        save_profile(pdf_hash, CONTENT_WORD_PARAMS, profiler, profile_dir, backend)
+
+def write_chapters(events, output_dir, previous_digests=None):
+    """
+    消費 (章節 id, 段落) 串流，每章寫成一個 .txt
+    previous_digests: {輸出檔名: 上次內容 hash}，內容相同的章節保留原檔
+    回傳: {輸出檔名: 內容 hash}
+    """
+    previous_digests = previous_digests or {}
+    digests = {}
+    for chapter_id, group in itertools.groupby(events, key=itemgetter(0)):
+        txt_name = f"{chapter_id}.txt"
+        digest = save_chapter(output_dir, chapter_id, (paragraph for _, paragraph in group), previous_digests.get(txt_name))
+        if digest is not None:
+            digests[txt_name] = digest
+    return digests
+
+def get_layout_rules(font_size_threshold, common_x0, use_profile=True, backend=PDF_BACKEND):
+    """
+    影響輸出的所有規則值 (寫入 manifest，任一項改變就會重建)
+    font_size_threshold / common_x0: resolve_layout 實際採用的值 (profile 推算或預設值)，
+    第一次執行用預設值、下次改用 profile 推算值時也會重建
+    """
+    return {
+        "font_size_threshold": font_size_threshold,
+        "common_x0": common_x0,
+        "line_top_tolerance": LINE_TOP_TOLERANCE,
+        "margin_scan_pages": [MARGIN_SCAN_PAGES.start, MARGIN_SCAN_PAGES.stop],
+        "content_word_params": CONTENT_WORD_PARAMS,
+        "margin_word_params": MARGIN_WORD_PARAMS,
+        # profile 推算的閾值由 PDF 內容與 profile 版本決定
+        "layout_profile": PROFILE_VERSION if use_profile else None,
+        "backend": backend,
+    }
+
+def process_pdf_to_chapters(pdf_path,output_dir,workers=1,cache=None,use_profile=True,force=False,page_window=PAGE_WINDOW,
+                            backend=PDF_BACKEND):
+    '''
+    使用方式
+    output_dir = "output_text_EN" 多個.txt
+    process_pdf_to_chapters("PAUL CLEAVE/Trust_No_One.pdf",output_dir)
+
+    workers > 1 時改用 process pool 平行提取每頁內容，
+    再依頁序合併，輸出檔案與序列模式完全相同。
+
+    cache: PageLayoutCache，有給時頁面幾何從快取讀取 (未命中才解析 PDF)，
+    調整 FONT_SIZE_THRESHOLD 等參數後重跑不需要再經過 pdfminer。
+
+    use_profile: 標題字體閾值與左邊界由版面 profile 自動推算 (見 resolve_layout)
+
+    output_dir/manifest.json 記錄輸入 PDF 的 hash、規則值與提取程式版本，
+    都沒變動時直接跳過；有變動時重新提取，但內容相同的章節檔保留原檔。
+    force: 忽略 manifest，全部重建
+
+    page_window: 低記憶體模式，每 page_window 頁重新開啟一次 PDF；
+    結束時印出峰值 RSS (平行模式另列 worker 的峰值) 以確認記憶體上限。
+
+    backend: PDF 解析方式，"pdfium" 比 pdfplumber 快很多，輸出一致率見 pdf_layout/benchmark.py
+
+    回傳: 本次實際處理的頁數 (已是最新而跳過時為 0)
+    '''
+    start_time = time.perf_counter()
+
+    pdf_hash = file_sha256(pdf_path)
+    manifest = BuildManifest(output_dir)
+    manifest_key = os.path.basename(pdf_path)
+    # 先決定版面參數，manifest 記錄的是實際使用的閾值與左邊界
+    layout = resolve_layout(pdf_path, cache, pdf_hash, use_profile, page_window=page_window, backend=backend)
+    rules = get_layout_rules(layout[0], layout[1], use_profile, backend)
+    previous_digests = manifest.output_digests(manifest_key)
+
+    if not force and manifest.is_up_to_date(manifest_key, pdf_hash, rules, EXTRACTOR_VERSION):
+        for txt_name in sorted(previous_digests):
+            print(f"已是最新，跳過: {os.path.join(output_dir, txt_name)}")
+        print(f"[{manifest_key}] 輸入與規則皆未變更，跳過 {len(previous_digests)} 個章節檔")
+        return 0
+
+    n_pages = get_page_count(pdf_path, cache, pdf_hash, backend)
+
+    events = iter_pdf_chapter_paragraphs(pdf_path, workers, cache, pdf_hash, n_pages, use_profile,
+                                         page_window=page_window, backend=backend, layout=layout)
+    digests = write_chapters(events, output_dir, None if force else previous_digests)
+
+    # 上次產生、這次不再產生的章節檔 (例如標題改變) 一併移除，避免留下舊檔
+    for txt_name in sorted(set(previous_digests) - set(digests)):
+        stale_path = os.path.join(output_dir, txt_name)
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+            print(f"移除過期章節: {stale_path}")
+
+    manifest.record(manifest_key, pdf_hash, rules, EXTRACTOR_VERSION, digests)
+    manifest.save()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"共處理 {n_pages} 頁，耗時 {elapsed:.1f} 秒 ({n_pages / elapsed:.1f} pages/sec, workers={workers}, "
+          f"backend={backend})")
+    print_peak_rss(f"[{manifest_key}] page_window={page_window}", with_workers=workers > 1)
+
+    if cache:
+        cache.evict()
+        cache.print_stats()
 
-    # 儲存最後一章時也加上序號 ---
-    numbered_filename = f"{chapter_index:03d}_{current_chapter_name}"
-    save_chapter(output_dir,numbered_filename, current_paragraphs)
+    return n_pages
 
 if __name__=='__main__':
-    input_pdf = r"/home/user/paul-cleavedata/BOOK/PAUL CLEAVE_EN/Trust_No_One.pdf"
-    OUTPUT_FOLDER = "output_text_EN"
+    parser = argparse.ArgumentParser(description="將英文 PDF 依章節標題切分為多個 .txt")
+    parser.add_argument("--input", default=r"/home/user/paul-cleavedata/BOOK/PAUL CLEAVE_EN/Trust_No_One.pdf")
+    parser.add_argument("--output", default="output_text_EN")
+    parser.add_argument("--workers", type=int, default=1, help="平行提取頁面的 process 數 (1 = 序列模式)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="頁面幾何快取資料夾")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2)
+    parser.add_argument("--no-cache", action="store_true", help="不使用頁面快取，每次都重新解析 PDF")
+    parser.add_argument("--no-profile", action="store_true", help="不使用版面 profile，固定使用 FONT_SIZE_THRESHOLD 與左邊界預掃描")
+    parser.add_argument("--force", action="store_true", help="忽略 manifest，全部章節重新產生")
+    parser.add_argument("--page-window", type=int, default=PAGE_WINDOW,
+                        help="低記憶體模式：每 N 頁重新開啟一次 PDF (預設整份只開一次)")
+    parser.add_argument("--backend", default=PDF_BACKEND, choices=BACKENDS, help="PDF 解析方式")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else PageLayoutCache(args.cache_dir, int(args.cache_max_mb * 1024 ** 2))
+
+    input_pdf = args.input
+    OUTPUT_FOLDER = args.output
 
     if not os.path.exists(OUTPUT_FOLDER):
         os.mkdir(OUTPUT_FOLDER)
     
-    process_pdf_to_chapters(input_pdf,OUTPUT_FOLDER)
-    print("\n所有檔案處理完成！")
\ No newline at end of file
+    process_pdf_to_chapters(input_pdf,OUTPUT_FOLDER,workers=args.workers,cache=cache,use_profile=not args.no_profile,force=args.force,
+                            page_window=args.page_window,backend=args.backend)
+    print("\n所有檔案處理完成！")
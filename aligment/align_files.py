@@ -1,33 +1,60 @@
 import os
+import json
+import time
+import functools
 
-def create_file_pairs(dir_en, dir_zh):
+from chapter_check import index_chapter_files
+from chapter_segments import align_segmented
+from span_embeddings import DEFAULT_SPAN_MODE, PrefetchEncoder, span_requests
+
+# ================= 設定區 =================
+# 第一階段 (段落)：段落相似度通常比句子低一點，因為雜訊多，閾值設低一點；合併通常不會超過 3 段
+PARAGRAPH_THRESHOLD = 0.50
+PARAGRAPH_MERGE_WINDOW = 3
+# 第二階段 (句子)：需要高精度，閾值設高，並開啟 1:4 合併
+SENTENCE_THRESHOLD = 0.65
+SENTENCE_MERGE_WINDOW = 4
+# spaCy 斷句：doc.sents 由依存分析 (parser) 決定，只需要 tok2vec (trf 版為 transformer) + parser，
+# tagger / NER / lemmatizer 等全部停用
+SENTENCE_COMPONENTS = ("tok2vec", "transformer", "parser")
+# 較快的替代：統計式斷句元件 senter (sm 模型內建但預設停用)，斷句結果與 parser 略有不同
+SENTER_COMPONENTS = ("tok2vec", "senter")
+# nlp.pipe 的批次大小與 process 數 (n_process > 1 時以多個 process 斷句)
+SPLIT_BATCH_SIZE = 64
+SPLIT_N_PROCESS = 1
+# 斷句方式："spacy" (en_core_web_sm / zh_core_web_sm) 或 "rule" (rule_splitter，不需要載入 spaCy 模型)
+SPLITTERS = ("spacy", "rule")
+DEFAULT_SPLITTER = "spacy"
+# 對齊函數："greedy" (align_sentences_extended / _gpu，逐步選局部最佳) 或 "dp" (align_sentences_dp，帶狀動態規劃)
+ALIGNERS = ("greedy", "dp")
+# =========================================
+
+def create_file_pairs(dir_en, dir_zh, chapter_numbers=range(1, 39)):
     """
-    在兩個資料夾中尋找序號從 001 到 038 的對應檔案，
+    在兩個資料夾中尋找序號在 chapter_numbers 中的對應檔案，
     並將它們的完整路徑配對。
 
     Args:
         dir_en (str): 英文檔案的資料夾路徑。
         dir_zh (str): 中文檔案的資料夾路徑。
+        chapter_numbers (iterable): 要配對的章節序號，預設 001 到 038 (catalog.json 的 chapters)；
+            None 代表使用兩個資料夾中出現過的所有序號。
 
     Returns:
         list: 一個包含 (英文檔案路徑, 中文檔案路徑) 元組的列表。
     """
-    files_en = os.listdir(dir_en)
-    files_zh = os.listdir(dir_zh)
-    
-    # 排序以確保順序正確
-    files_en.sort()
-    files_zh.sort()
+    # 檔名格式為 "001_章節名.txt"，兩邊各建一次 {序號: 檔名} 索引
+    files_en = index_chapter_files(dir_en)
+    files_zh = index_chapter_files(dir_zh)
+
+    if chapter_numbers is None:
+        chapter_numbers = sorted(files_en.keys() | files_zh.keys())
 
     paired_files = []
-    # 使用 range(1, 39) 來產生 001 到 038 的序號
-    for i in range(1, 39):
+    for i in chapter_numbers:
         prefix = f"{i:03d}_"
-        
-        # 尋找對應的檔案
-        # 使用 next() 搭配生成器表達式來尋找檔案，如果找不到則返回 None
-        file_en = next((f for f in files_en if f.startswith(prefix)), None)
-        file_zh = next((f for f in files_zh if f.startswith(prefix)), None)
+        file_en = files_en.get(i)
+        file_zh = files_zh.get(i)
         
         if file_en and file_zh:
             # 建立完整的檔案路徑並加入 list
@@ -41,6 +68,72 @@ def create_file_pairs(dir_en, dir_zh):
 
 
 
+def load_sentence_pipeline(name, use_senter=False):
+    """
+    載入 spaCy 模型，只保留斷句需要的元件 (SENTENCE_COMPONENTS)，其餘停用
+    use_senter: 改用 senter 取代 parser 斷句 (較快，但結果會略有不同)
+    """
+    import spacy
+
+    nlp = spacy.load(name)
+    wanted = SENTER_COMPONENTS if use_senter else SENTENCE_COMPONENTS
+    nlp.select_pipes(enable=[component for component in wanted if component in nlp.component_names])
+    return nlp
+
+def get_device():
+    """有 GPU 時用 cuda，否則 cpu"""
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def load_aligner(aligner="greedy", device="cpu", span_mode=DEFAULT_SPAN_MODE):
+    """
+    在需要時才 import 對齊函數 (greedy 版會 import sentence_transformers)，
+    回傳可直接傳給 process_chapter_alignment 的 align_sentences_function
+    """
+    if aligner == "dp":
+        # 全域動態規劃版 (CPU / GPU 共用)
+        from align_sentences_dp import align_sentences_dp
+        function = align_sentences_dp
+    elif aligner != "greedy":
+        raise ValueError(f"未知的 aligner: {aligner} (可用: {', '.join(ALIGNERS)})")
+    elif device == "cuda":
+        from align_sentences_extended_gpu import align_sentences_extended_gpu
+        function = align_sentences_extended_gpu
+    else:
+        from align_sentences_extended import align_sentences_extended
+        function = align_sentences_extended
+    return functools.partial(function, span_mode=span_mode)
+
+def load_sentence_splitters(splitter=DEFAULT_SPLITTER, device="cpu"):
+    """
+    回傳 (nlp_en, nlp_zh)，給 split_sentences_spacy / split_sentences_batch 使用
+    splitter="rule" 時為 RuleSentenceSplitter，不會 import spaCy
+    """
+    if splitter == "rule":
+        from rule_splitter import RuleSentenceSplitter
+        return RuleSentenceSplitter("en"), RuleSentenceSplitter("zh")
+    if splitter != "spacy":
+        raise ValueError(f"未知的 splitter: {splitter} (可用: {', '.join(SPLITTERS)})")
+
+    import spacy
+    # 啟用 SpaCy GPU (必須在 load 模型之前執行)
+    if device == "cuda":
+        spacy.prefer_gpu()
+    return load_sentence_pipeline("en_core_web_sm"), load_sentence_pipeline("zh_core_web_sm")
+
+def split_sentences_batch(nlp, texts, batch_size=SPLIT_BATCH_SIZE, n_process=SPLIT_N_PROCESS):
+    """
+    以 nlp.pipe 批次斷句，每段文字的結果與 split_sentences_spacy 相同 (空白文字為 [])
+    回傳: list of list of sentences，與 texts 一一對應
+    """
+    results = [[] for _ in texts]
+    indices = [i for i, text in enumerate(texts) if text and text.strip()]
+    docs = nlp.pipe((texts[i] for i in indices), batch_size=batch_size, n_process=n_process)
+    for i, doc in zip(indices, docs):
+        # 過濾掉過短的句子或純符號
+        results[i] = [sent.text.strip() for sent in doc.sents if len(sent.text.strip()) > 1]
+    return results
+
 def split_sentences_spacy(nlp_en,nlp_zh,text, lang='en'):
     """
     使用 Spacy 進行斷句
@@ -62,67 +155,87 @@ def split_sentences_spacy(nlp_en,nlp_zh,text, lang='en'):
     # 過濾掉過短的句子或純符號
     return [sent.text.strip() for sent in doc.sents if len(sent.text.strip()) > 1]
 
-def process_chapter_alignment(nlp_en,nlp_zh,en_chapter_path, zh_chapter_path, output_path,align_sentences_function,model,device):
-    """
-    執行分層對齊：章節 -> 段落 -> 句子
+def read_paragraphs(path):
+    """讀取檔案 (假設一行一段落)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
 
-    align_sentences_function 可以設定成align_sentences_extended_gpu()或align_sentences_extended()
+def align_chapter_paragraphs(en_paragraphs, zh_paragraphs, align_sentences_function, model, device,
+                             span_mode=DEFAULT_SPAN_MODE, segment=False):
+    """
+    第一階段：段落級對齊 (Paragraph Alignment)
+    直接複用對齊函數，輸入是段落列表
+    segment: 先以高可信度的 1:1 段落 (錨點) 把章節切成小段，各段分別對齊 (chapter_segments)
     """
-    # 1. 讀取檔案 (假設一行一段落)
-    with open(en_chapter_path, 'r', encoding='utf-8') as f:
-        en_paragraphs = [line.strip() for line in f if line.strip()]
-
-    with open(zh_chapter_path, 'r', encoding='utf-8') as f:
-        zh_paragraphs = [line.strip() for line in f if line.strip()]
-
-    print(f"Loaded: {len(en_paragraphs)} EN paragraphs, {len(zh_paragraphs)} ZH paragraphs.")
-
-    # ---------------------------------------------------------
-    # 第一階段：段落級對齊 (Paragraph Alignment)
-    # ---------------------------------------------------------
     print("Stage 1: Aligning Paragraphs...")
-    # 直接複用對齊函數，輸入是段落列表
+    if segment:
+        start_time = time.perf_counter()
+        aligned_paragraphs, stats = align_segmented(en_paragraphs, zh_paragraphs, align_sentences_function, model, device,
+                                                    PARAGRAPH_THRESHOLD, PARAGRAPH_MERGE_WINDOW, span_mode)
+        # 整章對齊的實測加速比見 benchmark.py --mode segment，這裡只印分段後的實測耗時與相似度表計算量估計
+        print(f"Segmented by {stats['anchors']} anchors into {stats['segments']} segments "
+              f"(最大 {stats['max_segment']} 段)，Stage 1 耗時 {time.perf_counter() - start_time:.2f}s，"
+              f"相似度表計算量估計為整章的 {stats['cost_ratio']:.1%}")
+        print(f"Paragraph alignment done. Found {len(aligned_paragraphs)} pairs.")
+        return aligned_paragraphs
+
     # 段落合併通常不會超過 3 段，所以 window 設小一點節省時間
     aligned_paragraphs = align_sentences_function(
         model,
         device,
         en_paragraphs,
         zh_paragraphs,
-        threshold=0.50, # 段落相似度通常比句子低一點，因為雜訊多，設低一點
-        max_merge_window=3
+        threshold=PARAGRAPH_THRESHOLD,
+        max_merge_window=PARAGRAPH_MERGE_WINDOW
     )
 
     print(f"Paragraph alignment done. Found {len(aligned_paragraphs)} pairs.")
+    return aligned_paragraphs
 
-    # ---------------------------------------------------------
-    # 第二階段：句子級對齊 (Sentence Alignment)
-    # ---------------------------------------------------------
-    print("Stage 2: Aligning Sentences within Paragraphs...")
-
-    final_sentence_pairs = []
-
-    for para_pair in aligned_paragraphs:
-        # 取得配對好的段落文本
-        p_en_text = para_pair['en']
-        p_zh_text = para_pair['zh']
-
-        # 使用 Spacy 斷句
-        sents_en = split_sentences_spacy(nlp_en,nlp_zh,p_en_text, 'en')
-        sents_zh = split_sentences_spacy(nlp_en,nlp_zh,p_zh_text, 'zh')
+def split_paragraph_pairs(nlp_en, nlp_zh, aligned_paragraphs):
+    """
+    第二階段的輸入：對每組段落斷句
+    回傳: [(para_pair, sents_en, sents_zh)]，任一方斷句後為空的段落不列入
+    """
+    # 使用 Spacy 斷句 (所有段落一起以 nlp.pipe 批次處理)
+    en_sentences = split_sentences_batch(nlp_en, [para_pair['en'] for para_pair in aligned_paragraphs])
+    zh_sentences = split_sentences_batch(nlp_zh, [para_pair['zh'] for para_pair in aligned_paragraphs])
 
+    split_pairs = []
+    for para_pair, sents_en, sents_zh in zip(aligned_paragraphs, en_sentences, zh_sentences):
         # 如果任一方斷句後為空，跳過
         if not sents_en or not sents_zh:
             continue
+        split_pairs.append((para_pair, sents_en, sents_zh))
+    return split_pairs
+
+def align_chapter_sentences(split_pairs, align_sentences_function, model, device, span_mode=DEFAULT_SPAN_MODE):
+    """
+    第二階段：句子級對齊 (Sentence Alignment)，在每組段落的小範圍內進行
+    所有段落的句子與合併句先一次編碼 (大 batch)，每組段落的對齊再從中取出自己的 embedding，
+    不會每組段落各自呼叫一次 model.encode
+    span_mode: align_sentences_function 使用的 span_mode，決定要預先編碼哪些文字
+    """
+    print("Stage 2: Aligning Sentences within Paragraphs...")
 
+    # model 已經是 PrefetchEncoder (align_book 整本書預先編碼過) 時直接沿用
+    encoder = model if isinstance(model, PrefetchEncoder) else PrefetchEncoder(model)
+    encoder.prefetch([text for _, sents_en, sents_zh in split_pairs
+                      for text in span_requests(sents_en, sents_zh, SENTENCE_MERGE_WINDOW, span_mode)],
+                     device=device)
+
+    final_sentence_pairs = []
+
+    for para_pair, sents_en, sents_zh in split_pairs:
         # 在這個小範圍內進行句對齊
         # 這裡需要高精度，threshold 設高，並開啟 1:4 合併
         sents_pairs = align_sentences_function(
-            model,
+            encoder,
             device,
             sents_en,
             sents_zh,
-            threshold=0.65,
-            max_merge_window=4
+            threshold=SENTENCE_THRESHOLD,
+            max_merge_window=SENTENCE_MERGE_WINDOW
         )
 
         # 收集結果，並加上來源段落的 metadata (這對 debug 很有用)
@@ -130,14 +243,48 @@ def process_chapter_alignment(nlp_en,nlp_zh,en_chapter_path, zh_chapter_path, ou
             sp['source_para_score'] = para_pair['score'] # 記錄這句來自哪個可信度的段落
             final_sentence_pairs.append(sp)
 
-    # ---------------------------------------------------------
-    # 輸出結果
-    # ---------------------------------------------------------
     print(f"Total sentence pairs aligned: {len(final_sentence_pairs)}")
+    return final_sentence_pairs
 
-    # 寫入 JSONL 或 TXT
-    import json
-    with open(output_path, 'w', encoding='utf-8') as f:
+def write_sentence_pairs(output_path, final_sentence_pairs):
+    """寫入 JSONL (先寫暫存檔再 rename，中斷時不會留下寫到一半的檔案)"""
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         for pair in final_sentence_pairs:
             json.dump(pair, f, ensure_ascii=False)
-            f.write('\n')
\ No newline at end of file
+            f.write('\n')
+    os.replace(tmp_path, output_path)
+
+def process_chapter_alignment(nlp_en,nlp_zh,en_chapter_path, zh_chapter_path, output_path,align_sentences_function,model,device,
+                              span_mode=DEFAULT_SPAN_MODE, segment=False):
+    """
+    執行分層對齊：章節 -> 段落 -> 句子
+
+    align_sentences_function 可以設定成align_sentences_extended_gpu()或align_sentences_extended()
+    span_mode: align_sentences_function 使用的 span_mode (預先批次編碼用)
+    segment: Stage 1 以錨點切段後分段對齊 (見 align_chapter_paragraphs)
+    回傳: 寫入 output_path 的句對 list
+    """
+    # 1. 讀取檔案 (假設一行一段落)
+    en_paragraphs = read_paragraphs(en_chapter_path)
+    zh_paragraphs = read_paragraphs(zh_chapter_path)
+
+    print(f"Loaded: {len(en_paragraphs)} EN paragraphs, {len(zh_paragraphs)} ZH paragraphs.")
+
+    # ---------------------------------------------------------
+    # 第一階段：段落級對齊 (Paragraph Alignment)
+    # ---------------------------------------------------------
+    aligned_paragraphs = align_chapter_paragraphs(en_paragraphs, zh_paragraphs, align_sentences_function, model, device,
+                                                  span_mode, segment)
+
+    # ---------------------------------------------------------
+    # 第二階段：句子級對齊 (Sentence Alignment)
+    # ---------------------------------------------------------
+    split_pairs = split_paragraph_pairs(nlp_en, nlp_zh, aligned_paragraphs)
+    final_sentence_pairs = align_chapter_sentences(split_pairs, align_sentences_function, model, device, span_mode)
+
+    # ---------------------------------------------------------
+    # 輸出結果
+    # ---------------------------------------------------------
+    write_sentence_pairs(output_path, final_sentence_pairs)
+    return final_sentence_pairs
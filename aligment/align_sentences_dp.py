@@ -0,0 +1,152 @@
+import numpy as np
+
+from span_embeddings import DEFAULT_SPAN_MODE, EN_JOINER, ZH_JOINER, prepare_spans
+
+# ================= 設定區 =================
+# 動態規劃只計算對角線附近 ±BAND_WIDTH 格 (j 以 i * m / n 為中心)，時間與記憶體為 O(n·w)
+BAND_WIDTH = 20
+# swap 的兩組相似度都要超過 threshold - SWAP_MARGIN (與 greedy 版相同)
+SWAP_MARGIN = 0.1
+# =========================================
+
+def _to_unit_numpy(embeddings):
+    """tensor -> CPU float32 numpy，並正規化為單位向量 (內積即 cos 相似度)"""
+    if hasattr(embeddings, "detach"):
+        embeddings = embeddings.detach().cpu().numpy()
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2 or not len(embeddings):
+        return embeddings.reshape(0, embeddings.shape[-1] if embeddings.ndim else 0)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+def _row_window(i, n, m, band):
+    """
+    第 i 列在帶狀範圍內的 j 區間 [lo, hi]：涵蓋對角線在第 i-1 ~ i+1 列的位置 ± band，
+    兩種語言句數差很多 (m / n 很大) 時相鄰兩列仍然相連
+    """
+    step = m / n
+    lo = int(np.floor((i - 1) * step - band))
+    hi = int(np.ceil((i + 1) * step + band))
+    return max(0, lo), min(m, hi)
+
+def _moves(max_merge_window):
+    """所有移動: (en 前進數, zh 前進數, type)；skip 不輸出句對"""
+    moves = [(0, 1, "skip_zh"), (1, 0, "skip_en")]
+    moves += [(1, k, f"1:{k}") for k in range(1, max_merge_window + 1)]
+    moves += [(k, 1, f"{k}:1") for k in range(2, max_merge_window + 1)]
+    moves.append((2, 2, "swap"))
+    return moves
+
+def align_sentences_dp(model, device, en_sentences, zh_sentences, threshold=0.60, max_merge_window=4,
+                       band_width=BAND_WIDTH, span_mode=DEFAULT_SPAN_MODE):
+    """
+    全域對齊 (可取代 align_sentences_extended / _gpu，參數與輸出格式相同)：
+    在帶狀範圍內以動態規劃找出總分最高的路徑，移動包含 1:1..1:k、k:1、2:2 交叉 (swap) 與單邊跳過。
+    每個輸出句對的得分為 (相似度 - threshold)，跳過為 0，
+    因此低於 threshold 的句對不會被選入，但也不會因為一次錯誤的局部選擇而連帶錯開後面所有句子。
+    band_width: 帶狀範圍半寬 (至少 2 * max_merge_window)
+    span_mode: 合併片段 embedding 的計算方式 (見 span_embeddings.SPAN_MODES，"loop" 視同 "batch")
+    回傳: [{"en", "zh", "type", "score"}]，type 為 "1:k" / "k:1" / "swap_1" / "swap_2"
+    """
+    n, m = len(en_sentences), len(zh_sentences)
+    if n == 0 or m == 0:
+        return []
+
+    en_spans, zh_spans = prepare_spans(model, en_sentences, zh_sentences, max_merge_window,
+                                       "batch" if span_mode == "loop" else span_mode,
+                                       device=device, show_progress_bar=False)
+    en_spans = [_to_unit_numpy(spans) for spans in en_spans]
+    zh_spans = [_to_unit_numpy(spans) for spans in zh_spans]
+    en_single, zh_single = en_spans[0], zh_spans[0]
+
+    moves = _moves(max_merge_window)
+    band = max(band_width, 2 * max_merge_window)
+    windows = [_row_window(i, n, m, band) for i in range(n + 1)]
+    # best[i][j - lo_i]: 對齊 en[:i] 與 zh[:j] 的最高總分；back 記錄最後一步的 move index，sims 記錄該步相似度
+    best, back, sims = [], [], []
+
+    def lookup(row, js):
+        """best[row][js]，帶狀範圍外為 -inf"""
+        lo, hi = windows[row]
+        values = np.full(len(js), -np.inf)
+        inside = (js >= lo) & (js <= hi)
+        values[inside] = best[row][js[inside] - lo]
+        return values
+
+    def dot_rows(matrix, rows, vector):
+        """matrix[rows] @ vector，超出範圍的列為 nan"""
+        out = np.full(len(rows), np.nan, dtype=np.float32)
+        valid = (rows >= 0) & (rows < len(matrix))
+        out[valid] = matrix[rows[valid]] @ vector
+        return out
+
+    for i in range(n + 1):
+        lo, hi = windows[i]
+        js = np.arange(lo, hi + 1)
+        row_best = np.full(len(js), -np.inf)
+        row_back = np.full(len(js), -1, dtype=np.int8)
+        row_sims = np.full((len(js), 2), np.nan, dtype=np.float32)
+        if i == 0:
+            row_best[js == 0] = 0.0
+
+        for move_index, (a, b, move_type) in enumerate(moves):
+            if move_type == "skip_zh" or a > i:
+                continue  # skip_zh 依賴同一列，最後處理
+            prev = lookup(i - a, js - b)
+            if move_type == "skip_en":
+                gain = np.zeros(len(js))
+                sim = np.full((len(js), 2), np.nan, dtype=np.float32)
+            elif move_type == "swap":
+                # en[i-2] <-> zh[j-1], en[i-1] <-> zh[j-2]
+                s1 = dot_rows(zh_single, js - 1, en_single[i - 2])
+                s2 = dot_rows(zh_single, js - 2, en_single[i - 1])
+                ok = (np.minimum(s1, s2) > threshold - SWAP_MARGIN)
+                gain = np.where(ok, s1 + s2 - 2 * threshold, -np.inf)
+                sim = np.stack([s1, s2], axis=1)
+            elif a == 1:
+                # en[i-1] <-> zh[j-b : j]
+                s = dot_rows(zh_spans[b - 1], js - b, en_single[i - 1])
+                gain = s - threshold
+                sim = np.stack([s, np.full(len(js), np.nan, dtype=np.float32)], axis=1)
+            else:
+                # en[i-a : i] <-> zh[j-1]
+                s = zh_single[np.clip(js - 1, 0, m - 1)] @ en_spans[a - 1][i - a]
+                s = np.where(js >= 1, s, np.nan).astype(np.float32)
+                gain = s - threshold
+                sim = np.stack([s, np.full(len(js), np.nan, dtype=np.float32)], axis=1)
+
+            total = np.where(np.isnan(gain), -np.inf, prev + np.nan_to_num(gain, nan=0.0))
+            better = total > row_best
+            row_best[better] = total[better]
+            row_back[better] = move_index
+            row_sims[better] = sim[better]
+
+        # skip_zh (i, j-1) -> (i, j)，得分 0：等同沿著列取累積最大值
+        running = np.maximum.accumulate(row_best)
+        from_left = running > row_best
+        row_best = running
+        row_back[from_left] = 0
+        best.append(row_best)
+        back.append(row_back)
+        sims.append(row_sims)
+
+    # --- 回溯 ---
+    aligned_pairs = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        lo, _ = windows[i]
+        a, b, move_type = moves[back[i][j - lo]]
+        s1, s2 = sims[i][j - lo]
+        if move_type == "swap":
+            aligned_pairs.append({"en": en_sentences[i - 1], "zh": zh_sentences[j - 2], "type": "swap_2", "score": float(s2)})
+            aligned_pairs.append({"en": en_sentences[i - 2], "zh": zh_sentences[j - 1], "type": "swap_1", "score": float(s1)})
+        elif move_type not in ("skip_zh", "skip_en"):
+            aligned_pairs.append({
+                "en": EN_JOINER.join(en_sentences[i - a:i]),
+                "zh": ZH_JOINER.join(zh_sentences[j - b:j]),
+                "type": move_type,
+                "score": float(s1),
+            })
+        i, j = i - a, j - b
+    aligned_pairs.reverse()
+    return aligned_pairs
@@ -1,19 +1,36 @@
 import torch
 from sentence_transformers import util # <-- 修改點 1：在這裡加入 import
 
-def align_sentences_extended(model,device,en_sentences, zh_sentences, threshold=0.60, max_merge_window=4):
+from span_embeddings import DEFAULT_SPAN_MODE, prepare_spans, similarity_tables
+
+def align_sentences_extended(model,device,en_sentences, zh_sentences, threshold=0.60, max_merge_window=4,
+                             span_mode=DEFAULT_SPAN_MODE):
     device = device # 為了配合gpu 版本
     
     """
     支援 1:N 和 N:1 (N最大為 max_merge_window) 的合併測試，以及 2:2 交叉亂序 (Swap)。
     預設 max_merge_window=4，即支援 1:4 和 4:1。
+    span_mode: 合併片段 embedding 的計算方式 (見 span_embeddings.SPAN_MODES)，
+        "batch" 迴圈前一次編碼所有片段 / "approx" 由單句 embedding 近似，不需額外模型計算 /
+        "loop" 原本在迴圈中逐一編碼的方式 (benchmark 比較用)
     """
     aligned_pairs = []
+    if not en_sentences or not zh_sentences:
+        return aligned_pairs
 
     # 預先計算 Embedding (轉換為 Tensor 以利用 GPU 加速計算)
-    # 注意：這裡只計算單句的 embedding，合併句會在迴圈中動態計算
-    en_embeddings = model.encode(en_sentences, convert_to_tensor=True)
-    zh_embeddings = model.encode(zh_sentences, convert_to_tensor=True)
+    # 單句與合併片段一起準備好，迴圈中只需查表 ("loop" 模式只有單句，合併句會在迴圈中動態計算)
+    en_spans, zh_spans = prepare_spans(model, en_sentences, zh_sentences, max_merge_window, span_mode)
+    en_embeddings, zh_embeddings = en_spans[0], zh_spans[0]
+    # 所有候選的相似度一次算成矩陣搬回 CPU，迴圈中只查表 ("loop" 模式保留原本逐對 cos_sim 的計算方式)
+    if span_mode != "loop":
+        one_to_k, k_to_one = similarity_tables(en_spans, zh_spans)
+
+    def pair_sim(a, b):
+        """en[a] vs zh[b] 的 cos 相似度"""
+        if span_mode != "loop":
+            return one_to_k[0][a][b]
+        return util.cos_sim(en_embeddings[a], zh_embeddings[b]).item()
 
     i = 0
     j = 0
@@ -30,9 +47,11 @@ def align_sentences_extended(model,device,en_sentences, zh_sentences, threshold=
                 # 這裡需要動態合併文本並編碼
                 # 簡單用空格連接，實際可根據標點優化
                 combined_zh_text = "".join(zh_sentences[j : j+k])
-                emb_comb_zh = model.encode(combined_zh_text, convert_to_tensor=True)
-
-                sim = util.cos_sim(en_embeddings[i], emb_comb_zh).item()
+                if span_mode != "loop":
+                    sim = one_to_k[k - 1][i][j]
+                else:
+                    emb_comb_zh = model.encode(combined_zh_text, convert_to_tensor=True)
+                    sim = util.cos_sim(en_embeddings[i], emb_comb_zh).item()
                 candidates.append({
                     "score": sim,
                     "type": f"1:{k}",
@@ -46,9 +65,11 @@ def align_sentences_extended(model,device,en_sentences, zh_sentences, threshold=
             # 注意：當 k=1 時，這與上面的 1:1 重複，為了邏輯簡單我們允許重複計算，取 max 沒影響
             if k > 1 and i + k <= len(en_sentences):
                 combined_en_text = " ".join(en_sentences[i : i+k])
-                emb_comb_en = model.encode(combined_en_text, convert_to_tensor=True)
-
-                sim = util.cos_sim(emb_comb_en, zh_embeddings[j]).item()
+                if span_mode != "loop":
+                    sim = k_to_one[k - 1][i][j]
+                else:
+                    emb_comb_en = model.encode(combined_en_text, convert_to_tensor=True)
+                    sim = util.cos_sim(emb_comb_en, zh_embeddings[j]).item()
                 candidates.append({
                     "score": sim,
                     "type": f"{k}:1",
@@ -62,9 +83,9 @@ def align_sentences_extended(model,device,en_sentences, zh_sentences, threshold=
         # 僅檢查 2x2 的互換 (E1->C2, E2->C1)
         if i + 1 < len(en_sentences) and j + 1 < len(zh_sentences):
             # E_i vs C_{j+1}
-            s1 = util.cos_sim(en_embeddings[i], zh_embeddings[j+1]).item()
+            s1 = pair_sim(i, j+1)
             # E_{i+1} vs C_j
-            s2 = util.cos_sim(en_embeddings[i+1], zh_embeddings[j]).item()
+            s2 = pair_sim(i+1, j)
 
             avg_score = (s1 + s2) / 2
 
@@ -99,11 +120,11 @@ def align_sentences_extended(model,device,en_sentences, zh_sentences, threshold=
             # 這裡示範簡單的 Lookahead Check
             skip_zh_score = 0
             if j + 1 < len(zh_sentences):
-                skip_zh_score = util.cos_sim(en_embeddings[i], zh_embeddings[j+1]).item()
+                skip_zh_score = pair_sim(i, j+1)
 
             skip_en_score = 0
             if i + 1 < len(en_sentences):
-                skip_en_score = util.cos_sim(en_embeddings[i+1], zh_embeddings[j]).item()
+                skip_en_score = pair_sim(i+1, j)
 
             if skip_zh_score > threshold:
                 j += 1 # 認定中文多了一句，跳過中文
@@ -1,13 +1,34 @@
 import torch
 from sentence_transformers import util # <-- 修改點 1：在這裡加入 import
 
-def align_sentences_extended_gpu(model,device,en_sentences, zh_sentences, threshold=0.60, max_merge_window=4):
+from span_embeddings import DEFAULT_SPAN_MODE, prepare_spans, similarity_tables
+
+def align_sentences_extended_gpu(model,device,en_sentences, zh_sentences, threshold=0.60, max_merge_window=4,
+                                 span_mode=DEFAULT_SPAN_MODE):
+    """
+    span_mode: 合併片段 embedding 的計算方式 (見 span_embeddings.SPAN_MODES)，
+        "batch" 迴圈前一次編碼所有片段 / "approx" 由單句 embedding 近似，不需額外模型計算 /
+        "loop" 原本在迴圈中逐一編碼的方式 (benchmark 比較用)
+    """
     aligned_pairs = []
+    if not en_sentences or not zh_sentences:
+        return aligned_pairs
 
     # --- 修改點 D: 確保 encode 產出在 GPU 上的 Tensor ---
     # convert_to_tensor=True 會自動根據模型所在的 device 產出 tensor
-    en_embeddings = model.encode(en_sentences, convert_to_tensor=True, device=device)
-    zh_embeddings = model.encode(zh_sentences, convert_to_tensor=True, device=device)
+    # 單句與合併片段一起準備好 (大 batch)，迴圈中只需查表
+    en_spans, zh_spans = prepare_spans(model, en_sentences, zh_sentences, max_merge_window, span_mode,
+                                       device=device, show_progress_bar=False)
+    en_embeddings, zh_embeddings = en_spans[0], zh_spans[0]
+    # 所有候選的相似度一次算成矩陣搬回 CPU，迴圈中只查表 ("loop" 模式保留原本逐對 cos_sim 的計算方式)
+    if span_mode != "loop":
+        one_to_k, k_to_one = similarity_tables(en_spans, zh_spans)
+
+    def pair_sim(a, b):
+        """en[a] vs zh[b] 的 cos 相似度"""
+        if span_mode != "loop":
+            return one_to_k[0][a][b]
+        return util.cos_sim(en_embeddings[a], zh_embeddings[b]).item()
 
     i = 0
     j = 0
@@ -23,10 +44,12 @@ def align_sentences_extended_gpu(model,device,en_sentences, zh_sentences, thresh
                 combined_zh_text = "".join(zh_sentences[j : j+k])
 
                 # --- 修改點 E: 讓動態編碼也在 GPU 進行 ---
-                emb_comb_zh = model.encode(combined_zh_text, convert_to_tensor=True, device=device, show_progress_bar=False)
-
-                # util.cos_sim 在 GPU tensor 上運算極快
-                sim = util.cos_sim(en_embeddings[i], emb_comb_zh).item() # item() 取回數值到 CPU 做邏輯判斷
+                # 預先算好的相似度矩陣已在 CPU 上，這裡不會觸發 GPU 同步
+                if span_mode != "loop":
+                    sim = one_to_k[k - 1][i][j]
+                else:
+                    emb_comb_zh = model.encode(combined_zh_text, convert_to_tensor=True, device=device, show_progress_bar=False)
+                    sim = util.cos_sim(en_embeddings[i], emb_comb_zh).item() # item() 取回數值到 CPU 做邏輯判斷
 
                 candidates.append({
                     "score": sim, "type": f"1:{k}", "i_step": 1, "j_step": k,
@@ -38,9 +61,11 @@ def align_sentences_extended_gpu(model,device,en_sentences, zh_sentences, thresh
                 combined_en_text = " ".join(en_sentences[i : i+k])
 
                 # --- 修改點 E (同上) ---
-                emb_comb_en = model.encode(combined_en_text, convert_to_tensor=True, device=device, show_progress_bar=False)
-
-                sim = util.cos_sim(emb_comb_en, zh_embeddings[j]).item()
+                if span_mode != "loop":
+                    sim = k_to_one[k - 1][i][j]
+                else:
+                    emb_comb_en = model.encode(combined_en_text, convert_to_tensor=True, device=device, show_progress_bar=False)
+                    sim = util.cos_sim(emb_comb_en, zh_embeddings[j]).item()
 
                 candidates.append({
                     "score": sim, "type": f"{k}:1", "i_step": k, "j_step": 1,
@@ -49,9 +74,8 @@ def align_sentences_extended_gpu(model,device,en_sentences, zh_sentences, thresh
 
         # --- B. 測試 Swap (GPU版) ---
         if i + 1 < len(en_sentences) and j + 1 < len(zh_sentences):
-            # 這裡的運算全部在 GPU 上發生
-            s1 = util.cos_sim(en_embeddings[i], zh_embeddings[j+1]).item()
-            s2 = util.cos_sim(en_embeddings[i+1], zh_embeddings[j]).item()
+            s1 = pair_sim(i, j+1)
+            s2 = pair_sim(i+1, j)
 
             avg_score = (s1 + s2) / 2
 
@@ -70,11 +94,11 @@ def align_sentences_extended_gpu(model,device,en_sentences, zh_sentences, thresh
             # Lookahead logic
             skip_zh_score = 0
             if j + 1 < len(zh_sentences):
-                skip_zh_score = util.cos_sim(en_embeddings[i], zh_embeddings[j+1]).item()
+                skip_zh_score = pair_sim(i, j+1)
 
             skip_en_score = 0
             if i + 1 < len(en_sentences):
-                skip_en_score = util.cos_sim(en_embeddings[i+1], zh_embeddings[j]).item()
+                skip_en_score = pair_sim(i+1, j)
 
             if skip_zh_score > threshold: j += 1
             elif skip_en_score > threshold: i += 1
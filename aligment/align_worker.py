@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import queue
+import base64
+import argparse
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from align_files import (DEFAULT_SPLITTER, SPLITTERS, get_device, load_aligner, load_sentence_splitters,
+                         process_chapter_alignment)
+from embedding_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, CachedEncoder, EmbeddingCache
+from model_backend import DEFAULT_MODEL_BACKEND, MODEL_BACKENDS, cache_model_name, load_model
+from span_embeddings import DEFAULT_SPAN_MODE
+
+# ================= 設定區 =================
+# 只聽 localhost，不對外開放
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# micro-batching：第一個請求到達後最多再等多久、累積多少段文字就送進模型
+BATCH_WAIT_SECONDS = 0.01
+MAX_BATCH_TEXTS = 512
+# client 等待章節對齊完成的時間上限 (秒)
+JOB_TIMEOUT = 3600
+# =========================================
+
+class MicroBatcher:
+    """
+    包裝 SentenceTransformer (或 CachedEncoder)，與 model.encode 相同的呼叫方式。
+    多個 thread 同時呼叫 encode() 時，等待中的請求由背景 thread 合併成一次 model.encode
+    (最多等 max_wait 秒或累積 max_texts 段文字)，再把結果切回各自的請求。
+    """
+    def __init__(self, model, device, max_wait=BATCH_WAIT_SECONDS, max_texts=MAX_BATCH_TEXTS):
+        self.model = model
+        self.target_device = device
+        self.max_wait = max_wait
+        self.max_texts = max_texts
+        self.lock = threading.Lock()  # model.encode 與快取存檔不可同時進行
+        self.requests = queue.Queue()
+        self.n_requests = 0
+        self.n_batches = 0
+        self.n_texts = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def encode(self, sentences, convert_to_tensor=False, device=None, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return self.model.encode(texts, convert_to_tensor=convert_to_tensor, device=device,
+                                     normalize_embeddings=normalize_embeddings, **kwargs)
+
+        request = {"texts": texts, "normalize": normalize_embeddings, "done": threading.Event()}
+        self.requests.put(request)
+        request["done"].wait()
+        if "error" in request:
+            raise request["error"]
+
+        embeddings = request["embeddings"]
+        if convert_to_tensor:
+            if device is not None:
+                embeddings = embeddings.to(device)
+        else:
+            embeddings = embeddings.cpu().numpy()
+        return embeddings[0] if single else embeddings
+
+    def _collect(self):
+        """等到第一個請求後，在 max_wait 內繼續收集，直到文字數達 max_texts"""
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while sum(len(request["texts"]) for request in batch) < self.max_texts:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # normalize_embeddings 不同的請求不能一起編碼
+            for normalize in {request["normalize"] for request in batch}:
+                group = [request for request in batch if request["normalize"] == normalize]
+                texts = [text for request in group for text in request["texts"]]
+                try:
+                    with self.lock:
+                        embeddings = self.model.encode(texts, convert_to_tensor=True, device=self.target_device,
+                                                       normalize_embeddings=normalize, show_progress_bar=False)
+                    self.n_batches += 1
+                    self.n_texts += len(texts)
+                    offset = 0
+                    for request in group:
+                        request["embeddings"] = embeddings[offset:offset + len(request["texts"])]
+                        offset += len(request["texts"])
+                except Exception as e:
+                    for request in group:
+                        request["error"] = e
+                for request in group:
+                    self.n_requests += 1
+                    request["done"].set()
+
+class AlignmentWorker:
+    """常駐的模型與對齊狀態：斷句模型、LaBSE (經過 MicroBatcher / embedding 快取)"""
+    def __init__(self, model_backend=DEFAULT_MODEL_BACKEND, splitter=DEFAULT_SPLITTER, cache_dir=DEFAULT_CACHE_DIR,
+                 cache_max_bytes=DEFAULT_MAX_BYTES, use_cache=True):
+        self.splitter = splitter
+        self.model_backend = model_backend
+        self.device = get_device()
+        print(f"Running on: {self.device}")
+        print(f"Loading sentence splitter ({splitter})...")
+        self.nlp_en, self.nlp_zh = load_sentence_splitters(splitter, self.device)
+        if model_backend != "torch":
+            self.device = "cpu"  # ONNX 只在 CPU 上執行
+        print(f"Loading LaBSE ({model_backend})...")
+        self.model = load_model(self.device, model_backend)
+
+        # 只有 worker 一個 process 寫入快取，滿足 EmbeddingCache 單一寫入者的限制
+        self.encoder = self.model
+        if use_cache:
+            self.encoder = CachedEncoder(self.model, EmbeddingCache(cache_model_name(model_backend), cache_dir,
+                                                                    cache_max_bytes))
+        self.batcher = MicroBatcher(self.encoder, self.device)
+        # spaCy 與對齊迴圈不保證 thread-safe：章節一次做一個，但其中的編碼仍與 /encode 請求合併成 batch
+        self.job_lock = threading.Lock()
+        self.n_jobs = 0
+
+    def save_cache(self):
+        if self.encoder is not self.model:
+            with self.batcher.lock:
+                self.encoder.save()
+
+    def encode(self, payload):
+        embeddings = self.batcher.encode(payload["texts"], normalize_embeddings=payload.get("normalize_embeddings", False))
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(payload["texts"]), -1)
+        return {"shape": list(embeddings.shape), "embeddings": base64.b64encode(embeddings.tobytes()).decode("ascii")}
+
+    def align_chapter(self, payload):
+        span_mode = payload.get("span_mode", DEFAULT_SPAN_MODE)
+        align_function = load_aligner(payload.get("aligner", "greedy"), self.device, span_mode)
+        with self.job_lock:
+            start_time = time.perf_counter()
+            pairs = process_chapter_alignment(self.nlp_en, self.nlp_zh, payload["en_path"], payload["zh_path"],
+                                              payload["output_path"], align_function, self.batcher, self.device,
+                                              span_mode, payload.get("segment", False))
+            self.save_cache()
+            self.n_jobs += 1
+            return {"pairs": len(pairs), "elapsed": time.perf_counter() - start_time}
+
+    def health(self):
+        return {
+            "status": "ok",
+            "device": self.device,
+            "splitter": self.splitter,
+            "model_backend": self.model_backend,
+            "jobs": self.n_jobs,
+            "encode_requests": self.batcher.n_requests,
+            "batches": self.batcher.n_batches,
+            "texts": self.batcher.n_texts,
+        }
+
+class WorkerHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health: 狀態與統計 (含 worker 使用的 splitter / model_backend)
+    POST /encode: {"texts": [...], "normalize_embeddings": bool} -> {"shape": [n, dim], "embeddings": base64 float32}
+    POST /align:  {"en_path", "zh_path", "output_path", "aligner", "span_mode", "segment"} -> {"pairs", "elapsed"}
+    """
+    routes = {"/encode": "encode", "/align": "align_chapter"}
+
+    def _reply(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": f"unknown path: {self.path}"})
+        self._reply(200, self.server.worker.health())
+
+    def do_POST(self):
+        if self.path not in self.routes:
+            return self._reply(404, {"error": f"unknown path: {self.path}"})
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError as e:
+            return self._reply(400, {"error": f"JSON 格式錯誤: {e}"})
+        try:
+            self._reply(200, getattr(self.server.worker, self.routes[self.path])(payload))
+        except Exception as e:
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        pass  # 不逐筆印出請求
+
+def serve(worker, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = ThreadingHTTPServer((host, port), WorkerHandler)
+    server.daemon_threads = True
+    server.worker = worker
+    print(f"Alignment worker listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        worker.save_cache()
+        if worker.encoder is not worker.model:
+            worker.encoder.cache.print_stats()
+
+# ---------------- client ----------------
+
+def _post(url, path, payload, timeout=JOB_TIMEOUT):
+    request = urllib.request.Request(url.rstrip("/") + path, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"alignment worker {path} 失敗: {json.loads(e.read()).get('error')}") from None
+
+def worker_health(url, timeout=10):
+    """GET /health：worker 的狀態、統計與實際使用的 splitter / model_backend"""
+    with urllib.request.urlopen(url.rstrip("/") + "/health", timeout=timeout) as response:
+        return json.loads(response.read())
+
+def submit_chapter(url, en_path, zh_path, output_path, aligner="greedy", span_mode=DEFAULT_SPAN_MODE, segment=False):
+    """請 worker 對齊一個章節 (輸出由 worker 直接寫入 output_path)，回傳 {"pairs", "elapsed"}"""
+    return _post(url, "/align", {
+        "en_path": os.path.abspath(en_path),
+        "zh_path": os.path.abspath(zh_path),
+        "output_path": os.path.abspath(output_path),
+        "aligner": aligner,
+        "span_mode": span_mode,
+        "segment": segment,
+    })
+
+class RemoteEncoder:
+    """
+    與 model.encode 相同的呼叫方式，編碼交給常駐 worker (例如調整閾值時反覆呼叫對齊函數，不用重新載入 LaBSE)；
+    embedding 以 CPU tensor / numpy 回傳
+    """
+    def __init__(self, url):
+        self.url = url
+        self.device = "cpu"
+
+    def encode(self, sentences, convert_to_tensor=False, device=None, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        result = _post(self.url, "/encode", {"texts": texts, "normalize_embeddings": normalize_embeddings})
+        embeddings = np.frombuffer(base64.b64decode(result["embeddings"]), dtype=np.float32).reshape(result["shape"])
+        if convert_to_tensor:
+            import torch
+            embeddings = torch.from_numpy(embeddings.copy()).to(device or self.device)
+        return embeddings[0] if single else embeddings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="常駐的句子對齊 worker：模型只載入一次，接受 main.py --worker 的章節與編碼請求")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model-backend", default=DEFAULT_MODEL_BACKEND, choices=MODEL_BACKENDS)
+    parser.add_argument("--splitter", default=DEFAULT_SPLITTER, choices=SPLITTERS)
+    parser.add_argument("--embedding-cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--embedding-cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2)
+    parser.add_argument("--no-embedding-cache", action="store_true")
+    args = parser.parse_args()
+
+    serve(AlignmentWorker(args.model_backend, args.splitter, args.embedding_cache_dir,
+                          int(args.embedding_cache_max_mb * 1024 ** 2), not args.no_embedding_cache),
+          args.host, args.port)
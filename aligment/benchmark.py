@@ -0,0 +1,503 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import functools
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_layout.catalog import DEFAULT_CATALOG_PATH, chapter_numbers, load_catalog, select_books
+
+import numpy as np
+
+from align_files import (PARAGRAPH_MERGE_WINDOW, PARAGRAPH_THRESHOLD, SPLIT_BATCH_SIZE, SPLIT_N_PROCESS,
+                         create_file_pairs, load_sentence_pipeline, load_sentence_splitters, process_chapter_alignment,
+                         read_paragraphs, split_sentences_batch, split_sentences_spacy)
+from book_alignment import align_book
+from chapter_segments import align_segmented
+from embedding_cache import CachedEncoder, EmbeddingCache
+from model_backend import MODEL_BACKENDS, MODEL_NAME, load_model
+from parallel_alignment import align_chapters_parallel, create_pool, default_config, threads_per_worker
+from span_embeddings import DEFAULT_SPAN_MODE, PrefetchEncoder, span_requests
+
+# ================= 設定區 =================
+# SentenceTransformer.encode 的預設 batch_size，用來換算 forward pass 次數
+ENCODE_BATCH_SIZE = 32
+# 可測試的項目
+MODES = ("spans", "cache", "approx", "dp", "sync", "backend", "book", "split", "rule", "parallel", "segment")
+# profile 時標記 model.encode 範圍，統計只算對齊計分的部分
+ENCODE_SCOPE = "benchmark::encode"
+# 會讓 host 等待 device 的 op (.item() / 搬回 CPU)
+SYNC_OPS = ("aten::item", "aten::_to_copy")
+KERNEL_LAUNCHES = ("cudaLaunchKernel", "cudaLaunchKernelExC")
+# =========================================
+
+class CountingModel:
+    """
+    包裝 SentenceTransformer，統計 encode 呼叫次數、編碼的文字數與 forward pass 次數
+    (每次 encode 依 batch_size 切批，每批一次 forward)
+    """
+    def __init__(self, model):
+        self.model = model
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.texts = 0
+        self.forward_passes = 0
+
+    def encode(self, sentences, **kwargs):
+        n = 1 if isinstance(sentences, str) else len(sentences)
+        self.calls += 1
+        self.texts += n
+        self.forward_passes += math.ceil(n / kwargs.get("batch_size", ENCODE_BATCH_SIZE))
+        import torch
+        with torch.profiler.record_function(ENCODE_SCOPE):
+            return self.model.encode(sentences, **kwargs)
+
+    def __getattr__(self, name):
+        # 其他屬性 (device 等) 直接轉給原本的模型
+        return getattr(self.model, name)
+
+def load_models(device):
+    """與 main.py 相同的模型設定"""
+    nlp_en, nlp_zh = load_sentence_splitters(device=device)
+    model = load_model(device)
+    return nlp_en, nlp_zh, model
+
+def get_align_function(device):
+    if device == "cuda":
+        from align_sentences_extended_gpu import align_sentences_extended_gpu
+        return align_sentences_extended_gpu
+    from align_sentences_extended import align_sentences_extended
+    return align_sentences_extended
+
+def run_chapter(label, nlp_en, nlp_zh, en_path, zh_path, align_function, model, device, span_mode=DEFAULT_SPAN_MODE):
+    """
+    對齊一個章節 (Stage 1 + Stage 2)，輸出寫到暫存檔；span_mode 為 align_function 使用的 span_mode
+    回傳: (句對 list, 耗時秒數)
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "aligned.jsonl")
+        start_time = time.perf_counter()
+        process_chapter_alignment(nlp_en, nlp_zh, en_path, zh_path, output_path, align_function, model, device, span_mode)
+        elapsed = time.perf_counter() - start_time
+        pairs = read_pairs(output_path)
+    print(f"[{label}] {elapsed:.2f}s, {len(pairs)} 句對")
+    return pairs, elapsed
+
+def read_pairs(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def compare_pairs(expected, actual):
+    """
+    回傳 (en / zh / type 完全相同的句對比例, 相同句對的最大分數差)
+    比例以兩邊句對數較多者為分母，某處對齊不同不會影響後面句對的比對
+    """
+    if not expected and not actual:
+        return 1.0, 0.0
+    key = lambda pair: (pair["en"], pair["zh"], pair["type"])
+    scores = {key(pair): pair["score"] for pair in expected}
+    n_same = sum((Counter(map(key, expected)) & Counter(map(key, actual))).values())
+    max_score_diff = max((abs(scores[key(pair)] - pair["score"]) for pair in actual if key(pair) in scores), default=0.0)
+    return n_same / max(len(expected), len(actual)), max_score_diff
+
+def bench_span_encoding(nlp_en, nlp_zh, en_path, zh_path, align_function, model, device):
+    """迴圈中逐一編碼合併片段 (span_mode="loop") vs 迴圈前一次編碼所有片段 (span_mode="batch")"""
+    counter = CountingModel(model)
+    results = {}
+    for label, span_mode in (("逐一編碼", "loop"), ("預先編碼", "batch")):
+        counter.reset()
+        function = functools.partial(align_function, span_mode=span_mode)
+        pairs, elapsed = run_chapter(label, nlp_en, nlp_zh, en_path, zh_path, function, counter, device, span_mode)
+        print(f"[{label}] encode 呼叫 {counter.calls} 次，{counter.texts} 段文字，forward pass {counter.forward_passes} 次")
+        results[label] = (pairs, elapsed, counter.forward_passes)
+
+    (base_pairs, base_time, base_passes), (pairs, elapsed, passes) = results["逐一編碼"], results["預先編碼"]
+    agreement, max_score_diff = compare_pairs(base_pairs, pairs)
+    print(f"forward pass {base_passes} -> {passes} (減少 {1 - passes / max(base_passes, 1):.1%})，"
+          f"耗時 {base_time:.2f}s -> {elapsed:.2f}s (加速 {base_time / elapsed:.2f}x)，"
+          f"句對一致率 {agreement:.2%}，最大分數差 {max_score_diff:.2e}")
+
+def bench_embedding_cache(nlp_en, nlp_zh, en_path, zh_path, align_function, model, device):
+    """空的 embedding 快取連跑同一章兩次：第二次 (重跑 / 調整閾值) 應幾乎不需要模型計算"""
+    counter = CountingModel(model)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        encoder = CachedEncoder(counter, EmbeddingCache(MODEL_NAME, cache_dir))
+        runs = []
+        for label in ("第一次", "重跑"):
+            counter.reset()
+            hits, misses = encoder.cache.hits, encoder.cache.misses
+            pairs, elapsed = run_chapter(label, nlp_en, nlp_zh, en_path, zh_path, align_function, encoder, device)
+            encoder.save()
+            print(f"[{label}] 命中 {encoder.cache.hits - hits} / 未命中 {encoder.cache.misses - misses}，"
+                  f"模型編碼 {counter.texts} 段文字 (forward pass {counter.forward_passes} 次)")
+            runs.append((pairs, elapsed))
+    (first_pairs, first_time), (pairs, elapsed) = runs
+    agreement, _ = compare_pairs(first_pairs, pairs)
+    print(f"耗時 {first_time:.2f}s -> {elapsed:.2f}s (加速 {first_time / elapsed:.2f}x)，句對一致率 {agreement:.2%}")
+
+def bench_span_approximation(nlp_en, nlp_zh, en_path, zh_path, align_function, model, device, reference_path=None):
+    """
+    合併片段實際編碼 (span_mode="batch") vs 單句 embedding 近似 (span_mode="approx")，
+    reference_path 有給時另與既有輸出 (aligment/pairs_sentence) 比較
+    回傳: {span_mode: (句對 list, 耗時秒數)}
+    """
+    counter = CountingModel(model)
+    results = {}
+    for span_mode in ("batch", "approx"):
+        counter.reset()
+        function = functools.partial(align_function, span_mode=span_mode)
+        pairs, elapsed = run_chapter(span_mode, nlp_en, nlp_zh, en_path, zh_path, function, counter, device, span_mode)
+        print(f"[{span_mode}] 模型編碼 {counter.texts} 段文字 (forward pass {counter.forward_passes} 次)")
+        results[span_mode] = (pairs, elapsed)
+
+    (exact_pairs, exact_time), (approx_pairs, approx_time) = results["batch"], results["approx"]
+    agreement, _ = compare_pairs(exact_pairs, approx_pairs)
+    print(f"耗時 {exact_time:.2f}s -> {approx_time:.2f}s (加速 {exact_time / approx_time:.2f}x)，"
+          f"句對一致率 (approx vs batch) {agreement:.2%}")
+    if reference_path and os.path.exists(reference_path):
+        reference = read_pairs(reference_path)
+        print(f"與 {os.path.basename(reference_path)} 的句對一致率: batch {compare_pairs(reference, exact_pairs)[0]:.2%}，"
+              f"approx {compare_pairs(reference, approx_pairs)[0]:.2%}")
+    return results
+
+def chapter_coverage(pairs, en_path):
+    """句對涵蓋的英文字數 / 章節英文總字數 (不含換行)"""
+    with open(en_path, "r", encoding="utf-8") as f:
+        total = sum(len(line.strip()) for line in f)
+    return sum(len(pair["en"]) for pair in pairs) / max(total, 1)
+
+def bench_dp_aligner(nlp_en, nlp_zh, en_path, zh_path, align_function, model, device, reference_path=None):
+    """greedy (align_sentences_extended / _gpu) vs 帶狀動態規劃 (align_sentences_dp)：速度、平均分數、涵蓋率、一致率"""
+    from align_sentences_dp import align_sentences_dp
+
+    results = {}
+    for label, function in (("greedy", align_function), ("dp", align_sentences_dp)):
+        pairs, elapsed = run_chapter(label, nlp_en, nlp_zh, en_path, zh_path, function, model, device)
+        mean_score = sum(pair["score"] for pair in pairs) / max(len(pairs), 1)
+        print(f"[{label}] 平均分數 {mean_score:.4f}，英文涵蓋率 {chapter_coverage(pairs, en_path):.2%}")
+        results[label] = (pairs, elapsed)
+
+    (greedy_pairs, greedy_time), (dp_pairs, dp_time) = results["greedy"], results["dp"]
+    print(f"耗時 {greedy_time:.2f}s -> {dp_time:.2f}s ({greedy_time / dp_time:.2f}x)，"
+          f"句對一致率 (dp vs greedy) {compare_pairs(greedy_pairs, dp_pairs)[0]:.2%}")
+    if reference_path and os.path.exists(reference_path):
+        reference = read_pairs(reference_path)
+        print(f"與 {os.path.basename(reference_path)} 的句對一致率: greedy {compare_pairs(reference, greedy_pairs)[0]:.2%}，"
+              f"dp {compare_pairs(reference, dp_pairs)[0]:.2%}")
+    return results
+
+def profile_scoring(function):
+    """
+    以 torch.profiler 執行 function()，統計 model.encode (ENCODE_SCOPE) 以外、也就是對齊計分部分的
+    host 同步次數、最上層 aten op 數與 CUDA kernel launch 數
+    回傳: (function 的回傳值, {"syncs", "ops", "launches"})
+    """
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    with profile(activities=activities) as prof:
+        result = function()
+
+    def ancestors(event):
+        event = event.cpu_parent
+        while event is not None:
+            yield event
+            event = event.cpu_parent
+
+    counts = {"syncs": 0, "ops": 0, "launches": 0}
+    for event in prof.events():
+        parents = [parent.name for parent in ancestors(event)]
+        if event.name == ENCODE_SCOPE or ENCODE_SCOPE in parents:
+            continue
+        if event.name in SYNC_OPS:
+            counts["syncs"] += 1
+        if event.name.startswith("aten::") and not any(name.startswith("aten::") for name in parents):
+            counts["ops"] += 1
+        if event.name in KERNEL_LAUNCHES:
+            counts["launches"] += 1
+    return result, counts
+
+def bench_sync_profile(nlp_en, nlp_zh, en_path, zh_path, align_function, model, device):
+    """
+    逐對 util.cos_sim(...).item() 計分 (span_mode="loop") vs 相似度矩陣一次搬回 CPU 查表 (span_mode="batch")，
+    model.encode 不列入統計；CPU 上沒有 kernel launch，以 aten op 數代表
+    """
+    counter = CountingModel(model)
+    results = {}
+    for label, span_mode in (("逐對計分", "loop"), ("矩陣查表", "batch")):
+        function = functools.partial(align_function, span_mode=span_mode)
+        (pairs, elapsed), counts = profile_scoring(
+            lambda: run_chapter(label, nlp_en, nlp_zh, en_path, zh_path, function, counter, device, span_mode))
+        print(f"[{label}] host 同步 {counts['syncs']} 次，aten op {counts['ops']} 個，kernel launch {counts['launches']} 次")
+        results[label] = (pairs, counts)
+
+    (base_pairs, base_counts), (pairs, counts) = results["逐對計分"], results["矩陣查表"]
+    agreement, max_score_diff = compare_pairs(base_pairs, pairs)
+    print(f"減少 host 同步 {base_counts['syncs'] - counts['syncs']} 次，aten op {base_counts['ops'] - counts['ops']} 個，"
+          f"kernel launch {base_counts['launches'] - counts['launches']} 次；"
+          f"句對一致率 {agreement:.2%}，最大分數差 {max_score_diff:.2e}")
+
+def chapter_sentences(nlp_en, nlp_zh, en_path, zh_path):
+    """章節中所有段落斷句後的英文 + 中文句子 (與 Stage 2 的輸入相同)"""
+    sentences = []
+    for path, nlp in ((en_path, nlp_en), (zh_path, nlp_zh)):
+        for paragraph_sentences in split_sentences_batch(nlp, read_paragraphs(path)):
+            sentences.extend(paragraph_sentences)
+    return sentences
+
+def bench_model_backends(nlp_en, nlp_zh, en_path, zh_path, align_function, backend_models, device):
+    """
+    backend_models: {model_backend: model}，第一個為基準 (torch fp32)
+    比較各 backend 編碼本章句子的速度 (句/秒)、embedding 與基準的 cos 相似度 (drift)，以及對齊結果一致率
+    """
+    sentences = chapter_sentences(nlp_en, nlp_zh, en_path, zh_path)
+    print(f"{len(sentences)} 句")
+    base_embeddings, base_pairs = None, None
+    for model_backend, model in backend_models.items():
+        model_device = device if model_backend == "torch" else "cpu"
+        model.encode(sentences[:ENCODE_BATCH_SIZE], show_progress_bar=False)  # 暖機 (第一次呼叫較慢)
+        start_time = time.perf_counter()
+        embeddings = model.encode(sentences, show_progress_bar=False, normalize_embeddings=True)
+        rate = len(sentences) / (time.perf_counter() - start_time)
+        function = align_function if model_device == device else get_align_function("cpu")
+        pairs, _ = run_chapter(model_backend, nlp_en, nlp_zh, en_path, zh_path, function, model, model_device)
+
+        line = f"[{model_backend}] {rate:.1f} 句/秒"
+        if base_embeddings is None:
+            base_embeddings, base_pairs, base_rate = embeddings, pairs, rate
+        else:
+            cosine = np.sum(np.asarray(embeddings) * np.asarray(base_embeddings), axis=1)
+            line += (f" ({rate / base_rate:.2f}x)，與 {next(iter(backend_models))} 的 cos: 平均 {cosine.mean():.4f} / "
+                     f"1% 分位 {np.percentile(cosine, 1):.4f} / 最小 {cosine.min():.4f}，"
+                     f"句對一致率 {compare_pairs(base_pairs, pairs)[0]:.2%}")
+        print(line)
+
+def bench_book_batch(nlp_en, nlp_zh, chapter_pairs, align_function, model, device, span_mode=DEFAULT_SPAN_MODE):
+    """
+    逐章 process_chapter_alignment vs 整本書一起批次編碼 (align_book)：端到端耗時、forward pass 次數、輸出一致率
+    span_mode: align_function 使用的 span_mode
+    """
+    counter = CountingModel(model)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        outputs = {label: [os.path.join(tmp_dir, f"{label}_{i}.jsonl") for i in range(len(chapter_pairs))]
+                   for label in ("chapter", "book")}
+        times = {}
+        for label in ("chapter", "book"):
+            counter.reset()
+            start_time = time.perf_counter()
+            if label == "chapter":
+                for (en_path, zh_path), output_path in zip(chapter_pairs, outputs[label]):
+                    process_chapter_alignment(nlp_en, nlp_zh, en_path, zh_path, output_path, align_function, counter, device,
+                                              span_mode)
+            else:
+                align_book(nlp_en, nlp_zh, chapter_pairs, outputs[label], align_function, counter, device, span_mode)
+            times[label] = time.perf_counter() - start_time
+            print(f"[{label}] {times[label]:.2f}s，encode 呼叫 {counter.calls} 次，forward pass {counter.forward_passes} 次")
+
+        agreements = [compare_pairs(read_pairs(chapter_path), read_pairs(book_path))
+                      for chapter_path, book_path in zip(outputs["chapter"], outputs["book"])]
+    print(f"{len(chapter_pairs)} 章，耗時 {times['chapter']:.2f}s -> {times['book']:.2f}s "
+          f"(加速 {times['chapter'] / times['book']:.2f}x)，"
+          f"句對一致率最低 {min(rate for rate, _ in agreements):.2%}，最大分數差 {max(diff for _, diff in agreements):.2e}")
+
+def bench_sentence_split(chapter_pairs, batch_size, n_process):
+    """
+    原本的斷句 (完整 pipeline，一次一段 nlp(text)) vs 精簡 pipeline + nlp.pipe 批次 (parser / senter)：
+    段落/秒，以及每段斷句結果與原本完全相同的比例
+    """
+    import spacy
+
+    paragraphs = {"en": [], "zh": []}
+    for en_path, zh_path in chapter_pairs:
+        paragraphs["en"].extend(read_paragraphs(en_path))
+        paragraphs["zh"].extend(read_paragraphs(zh_path))
+
+    for lang, name in (("en", "en_core_web_sm"), ("zh", "zh_core_web_sm")):
+        texts = paragraphs[lang]
+        full = spacy.load(name)
+        nlp_args = (full, None) if lang == "en" else (None, full)
+        start_time = time.perf_counter()
+        base = [split_sentences_spacy(*nlp_args, text, lang) for text in texts]
+        base_rate = len(texts) / (time.perf_counter() - start_time)
+        print(f"[{lang}] {len(texts)} 段，完整 pipeline 逐段: {base_rate:.1f} 段/秒 ({', '.join(full.pipe_names)})")
+
+        for label, use_senter in (("parser", False), ("senter", True)):
+            nlp = load_sentence_pipeline(name, use_senter)
+            start_time = time.perf_counter()
+            results = split_sentences_batch(nlp, texts, batch_size, n_process)
+            rate = len(texts) / (time.perf_counter() - start_time)
+            same = sum(a == b for a, b in zip(base, results)) / max(len(texts), 1)
+            print(f"[{lang}] 精簡 pipeline + nlp.pipe ({label}: {', '.join(nlp.pipe_names)}): {rate:.1f} 段/秒 "
+                  f"(加速 {rate / base_rate:.2f}x)，斷句結果相同 {same:.2%}")
+
+def sentence_boundaries(text, sentences):
+    """斷句結果在段落中的句尾位置 (字元 offset，不含段落結尾)"""
+    ends = set()
+    cursor = 0
+    for sentence in sentences:
+        start = text.find(sentence, cursor)
+        if start < 0:
+            continue
+        cursor = start + len(sentence)
+        ends.add(cursor)
+    ends.discard(len(text))
+    return ends
+
+def bench_rule_splitter(chapter_pairs, batch_size, n_process):
+    """
+    規則式斷句 (rule_splitter) vs spaCy (精簡 pipeline + nlp.pipe)：
+    段落/秒，以及以 spaCy 為基準的句尾位置 precision / recall / F1 與整段完全相同的比例
+    """
+    splitters = {"spacy": load_sentence_splitters("spacy"), "rule": load_sentence_splitters("rule")}
+    for lang, column in (("en", 0), ("zh", 1)):
+        texts = [paragraph for pair in chapter_pairs for paragraph in read_paragraphs(pair[column])]
+        results, rates = {}, {}
+        for label, nlps in splitters.items():
+            start_time = time.perf_counter()
+            results[label] = split_sentences_batch(nlps[column], texts, batch_size, n_process)
+            rates[label] = len(texts) / (time.perf_counter() - start_time)
+
+        n_same = n_expected = n_actual = n_match = 0
+        for text, expected, actual in zip(texts, results["spacy"], results["rule"]):
+            n_same += expected == actual
+            expected, actual = sentence_boundaries(text, expected), sentence_boundaries(text, actual)
+            n_expected += len(expected)
+            n_actual += len(actual)
+            n_match += len(expected & actual)
+        precision, recall = n_match / max(n_actual, 1), n_match / max(n_expected, 1)
+        f1 = 2 * precision * recall / max(precision + recall, 1e-12)
+        print(f"[{lang}] {len(texts)} 段，spaCy {rates['spacy']:.1f} 段/秒，rule {rates['rule']:.1f} 段/秒 "
+              f"(加速 {rates['rule'] / rates['spacy']:.1f}x)")
+        print(f"[{lang}] 句尾 precision {precision:.2%} / recall {recall:.2%} / F1 {f1:.2%} "
+              f"(spaCy {n_expected} 個，rule {n_actual} 個)，整段斷句相同 {n_same / max(len(texts), 1):.2%}")
+
+def bench_segments(en_path, zh_path, align_function, model, device):
+    """
+    Stage 1 段落對齊：整章一次對齊 vs 以錨點切段後分段對齊 (chapter_segments)：段數、耗時與段落配對一致率
+    兩邊用到的段落 / 合併段落事先一起編碼，耗時只算對齊本身
+    """
+    en_paragraphs, zh_paragraphs = read_paragraphs(en_path), read_paragraphs(zh_path)
+    encoder = PrefetchEncoder(model)
+    encoder.prefetch(span_requests(en_paragraphs, zh_paragraphs, PARAGRAPH_MERGE_WINDOW), device=device)
+
+    start_time = time.perf_counter()
+    full_pairs = align_function(encoder, device, en_paragraphs, zh_paragraphs, threshold=PARAGRAPH_THRESHOLD,
+                                max_merge_window=PARAGRAPH_MERGE_WINDOW)
+    full_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    segment_pairs, stats = align_segmented(en_paragraphs, zh_paragraphs, align_function, encoder, device,
+                                           PARAGRAPH_THRESHOLD, PARAGRAPH_MERGE_WINDOW)
+    segment_time = time.perf_counter() - start_time
+
+    print(f"段落 {len(en_paragraphs)} / {len(zh_paragraphs)}，錨點 {stats['anchors']} 個 -> {stats['segments']} 段 "
+          f"(最大 {stats['max_segment']} 段，相似度表計算量估計為整章的 {stats['cost_ratio']:.1%})")
+    print(f"耗時 {full_time:.3f}s -> {segment_time:.3f}s (加速 {full_time / max(segment_time, 1e-9):.2f}x)，"
+          f"段落配對 {len(full_pairs)} -> {len(segment_pairs)}，一致率 {compare_pairs(full_pairs, segment_pairs)[0]:.2%}")
+    return stats, full_time, segment_time
+
+def bench_parallel(chapter_pairs, n_workers):
+    """
+    CPU 上逐章執行 vs n_workers 個 process 平行對齊 (parallel_alignment)：章/分，以及輸出檔是否完全相同
+    兩邊都不使用 embedding 快取；平行版的時間包含 worker 載入模型
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        outputs = {label: [os.path.join(tmp_dir, f"{label}_{i}.jsonl") for i in range(len(chapter_pairs))]
+                   for label in ("serial", "parallel")}
+
+        nlp_en, nlp_zh, model = load_models("cpu")
+        align_function = get_align_function("cpu")
+        start_time = time.perf_counter()
+        for (en_path, zh_path), output_path in zip(chapter_pairs, outputs["serial"]):
+            process_chapter_alignment(nlp_en, nlp_zh, en_path, zh_path, output_path, align_function, model, "cpu")
+        serial_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        pool = create_pool(n_workers, default_config(use_cache=False))
+        align_chapters_parallel(pool, [(en_path, zh_path, output_path) for (en_path, zh_path), output_path
+                                       in zip(chapter_pairs, outputs["parallel"])])
+        pool.close()
+        pool.join()
+        parallel_time = time.perf_counter() - start_time
+
+        n_identical = 0
+        for serial_path, parallel_path in zip(outputs["serial"], outputs["parallel"]):
+            with open(serial_path, "rb") as f1, open(parallel_path, "rb") as f2:
+                n_identical += f1.read() == f2.read()
+
+    n = len(chapter_pairs)
+    print(f"逐章: {n / serial_time * 60:.1f} 章/分 ({serial_time:.1f}s)，"
+          f"平行 {n_workers} x {threads_per_worker(n_workers)} 執行緒: {n / parallel_time * 60:.1f} 章/分 "
+          f"({parallel_time:.1f}s，加速 {serial_time / parallel_time:.2f}x)，輸出檔完全相同 {n_identical}/{n}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="句子對齊 benchmark (以 catalog.json 中一本書的一個章節測試)")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--book", help="書籍 id (預設第一本)")
+    parser.add_argument("--chapters", type=int, nargs="*", default=[0],
+                        help="create_file_pairs 結果中的第幾組章節 (可多個，不給值代表全部)")
+    parser.add_argument("--mode", default="spans", choices=MODES,
+                        help="spans: 合併片段預先編碼 / cache: embedding 快取重跑 / approx: 合併片段近似 vs 實際編碼 / "
+                             "dp: 帶狀動態規劃 vs greedy / sync: 對齊計分的 host 同步與 kernel 數 (profile) / "
+                             "backend: LaBSE 推論方式 (torch / onnx / onnx-int8) 的速度與 embedding 誤差 / "
+                             "book: 逐章 vs 整本書批次編碼 (--chapters 的所有章節一起) / "
+                             "split: spaCy 斷句 (完整 pipeline 逐段 vs 精簡 pipeline + nlp.pipe) / "
+                             "rule: 規則式斷句 vs spaCy 的速度與句尾一致率 / "
+                             "parallel: CPU 逐章 vs 多 process 平行 (--chapters 的所有章節) / "
+                             "segment: 段落對齊整章 vs 以錨點切段")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() // 2 or 1, help="--mode parallel 的 process 數")
+    parser.add_argument("--split-batch-size", type=int, default=SPLIT_BATCH_SIZE, help="--mode split / rule 的 nlp.pipe batch_size")
+    parser.add_argument("--split-n-process", type=int, default=SPLIT_N_PROCESS, help="--mode split / rule 的 nlp.pipe n_process")
+    parser.add_argument("--model-backends", nargs="+", default=list(MODEL_BACKENDS), choices=MODEL_BACKENDS,
+                        help="--mode backend 要比較的推論方式 (第一個為基準)")
+    args = parser.parse_args()
+
+    import torch
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    book = select_books(load_catalog(args.catalog), [args.book] if args.book else None)[0]
+    chapter_pairs = create_file_pairs(book["editions"]["en"]["output"], book["editions"]["zh"]["output"],
+                                      chapter_numbers(book))
+    chapters = args.chapters or range(len(chapter_pairs))
+    print(f"Running on: {device}")
+
+    if args.mode == "parallel":
+        bench_parallel([chapter_pairs[chapter] for chapter in chapters], args.jobs)
+        sys.exit()
+    if args.mode in ("split", "rule"):
+        bench = bench_sentence_split if args.mode == "split" else bench_rule_splitter
+        bench([chapter_pairs[chapter] for chapter in chapters], args.split_batch_size, args.split_n_process)
+        sys.exit()
+    nlp_en, nlp_zh, model = load_models(device)
+    align_function = get_align_function(device)
+    if args.mode == "backend":
+        backend_models = {model_backend: model if model_backend == "torch" else load_model(device, model_backend)
+                          for model_backend in args.model_backends}
+    if args.mode == "book":
+        bench_book_batch(nlp_en, nlp_zh, [chapter_pairs[chapter] for chapter in chapters], align_function, model, device)
+        sys.exit()
+    for chapter in chapters:
+        en_path, zh_path = chapter_pairs[chapter]
+        print(f"\n=== 章節 {chapter}: {os.path.basename(en_path)} / {os.path.basename(zh_path)} ===")
+        if args.mode == "spans":
+            bench_span_encoding(nlp_en, nlp_zh, en_path, zh_path, align_function, model, device)
+        elif args.mode == "cache":
+            bench_embedding_cache(nlp_en, nlp_zh, en_path, zh_path, align_function, model, device)
+        elif args.mode == "sync":
+            bench_sync_profile(nlp_en, nlp_zh, en_path, zh_path, align_function, model, device)
+        elif args.mode == "segment":
+            bench_segments(en_path, zh_path, align_function, model, device)
+        elif args.mode == "backend":
+            bench_model_backends(nlp_en, nlp_zh, en_path, zh_path, align_function, backend_models, device)
+        else:
+            # main.py 的輸出檔名為 aligned_ch{章節 index}.jsonl
+            reference_path = os.path.join(book["alignment_output"], f"aligned_ch{chapter}.jsonl")
+            bench = bench_span_approximation if args.mode == "approx" else bench_dp_aligner
+            bench(nlp_en, nlp_zh, en_path, zh_path, align_function, model, device, reference_path)
@@ -0,0 +1,40 @@
+from align_files import (PARAGRAPH_MERGE_WINDOW, SENTENCE_MERGE_WINDOW, align_chapter_paragraphs,
+                         align_chapter_sentences, read_paragraphs, split_paragraph_pairs, write_sentence_pairs)
+from span_embeddings import DEFAULT_SPAN_MODE, PrefetchEncoder, span_requests
+
+def align_book(nlp_en, nlp_zh, chapter_pairs, output_paths, align_sentences_function, model, device,
+               span_mode=DEFAULT_SPAN_MODE, on_done=None, segment=False):
+    """
+    整本書一起對齊，輸出與逐章呼叫 process_chapter_alignment 相同：
+    1. 所有章節 Stage 1 要用的段落 / 合併段落一次編碼，再逐章做段落對齊
+    2. 所有章節的段落斷句後，Stage 2 要用的句子 / 合併句一次編碼，再逐章做句子對齊並寫檔
+    chapter_pairs: [(en_path, zh_path)]，output_paths: 對應的輸出檔
+    span_mode: 需與 align_sentences_function 使用的相同，決定要預先編碼哪些文字
+    on_done((en_path, zh_path, output_path), 句對數): 每寫完一章就呼叫
+    segment: Stage 1 以錨點切段後分段對齊 (預先編碼的合併段落仍以整章為準，切段後用到的是其中一部分)
+    """
+    encoder = PrefetchEncoder(model)
+    chapters = [(read_paragraphs(en_path), read_paragraphs(zh_path)) for en_path, zh_path in chapter_pairs]
+    print(f"Book: {len(chapters)} chapters, {sum(len(en) for en, _ in chapters)} EN paragraphs, "
+          f"{sum(len(zh) for _, zh in chapters)} ZH paragraphs.")
+
+    # --- Stage 1 ---
+    encoder.prefetch([text for en_paragraphs, zh_paragraphs in chapters
+                      for text in span_requests(en_paragraphs, zh_paragraphs, PARAGRAPH_MERGE_WINDOW, span_mode)],
+                     device=device)
+    aligned_chapters = [align_chapter_paragraphs(en_paragraphs, zh_paragraphs, align_sentences_function, encoder, device,
+                                                 span_mode, segment)
+                        for en_paragraphs, zh_paragraphs in chapters]
+
+    # --- Stage 2 ---
+    split_chapters = [split_paragraph_pairs(nlp_en, nlp_zh, aligned_paragraphs) for aligned_paragraphs in aligned_chapters]
+    encoder.clear()
+    encoder.prefetch([text for split_pairs in split_chapters for _, sents_en, sents_zh in split_pairs
+                      for text in span_requests(sents_en, sents_zh, SENTENCE_MERGE_WINDOW, span_mode)],
+                     device=device)
+    for (en_path, zh_path), split_pairs, output_path in zip(chapter_pairs, split_chapters, output_paths):
+        sentence_pairs = align_chapter_sentences(split_pairs, align_sentences_function, encoder, device, span_mode)
+        write_sentence_pairs(output_path, sentence_pairs)
+        if on_done is not None:
+            on_done((en_path, zh_path, output_path), len(sentence_pairs))
+    encoder.clear()
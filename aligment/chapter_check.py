@@ -0,0 +1,145 @@
+import os
+import re
+import sys
+import argparse
+import statistics
+
+# ================= 設定區 =================
+# 章節配對的快速檢查 (不需要任何模型，只讀檔案)：編號錯位或切錯的章節在送進 LaBSE 之前就被發現
+# 字數比 (ZH 字元 / EN 字元) 與段落數比 (ZH 段數 / EN 段數) 跟整本書的中位數相差超過這個倍數就視為可疑
+LENGTH_RATIO_TOLERANCE = 1.5
+PARAGRAPH_RATIO_TOLERANCE = 1.5
+# 太短的章節 (例如只有標題、題詞) 比例不穩定，不檢查字數比 / 段落數比
+MIN_CHECK_CHARS = 500
+# 錨點：ZH 文中出現的阿拉伯數字與拉丁字母詞 (人名縮寫、DNA、GPS...)，翻譯時通常原樣保留
+# ZH 至少有 ANCHOR_MIN_COUNT 個錨點時，出現在 EN 的比例低於 ANCHOR_MIN_OVERLAP 視為可疑
+ANCHOR_MIN_COUNT = 3
+ANCHOR_MIN_OVERLAP = 0.2
+# "flag": 只列出可疑章節，照常對齊 / "skip": 可疑章節不對齊 / "off": 不檢查
+PAIR_CHECK_POLICIES = ("flag", "skip", "off")
+DEFAULT_PAIR_CHECK = "flag"
+# =========================================
+
+_CHAPTER_FILE = re.compile(r"(\d{3})_")
+_ANCHOR = re.compile(r"\d[\d,]*|[A-Za-z][A-Za-z'’-]+")
+
+def index_chapter_files(dir_path):
+    """
+    資料夾中 "001_章節名.txt" 格式的檔案依序號建立索引 {序號: 檔名}；
+    同一序號有多個檔案 (通常是章節切錯) 時警告並使用排序後的第一個
+    """
+    index = {}
+    for file_name in sorted(os.listdir(dir_path)):
+        match = _CHAPTER_FILE.match(file_name)
+        if not match:
+            continue
+        number = int(match.group(1))
+        if number in index:
+            print(f"警告: {dir_path} 中序號 {number:03d} 有多個檔案，使用 '{index[number]}'，忽略 '{file_name}'")
+            continue
+        index[number] = file_name
+    return index
+
+def anchors(text):
+    """阿拉伯數字 (去掉千分位逗號) 與拉丁字母詞，不分大小寫"""
+    return {token.replace(",", "").lower() for token in _ANCHOR.findall(text)}
+
+def chapter_stats(en_path, zh_path):
+    """一組章節的字數、段落數 (一行一段落，與 read_paragraphs 相同) 與錨點"""
+    stats = {}
+    for lang, path in (("en", en_path), ("zh", zh_path)):
+        with open(path, 'r', encoding='utf-8') as f:
+            paragraphs = [line.strip() for line in f if line.strip()]
+        stats[f"{lang}_chars"] = sum(len(paragraph) for paragraph in paragraphs)
+        stats[f"{lang}_paragraphs"] = len(paragraphs)
+        stats[f"{lang}_anchors"] = anchors("\n".join(paragraphs))
+    return stats
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else float("inf")
+
+def _outside(value, median, tolerance):
+    return median > 0 and not median / tolerance <= value <= median * tolerance
+
+def check_chapter_pairs(chapter_pairs):
+    """
+    檢查每組 (en_path, zh_path)，回傳對應的 [(stats, 可疑原因列表)]
+    字數比 / 段落數比以整本書的中位數為基準 (不同語言、譯者的比例不同)，章節太少時中位數就是自己，不會被標記
+    """
+    all_stats = [chapter_stats(en_path, zh_path) for en_path, zh_path in chapter_pairs]
+    for stats in all_stats:
+        stats["length_ratio"] = _ratio(stats["zh_chars"], stats["en_chars"])
+        stats["paragraph_ratio"] = _ratio(stats["zh_paragraphs"], stats["en_paragraphs"])
+        stats["checked"] = min(stats["en_chars"], stats["zh_chars"]) >= MIN_CHECK_CHARS
+    checked = [stats for stats in all_stats if stats["checked"]]
+    length_median = statistics.median([stats["length_ratio"] for stats in checked]) if checked else 0
+    paragraph_median = statistics.median([stats["paragraph_ratio"] for stats in checked]) if checked else 0
+
+    results = []
+    for stats in all_stats:
+        reasons = []
+        if not stats["en_paragraphs"] or not stats["zh_paragraphs"]:
+            reasons.append("有一邊是空檔")
+        elif stats["checked"]:
+            if _outside(stats["length_ratio"], length_median, LENGTH_RATIO_TOLERANCE):
+                reasons.append(f"字數比 {stats['length_ratio']:.2f} (全書中位數 {length_median:.2f})")
+            if _outside(stats["paragraph_ratio"], paragraph_median, PARAGRAPH_RATIO_TOLERANCE):
+                reasons.append(f"段落數 {stats['en_paragraphs']} / {stats['zh_paragraphs']} "
+                               f"(比例 {stats['paragraph_ratio']:.2f}，全書中位數 {paragraph_median:.2f})")
+        zh_anchors = stats["zh_anchors"]
+        if len(zh_anchors) >= ANCHOR_MIN_COUNT:
+            overlap = len(zh_anchors & stats["en_anchors"]) / len(zh_anchors)
+            if overlap < ANCHOR_MIN_OVERLAP:
+                reasons.append(f"ZH 的數字 / 英文詞只有 {overlap:.0%} 出現在 EN ({', '.join(sorted(zh_anchors)[:5])})")
+        results.append((stats, reasons))
+    return results
+
+def screen_chapter_pairs(name, chapter_pairs, output_paths, policy=DEFAULT_PAIR_CHECK):
+    """
+    對齊前檢查一本書的章節配對並印出可疑章節；policy="skip" 時從 (chapter_pairs, output_paths) 移除可疑章節，
+    並以字元數 (編碼量大致與字元數成正比) 估算省下的對齊計算量。回傳 (chapter_pairs, output_paths)
+    """
+    if policy == "off" or not chapter_pairs:
+        return chapter_pairs, output_paths
+
+    results = check_chapter_pairs(chapter_pairs)
+    kept_pairs, kept_outputs = [], []
+    skipped_chars = 0
+    for (en_path, zh_path), output_path, (stats, reasons) in zip(chapter_pairs, output_paths, results):
+        if reasons:
+            action = "跳過" if policy == "skip" else "可疑"
+            print(f"[{name}] {action}: {os.path.basename(en_path)} <-> {os.path.basename(zh_path)}：{'；'.join(reasons)}")
+        if reasons and policy == "skip":
+            skipped_chars += stats["en_chars"] + stats["zh_chars"]
+            continue
+        kept_pairs.append((en_path, zh_path))
+        kept_outputs.append(output_path)
+
+    n_flagged = sum(1 for _, reasons in results if reasons)
+    if policy == "skip" and n_flagged:
+        total_chars = sum(stats["en_chars"] + stats["zh_chars"] for stats, _ in results)
+        print(f"[{name}] 配對檢查跳過 {n_flagged}/{len(chapter_pairs)} 章，"
+              f"省下約 {skipped_chars / max(total_chars, 1):.1%} 的對齊計算量 ({skipped_chars} 字元)")
+    elif n_flagged:
+        print(f"[{name}] 配對檢查: {n_flagged}/{len(chapter_pairs)} 章可疑 (仍會對齊，--pair-check skip 可跳過)")
+    return kept_pairs, kept_outputs
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from pdf_layout.catalog import DEFAULT_CATALOG_PATH, chapter_numbers, load_catalog, select_books
+
+    parser = argparse.ArgumentParser(description="不對齊，只檢查 catalog.json 中每本書的章節配對")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--books", nargs="*", help="只檢查這些書籍 id (預設全部)")
+    args = parser.parse_args()
+
+    for book in select_books(load_catalog(args.catalog), args.books):
+        if "en" not in book["editions"] or "zh" not in book["editions"]:
+            continue
+        # 與 align_files.create_file_pairs 相同的配對，但不 import 對齊模組 (不需要 torch)
+        en_dir, zh_dir = book["editions"]["en"]["output"], book["editions"]["zh"]["output"]
+        files_en, files_zh = index_chapter_files(en_dir), index_chapter_files(zh_dir)
+        chapter_pairs = [(os.path.join(en_dir, files_en[i]), os.path.join(zh_dir, files_zh[i]))
+                         for i in chapter_numbers(book) if i in files_en and i in files_zh]
+        print(f"[{book['id']}] {len(chapter_pairs)} 章")
+        screen_chapter_pairs(book["id"], chapter_pairs, [None] * len(chapter_pairs), "flag")
@@ -0,0 +1,178 @@
+import math
+import bisect
+
+import numpy as np
+
+from chapter_check import anchors
+from span_embeddings import DEFAULT_SPAN_MODE, PrefetchEncoder, similarity_tables, span_requests
+
+# ================= 設定區 =================
+# 錨點：幾乎確定的 1:1 段落配對，把章節切成互不相干的小段分別對齊
+# 相似度至少 ANCHOR_THRESHOLD，且是所在列與所在行的最大值 (互為最佳)，並比列 / 行中第二高的分數高出 ANCHOR_MARGIN
+ANCHOR_THRESHOLD = 0.85
+ANCHOR_MARGIN = 0.05
+# 兩段有共同的數字 / 英文詞，或兩段都是對話 (以引號開頭) 時，相似度門檻降低 EVIDENCE_BONUS
+EVIDENCE_BONUS = 0.10
+EN_DIALOGUE_MARKERS = "“\"‘'"
+ZH_DIALOGUE_MARKERS = "「『“‘\""
+# 錨點在兩邊章節中的相對位置 (0~1) 相差不超過 ANCHOR_MAX_DRIFT
+ANCHOR_MAX_DRIFT = 0.15
+# 每段最多 MAX_SEGMENT_PARAGRAPHS 段 (任一邊)：過長的段先在段內以較低的門檻 FALLBACK_ANCHOR_THRESHOLD 找錨點，
+# 仍然過長就沿對角線等分，每次對齊呼叫的相似度表不超過 MAX_SEGMENT_PARAGRAPHS^2
+MAX_SEGMENT_PARAGRAPHS = 40
+FALLBACK_ANCHOR_THRESHOLD = 0.70
+# =========================================
+
+def _has_evidence(en_paragraph, zh_paragraph):
+    """共同的數字 / 英文詞，或兩段都以引號開頭 (對話)"""
+    if anchors(en_paragraph) & anchors(zh_paragraph):
+        return True
+    return en_paragraph[:1] in EN_DIALOGUE_MARKERS and zh_paragraph[:1] in ZH_DIALOGUE_MARKERS
+
+def find_anchors(en_paragraphs, zh_paragraphs, similarities, anchor_threshold=ANCHOR_THRESHOLD):
+    """
+    similarities: [n, m] 的段落 cos 相似度
+    anchor_threshold: 相似度門檻 (過長的段內以 FALLBACK_ANCHOR_THRESHOLD 再找一次)
+    回傳: 依順序排列的錨點 [(i, j, 相似度)]，i 與 j 都嚴格遞增 (從候選中取最長的遞增序列，排除交叉的錨點)
+    """
+    n, m = similarities.shape
+    if n == 0 or m == 0:
+        return []
+    row_best = similarities.argmax(axis=1)
+    col_best = similarities.argmax(axis=0)
+    # 每列 / 每行的第二高分 (只有一列或一行時視為 -1)
+    row_second = np.sort(similarities, axis=1)[:, -2] if m > 1 else np.full(n, -1.0)
+    col_second = np.sort(similarities, axis=0)[-2, :] if n > 1 else np.full(m, -1.0)
+
+    candidates = []
+    for i, j in enumerate(row_best):
+        score = float(similarities[i, j])
+        if col_best[j] != i or score - max(row_second[i], col_second[j]) < ANCHOR_MARGIN:
+            continue
+        if abs((i + 0.5) / n - (j + 0.5) / m) > ANCHOR_MAX_DRIFT:
+            continue
+        threshold = anchor_threshold - (EVIDENCE_BONUS if _has_evidence(en_paragraphs[i], zh_paragraphs[j]) else 0)
+        if score >= threshold:
+            candidates.append((i, int(j), score))
+
+    # 候選已依 i 排序 (互為最佳，i / j 各不重複)，取 j 最長的遞增子序列
+    tails, tail_index, parents = [], [], []
+    for index, (_, j, _) in enumerate(candidates):
+        position = bisect.bisect_left(tails, j)
+        parents.append(tail_index[position - 1] if position else None)
+        if position == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[position] = j
+            tail_index[position] = index
+    chain = []
+    index = tail_index[-1] if tail_index else None
+    while index is not None:
+        chain.append(candidates[index])
+        index = parents[index]
+    return chain[::-1]
+
+def split_segments(n, m, anchor_pairs):
+    """錨點之間的區間: [(en_start, en_end, zh_start, zh_end)]，兩邊都是空的區間不列入"""
+    segments = []
+    en_start = zh_start = 0
+    for i, j, _ in list(anchor_pairs) + [(n, m, None)]:
+        if i > en_start or j > zh_start:
+            segments.append((en_start, i, zh_start, j))
+        en_start, zh_start = i + 1, j + 1
+    return segments
+
+def _segment_size(segment):
+    en_start, en_end, zh_start, zh_end = segment
+    return max(en_end - en_start, zh_end - zh_start)
+
+def cut_segment(segment, max_size=MAX_SEGMENT_PARAGRAPHS):
+    """沿對角線把區間等分成每段不超過 max_size 的小段 (沒有錨點可用時的最後手段)"""
+    en_start, en_end, zh_start, zh_end = segment
+    k = math.ceil(_segment_size(segment) / max_size)
+    if k <= 1:
+        return [segment]
+    en_cuts = [en_start + round((en_end - en_start) * t / k) for t in range(k + 1)]
+    zh_cuts = [zh_start + round((zh_end - zh_start) * t / k) for t in range(k + 1)]
+    return [(en_cuts[t], en_cuts[t + 1], zh_cuts[t], zh_cuts[t + 1]) for t in range(k)
+            if en_cuts[t + 1] > en_cuts[t] or zh_cuts[t + 1] > zh_cuts[t]]
+
+def plan_segments(en_paragraphs, zh_paragraphs, similarities, max_size=MAX_SEGMENT_PARAGRAPHS):
+    """
+    找錨點並把章節切成每段不超過 max_size 的區間
+    回傳: (錨點 [(i, j, 相似度)], 依順序排列的項目 [("segment", (en_start, en_end, zh_start, zh_end)) / ("anchor", (i, j, 相似度))])
+    """
+    n, m = similarities.shape
+    anchor_pairs = find_anchors(en_paragraphs, zh_paragraphs, similarities)
+    # 過長的段內以較低的門檻再找錨點 (只在段內找，與原有錨點不會交叉)
+    fallback_pairs = []
+    for en_start, en_end, zh_start, zh_end in split_segments(n, m, anchor_pairs):
+        if _segment_size((en_start, en_end, zh_start, zh_end)) <= max_size or en_end == en_start or zh_end == zh_start:
+            continue
+        fallback_pairs += [(en_start + i, zh_start + j, score) for i, j, score in
+                           find_anchors(en_paragraphs[en_start:en_end], zh_paragraphs[zh_start:zh_end],
+                                        similarities[en_start:en_end, zh_start:zh_end], FALLBACK_ANCHOR_THRESHOLD)]
+    anchor_pairs = sorted(anchor_pairs + fallback_pairs)
+
+    items = []
+    en_start = zh_start = 0
+    for i, j, score in anchor_pairs + [(n, m, None)]:
+        if i > en_start or j > zh_start:
+            items += [("segment", segment) for segment in cut_segment((en_start, i, zh_start, j), max_size)]
+        if score is not None:
+            items.append(("anchor", (i, j, score)))
+        en_start, zh_start = i + 1, j + 1
+    return anchor_pairs, items
+
+def align_segmented(en_paragraphs, zh_paragraphs, align_sentences_function, model, device, threshold, max_merge_window,
+                    span_mode=DEFAULT_SPAN_MODE):
+    """
+    先找錨點把章節切段 (每段最多 MAX_SEGMENT_PARAGRAPHS 段)，再對每一段分別呼叫 align_sentences_function，
+    結果依順序與錨點 (1:1) 接起來。
+    各段互不相干：所有段落 embedding 先一次編碼，每段的相似度表只有 (段內 EN 數 x 段內 ZH 數)，
+    不再是整章 n x m，一段對錯也不會把錯位帶到下一段。
+    各段在同一個 process 中依序對齊 (對齊迴圈是純 Python，thread 受 GIL 限制不會更快)，平行化由 main.py --jobs 逐章分配到多個 process
+    回傳: (與 align_sentences_function 相同格式的配對 list, {"anchors", "segments", "max_segment", "cost_ratio"})
+    cost_ratio: 各段 n_s * m_s 總和 / 整章 n * m (相似度表計算量的估計，不是實測耗時)
+    """
+    n, m = len(en_paragraphs), len(zh_paragraphs)
+    stats = {"anchors": 0, "segments": 1, "max_segment": max(n, m), "cost_ratio": 1.0}
+    if n == 0 or m == 0:
+        return align_sentences_function(model, device, en_paragraphs, zh_paragraphs, threshold=threshold,
+                                        max_merge_window=max_merge_window), stats
+
+    encoder = model if isinstance(model, PrefetchEncoder) else PrefetchEncoder(model)
+    encoder.prefetch(en_paragraphs + zh_paragraphs, device=device)
+    en_embeddings = encoder.encode(en_paragraphs, convert_to_tensor=True, device=device, show_progress_bar=False)
+    zh_embeddings = encoder.encode(zh_paragraphs, convert_to_tensor=True, device=device, show_progress_bar=False)
+    similarities = np.array(similarity_tables([en_embeddings], [zh_embeddings])[0][0], dtype=np.float32).reshape(n, m)
+
+    anchor_pairs, items = plan_segments(en_paragraphs, zh_paragraphs, similarities)
+    segments = [segment for kind, segment in items if kind == "segment"]
+    # 所有段要用的合併段落一次編碼
+    encoder.prefetch([text for en_start, en_end, zh_start, zh_end in segments
+                      for text in span_requests(en_paragraphs[en_start:en_end], zh_paragraphs[zh_start:zh_end],
+                                                max_merge_window, span_mode)], device=device)
+
+    segment_pairs = [align_sentences_function(encoder, device, en_paragraphs[en_start:en_end], zh_paragraphs[zh_start:zh_end],
+                                              threshold=threshold, max_merge_window=max_merge_window)
+                     for en_start, en_end, zh_start, zh_end in segments]
+
+    # 依順序接起來
+    aligned_pairs = []
+    segment_results = iter(segment_pairs)
+    for kind, item in items:
+        if kind == "segment":
+            aligned_pairs.extend(next(segment_results))
+        else:
+            i, j, score = item
+            aligned_pairs.append({"en": en_paragraphs[i], "zh": zh_paragraphs[j], "type": "1:1", "score": score})
+
+    stats.update(
+        anchors=len(anchor_pairs),
+        segments=len(segments),
+        max_segment=max(map(_segment_size, segments), default=0),
+        cost_ratio=sum((en_end - en_start) * (zh_end - zh_start) for en_start, en_end, zh_start, zh_end in segments) / (n * m),
+    )
+    return aligned_pairs, stats
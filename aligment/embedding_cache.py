@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# ================= 設定區 =================
+# 預設快取位置：專案根目錄下的 .embedding_cache/
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".embedding_cache")
+DEFAULT_MAX_BYTES = 1024 ** 3  # 1 GB (LaBSE 768 維 float32 約 35 萬筆)
+# 快取格式版本，欄位有變動時要 +1，舊快取會自動清空
+CACHE_FORMAT_VERSION = 1
+# =========================================
+
+def normalize_text(text):
+    """NFC 正規化 + 合併連續空白，只差在空白的同一段文字共用 embedding"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+def text_key(text, namespace=""):
+    """(namespace, 正規化文字) -> 20 bytes sha1"""
+    return hashlib.sha1(f"{namespace}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+class EmbeddingCache:
+    """
+    以 (模型名稱, 正規化文字 hash) 為 key 的 embedding 磁碟快取，每個模型一個子資料夾：
+    - vectors.f32: np.memmap [capacity, dim]，每列一筆 embedding
+    - keys.bin: 每列對應的文字 hash，載入 index 時核對 (index 尚未存檔就中斷時，不會拿到被覆寫的列)
+    - index.json: 依最近使用順序 (舊 -> 新) 的 [key, 列號]
+    容量由 max_bytes 換算，滿了之後淘汰最久沒用到的項目 (LRU)，同一時間只應有一個 process 寫入。
+    read_only=True 時只讀取既有快取 (多個 process 同時使用)，put_many / save 不做任何事。
+    """
+    def __init__(self, model_name, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, read_only=False):
+        self.model_name = model_name
+        self.read_only = read_only
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        model_key = hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:12]
+        self.model_dir = os.path.join(cache_dir, f"{re.sub(r'[^0-9A-Za-z_.-]', '_', model_name)}_{model_key}")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dim = None
+        self.capacity = 0
+        self.vectors = None
+        self.keys = None
+        self.index = OrderedDict()  # key (hex) -> 列號，依最近使用排序
+        self.free_slots = []
+        self._load_index()
+
+    def _path(self, name):
+        return os.path.join(self.model_dir, name)
+
+    def _load_index(self):
+        try:
+            with open(self._path("index.json"), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CACHE_FORMAT_VERSION:
+            return
+        # 容量 (max_bytes) 改變時舊檔的列數對不上，直接重建
+        if self._capacity(data["dim"]) != data["capacity"]:
+            return
+        self._open(data["dim"], "r" if self.read_only else "r+")
+        # 只保留列內容確實屬於該 key 的項目
+        self.index = OrderedDict((key, slot) for key, slot in data["entries"]
+                                 if self.keys[slot].tobytes() == bytes.fromhex(key))
+        used = set(self.index.values())
+        self.free_slots = [slot for slot in range(self.capacity - 1, -1, -1) if slot not in used]
+
+    def _capacity(self, dim):
+        return max(1, int(self.max_bytes // (dim * 4)))
+
+    def _open(self, dim, mode):
+        self.dim = dim
+        self.capacity = self._capacity(dim)
+        if mode == "w+":
+            os.makedirs(self.model_dir, exist_ok=True)
+            self.index = OrderedDict()
+            self.free_slots = list(range(self.capacity - 1, -1, -1))
+        self.vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode=mode, shape=(self.capacity, dim))
+        self.keys = np.memmap(self._path("keys.bin"), dtype=np.uint8, mode=mode, shape=(self.capacity, 20))
+
+    def get_many(self, keys):
+        """keys: text_key list -> 每個 key 的 embedding (np.ndarray) 或 None"""
+        results = []
+        for key in keys:
+            slot = self.index.get(key.hex())
+            if slot is not None:
+                self.index.move_to_end(key.hex())
+                results.append(np.array(self.vectors[slot]))
+                self.hits += 1
+            else:
+                results.append(None)
+                self.misses += 1
+        return results
+
+    def put_many(self, keys, vectors):
+        if self.read_only:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.vectors is None:
+            self._open(vectors.shape[1], "w+")
+        for key, vector in zip(keys, vectors):
+            if key.hex() in self.index:
+                continue
+            if not self.free_slots:
+                _, slot = self.index.popitem(last=False)
+                self.free_slots.append(slot)
+                self.evictions += 1
+            slot = self.free_slots.pop()
+            self.vectors[slot] = vector
+            self.keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self.index[key.hex()] = slot
+
+    def save(self):
+        """memmap 寫回磁碟並儲存 index (先寫暫存檔再 rename)"""
+        if self.vectors is None or self.read_only:
+            return
+        self.vectors.flush()
+        self.keys.flush()
+        path = self._path("index.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": CACHE_FORMAT_VERSION,
+                "model": self.model_name,
+                "dim": self.dim,
+                "capacity": self.capacity,
+                "entries": list(self.index.items()),
+            }, f)
+        os.replace(tmp_path, path)
+
+    def print_stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        print(f"[embedding cache] {self.model_dir}")
+        print(f"[embedding cache] 命中 {self.hits} / 未命中 {self.misses} (命中率 {hit_rate:.1f}%)，淘汰 {self.evictions} 筆")
+        print(f"[embedding cache] {len(self.index)} 筆 / 上限 {self.capacity} 筆 ({self.max_bytes / 1024 ** 2:.0f} MB)")
+
+class CachedEncoder:
+    """
+    包裝 SentenceTransformer，與 model.encode 相同的呼叫方式：
+    先查 EmbeddingCache，只把未命中 (且不重複) 的文字送進模型，結果依原順序組回。
+    normalize_embeddings 會改變輸出，因此各自使用不同的快取 key。
+    """
+    def __init__(self, model, cache):
+        self.model = model
+        self.cache = cache
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def encode(self, sentences, convert_to_tensor=False, device=None, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        namespace = "normalized" if normalize_embeddings else ""
+        keys = [text_key(text, namespace) for text in texts]
+
+        vectors = self.cache.get_many(keys)
+        missing = OrderedDict()  # key -> 第一次出現的文字
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+        if missing:
+            new_vectors = self.model.encode(list(missing.values()), convert_to_tensor=False, device=device,
+                                            normalize_embeddings=normalize_embeddings, **kwargs)
+            self.cache.put_many(list(missing), new_vectors)
+            computed = dict(zip(missing, new_vectors))
+            vectors = [computed[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+
+        if texts:
+            embeddings = np.stack(vectors).astype(np.float32)
+        else:
+            embeddings = np.zeros((0, self.cache.dim or 0), dtype=np.float32)
+        if convert_to_tensor:
+            import torch
+            embeddings = torch.from_numpy(embeddings).to(device or self.model.device)
+        return embeddings[0] if single else embeddings
+
+    def save(self):
+        self.cache.save()
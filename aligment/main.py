@@ -1,75 +1,196 @@
 import os
 import re
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_layout.catalog import DEFAULT_CATALOG_PATH, chapter_numbers, load_catalog, select_books
 
 # --------------------------------------------------------
-import torch
-import spacy
-# 設定 Device 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Running on: {device}")
+# import 本檔不會載入任何模型：spaCy / LaBSE / 對齊函數都在解析參數、確定要用哪一種之後才載入
+# (--worker 模式完全不載入，交給常駐的 align_worker.py)
+from align_files import (ALIGNERS, DEFAULT_SPLITTER, PARAGRAPH_MERGE_WINDOW, PARAGRAPH_THRESHOLD, SENTENCE_MERGE_WINDOW,
+                         SENTENCE_THRESHOLD, SPLITTERS, create_file_pairs, get_device, load_aligner,
+                         load_sentence_splitters, process_chapter_alignment)
+from align_worker import submit_chapter, worker_health
+from book_alignment import align_book
+from chapter_check import DEFAULT_PAIR_CHECK, PAIR_CHECK_POLICIES, screen_chapter_pairs
+from embedding_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, CachedEncoder, EmbeddingCache
+from model_backend import DEFAULT_MODEL_BACKEND, MODEL_BACKENDS, cache_model_name, load_model
+from parallel_alignment import align_chapters_parallel, create_pool, default_config, threads_per_worker
+from run_journal import JOURNAL_NAME, RunJournal
+from span_embeddings import DEFAULT_SPAN_MODE, SPAN_MODES
 
-# 啟用 SpaCy GPU (必須在 load 模型之前執行) ---
-if device == "cuda":
-    spacy.prefer_gpu()
+def report_book(book, n_chapters, start_time):
+    """印出一本書的耗時與每分鐘章節數"""
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+    print(f"[{book['id']}] {n_chapters} 章，耗時 {elapsed:.1f}s ({n_chapters / elapsed * 60:.1f} 章/分)")
 
-# 載入 SpaCy 模型 split_sentences_spacy()傳入參數模型
-print("Loading SpaCy...")
-nlp_en = spacy.load("en_core_web_sm") # 或 trf 版本
-nlp_zh = spacy.load("zh_core_web_sm") # 或 trf 版本
 
-# --------------------------------------------------------
-from sentence_transformers import SentenceTransformer, util
+if __name__ == "__main__":
+    """
+    使用方式為放入對應的中英文章節後呼叫 process_chapter_alignment()
+    1. 從 catalog.json 讀取每本書的 EN / ZH 輸出資料夾與章節範圍
+    2. 建立存放json的資料夾
+    3. 迭代運行
+    """
+    parser = argparse.ArgumentParser(description="依 catalog.json 對齊每本書的中英文章節")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--books", nargs="*", help="只處理這些書籍 id (預設全部)")
+    parser.add_argument("--embedding-cache-dir", default=DEFAULT_CACHE_DIR, help="embedding 快取資料夾")
+    parser.add_argument("--embedding-cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2)
+    parser.add_argument("--no-embedding-cache", action="store_true", help="不使用 embedding 快取，每次都重新編碼")
+    parser.add_argument("--span-mode", default=DEFAULT_SPAN_MODE, choices=SPAN_MODES,
+                        help="合併片段 embedding 計算方式 (approx: 由單句 embedding 近似，較快)")
+    parser.add_argument("--aligner", default="greedy", choices=ALIGNERS,
+                        help="greedy: 逐步選局部最佳 / dp: 帶狀動態規劃全域對齊")
+    parser.add_argument("--model-backend", default=DEFAULT_MODEL_BACKEND, choices=MODEL_BACKENDS,
+                        help="LaBSE 推論方式 (onnx-int8: ONNX Runtime int8 動態量化，沒有 GPU 的機器較快)")
+    parser.add_argument("--book-batch", action="store_true",
+                        help="整本書的段落 / 句子一起批次編碼後再逐章對齊 (輸出相同，GPU 使用率較高)")
+    parser.add_argument("--splitter", default=DEFAULT_SPLITTER, choices=SPLITTERS,
+                        help="斷句方式 (rule: 規則式斷句，不需要載入 spaCy 模型)")
+    parser.add_argument("--worker", metavar="URL",
+                        help="把章節交給常駐的 align_worker.py (例如 http://127.0.0.1:8765) 對齊，本程式不載入任何模型；"
+                             "斷句、LaBSE 與 embedding 快取以 worker 的設定為準")
+    parser.add_argument("--segment", action="store_true",
+                        help="段落對齊前先找高可信度的 1:1 段落 (錨點) 把章節切段，各段分別對齊 (長章節較快，錯位不會擴散)")
+    parser.add_argument("--pair-check", default=DEFAULT_PAIR_CHECK, choices=PAIR_CHECK_POLICIES,
+                        help="對齊前以字數比、段落數比、共同數字 / 英文詞檢查章節配對 (flag: 只列出可疑章節 / skip: 不對齊可疑章節)")
+    parser.add_argument("--restart", action="store_true",
+                        help=f"忽略輸出資料夾中的 {JOURNAL_NAME}，所有章節重新對齊 (預設跳過已完成且輸入未改變的章節)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="CPU 主機用：以 N 個 process 平行對齊不同章節 (每個 process 載入一次模型，"
+                             "執行緒數為核心數 / N；embedding 快取只讀不寫)")
+    args = parser.parse_args()
 
-# 將 LaBSE 模型搬移到 GPU ---
-print("Loading LaBSE...")
-model = SentenceTransformer('sentence-transformers/LaBSE')
-model.to(device) # 關鍵：移動模型權重到 GPU
+    device = nlp_en = nlp_zh = model = encoder = pool = None
+    splitter, model_backend = args.splitter, args.model_backend
+    if args.worker:
+        if args.book_batch:
+            print("--worker 模式逐章送出，忽略 --book-batch")
+        # 斷句與 LaBSE 以 worker 啟動時的設定為準，run journal 記錄 worker 實際使用的值
+        health = worker_health(args.worker)
+        splitter, model_backend = health["splitter"], health["model_backend"]
+        print(f"Worker {args.worker}: device {health['device']}，splitter {splitter}，model backend {model_backend}")
+    elif args.jobs > 1:
+        # 模型在各個 worker process 中載入，這裡不載入
+        if args.book_batch:
+            print("--jobs 模式逐章平行處理，忽略 --book-batch")
+        print(f"Parallel: {args.jobs} processes x {threads_per_worker(args.jobs)} threads (CPU)")
+        pool = create_pool(args.jobs, default_config(
+            splitter=args.splitter, model_backend=args.model_backend, aligner=args.aligner, span_mode=args.span_mode,
+            segment=args.segment, use_cache=not args.no_embedding_cache, cache_dir=args.embedding_cache_dir,
+            cache_max_bytes=int(args.embedding_cache_max_mb * 1024 ** 2)))
+    else:
+        # 設定 Device
+        device = get_device()
+        print(f"Running on: {device}")
 
-# --------------------------------------------------------
-from align_files import create_file_pairs,split_sentences_spacy,process_chapter_alignment
+        print(f"Loading sentence splitter ({args.splitter})...")
+        nlp_en, nlp_zh = load_sentence_splitters(args.splitter, device)
+        if args.model_backend != "torch" and device == "cuda":
+            print(f"{args.model_backend} 只在 CPU 上執行，改用 CPU 版對齊")
+            device = "cpu"
+        print(f"Loading LaBSE ({args.model_backend})...")
+        model = load_model(device, args.model_backend)
 
-# 對齊段落、語句是否使用GPU
-if device == "cuda":
-    #使用GPU
-    from align_sentences_extended_gpu import align_sentences_extended_gpu
-    align_sentences = align_sentences_extended_gpu
-else:
-    # 使用CPU
-    from align_sentences_extended import align_sentences_extended
-    align_sentences = align_sentences_extended
-    
+        # 對齊段落、語句是否使用GPU (greedy 依 device 選 GPU / CPU 版)
+        align_function = load_aligner(args.aligner, device, args.span_mode)
 
+        # 同一段文字 (重跑、調整閾值、Stage 1 / Stage 2 重疊) 只編碼一次
+        encoder = model
+        if not args.no_embedding_cache:
+            encoder = CachedEncoder(model, EmbeddingCache(cache_model_name(args.model_backend), args.embedding_cache_dir,
+                                                          int(args.embedding_cache_max_mb * 1024 ** 2)))
 
+    # 這些設定改變時，之前完成的章節全部作廢
+    run_settings = {
+        "aligner": args.aligner,
+        "span_mode": args.span_mode,
+        "splitter": splitter,
+        "model_backend": model_backend,
+        "segment": args.segment,
+        "paragraph": [PARAGRAPH_THRESHOLD, PARAGRAPH_MERGE_WINDOW],
+        "sentence": [SENTENCE_THRESHOLD, SENTENCE_MERGE_WINDOW],
+    }
 
-if __name__ == "__main__":
-    """
-    使用方式為放入對應的中英文章節後呼叫 process_chapter_alignment()
-    1. 建立存放json的資料夾
-    2. 迭代運行
-    """
+    for book in select_books(load_catalog(args.catalog), args.books):
+        if "en" not in book["editions"] or "zh" not in book["editions"]:
+            print(f"[{book['id']}] 缺少 EN 或 ZH 版本，跳過")
+            continue
+
+        dir_path = book["alignment_output"]
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+
+        EN_dir = book["editions"]["en"]["output"]
+        ZH_dir = book["editions"]["zh"]["output"]
+
+        '''
+        兩份資料夾中要處裡的檔案開頭序號為 catalog 的 chapters 範圍 (例如 001_,...,038_)
+        找出對應檔案，然後zip餵入process_chapter_alignment()
+        '''
+        book_chapter_pairs = create_file_pairs(EN_dir, ZH_dir, chapter_numbers(book))
+        output_paths = [os.path.join(dir_path, f'aligned_ch{i}.jsonl') for i in range(len(book_chapter_pairs))]
+        # 編號錯位或切錯的章節不值得花 LaBSE 的計算量
+        book_chapter_pairs, output_paths = screen_chapter_pairs(book["id"], book_chapter_pairs, output_paths,
+                                                                args.pair_check)
+
+        # 中斷後重跑：跳過已完成、輸入檔也沒有改變的章節
+        journal = RunJournal(dir_path, run_settings)
+        if not args.restart:
+            n_chapters = len(book_chapter_pairs)
+            book_chapter_pairs, output_paths = journal.pending(book_chapter_pairs, output_paths)
+            if len(book_chapter_pairs) < n_chapters:
+                print(f"[{book['id']}] {n_chapters - len(book_chapter_pairs)}/{n_chapters} 章已完成 ({JOURNAL_NAME})，跳過")
+        if not book_chapter_pairs:
+            continue
+        mark_done = lambda job, n_pairs: journal.mark_done(*job, n_pairs)
+        start_time = time.perf_counter()
+
+        if pool is not None:
+            align_chapters_parallel(pool, [(en_chapter_path, zh_chapter_path, output_file_name) for
+                                           (en_chapter_path, zh_chapter_path), output_file_name
+                                           in zip(book_chapter_pairs, output_paths)], on_done=mark_done)
+            report_book(book, len(book_chapter_pairs), start_time)
+            continue
+
+        if args.book_batch and not args.worker:
+            align_book(nlp_en, nlp_zh, book_chapter_pairs, output_paths, align_function, encoder, device, args.span_mode,
+                       on_done=mark_done, segment=args.segment)
+            if encoder is not model:
+                encoder.save()
+            report_book(book, len(book_chapter_pairs), start_time)
+            continue
+
+        for (en_chapter_path, zh_chapter_path), output_file_name in zip(book_chapter_pairs, output_paths):
+            if args.worker:
+                result = submit_chapter(args.worker, en_chapter_path, zh_chapter_path, output_file_name,
+                                        args.aligner, args.span_mode, args.segment)
+                print(f"[worker] {os.path.basename(output_file_name)}: {result['pairs']} 句對，{result['elapsed']:.1f}s")
+                journal.mark_done(en_chapter_path, zh_chapter_path, output_file_name, result["pairs"])
+                continue
+            sentence_pairs = process_chapter_alignment(
+                nlp_en=nlp_en,
+                nlp_zh=nlp_zh,
+                en_chapter_path=en_chapter_path, 
+                zh_chapter_path=zh_chapter_path, 
+                output_path=output_file_name, 
+                align_sentences_function=align_function,
+                model= encoder,
+                device=device,
+                span_mode=args.span_mode,
+                segment=args.segment
+            )
+            if encoder is not model:
+                encoder.save() # 每章存一次，中斷時已完成章節的 embedding 不會遺失
+            journal.mark_done(en_chapter_path, zh_chapter_path, output_file_name, len(sentence_pairs))
+        report_book(book, len(book_chapter_pairs), start_time)
 
-    dir_path = "pairs_sentence"
-    if not os.path.exists(dir_path):
-        os.mkdir(dir_path)
-
-    EN_dir = r'/paul-cleavedata/English/output_text_EN'
-    ZH_dir = r'/paul-cleavedata/Chinese/output_text_ZH'
-    
-    '''
-    兩份資料夾中要處裡的檔案開頭序號為001_,...,038_
-    找出對應檔案，然後zip餵入process_chapter_alignment()
-    '''
-    book_chapter_pairs = create_file_pairs(EN_dir, ZH_dir)
-
-    for i, (en_chapter_path, zh_chapter_path) in enumerate(book_chapter_pairs):
-        output_file_name = os.path.join(dir_path, f'aligned_ch{i}.jsonl')
-        process_chapter_alignment(
-            nlp_en=nlp_en,
-            nlp_zh=nlp_zh,
-            en_chapter_path=en_chapter_path, 
-            zh_chapter_path=zh_chapter_path, 
-            output_path=output_file_name, 
-            align_sentences_function=align_sentences,
-            model= model,
-            device=device
-        )
\ No newline at end of file
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if encoder is not model:
+        encoder.cache.print_stats()
\ No newline at end of file
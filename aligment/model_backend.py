@@ -0,0 +1,67 @@
+import os
+import re
+
+# ================= 設定區 =================
+MODEL_NAME = 'sentence-transformers/LaBSE'
+# LaBSE 的推論方式
+# "torch": SentenceTransformer 原本的 fp32 PyTorch
+# "onnx": 匯出成 ONNX，以 ONNX Runtime (CPU) 執行 fp32
+# "onnx-int8": ONNX 再做 int8 動態量化 (權重 int8，activation 執行時量化)，CPU 上最快
+MODEL_BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_MODEL_BACKEND = "torch"
+# 匯出 / 量化後的模型存放位置：專案根目錄下的 .onnx_models/
+DEFAULT_ONNX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".onnx_models")
+# int8 動態量化的目標指令集 ("avx512_vnni" / "avx512" / "avx2" / "arm64")，量化結果在其他 CPU 上仍可執行，只是較慢
+ONNX_QUANTIZATION = "avx512_vnni"
+# =========================================
+
+def cache_model_name(model_backend, model_name=MODEL_NAME):
+    """
+    embedding 快取使用的模型名稱：量化後的 embedding 與 fp32 不同，不能共用快取
+    (torch 維持原本的名稱，既有快取仍然有效)
+    """
+    if model_backend == "torch":
+        return model_name
+    if model_backend == "onnx-int8":
+        return f"{model_name}@onnx-qint8-{ONNX_QUANTIZATION}"
+    return f"{model_name}@{model_backend}"
+
+def export_onnx(model_name=MODEL_NAME, onnx_dir=DEFAULT_ONNX_DIR, quantize=False):
+    """
+    第一次使用時把模型匯出成 ONNX (以及 int8 動態量化版) 存到 onnx_dir，之後直接讀取
+    回傳: (本地模型資料夾, 要載入的 onnx 檔相對路徑)
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    local_dir = os.path.join(onnx_dir, re.sub(r"[^0-9A-Za-z_.-]", "_", model_name))
+    file_name = os.path.join("onnx", "model.onnx")
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        print(f"Exporting {model_name} to ONNX -> {local_dir}")
+        SentenceTransformer(model_name, backend="onnx", device="cpu").save(local_dir)
+
+    if not quantize:
+        return local_dir, file_name
+    file_name = os.path.join("onnx", f"model_qint8_{ONNX_QUANTIZATION}.onnx")
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        print(f"Quantizing ONNX model (int8, {ONNX_QUANTIZATION})...")
+        model = SentenceTransformer(local_dir, backend="onnx", device="cpu")
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, local_dir)
+    return local_dir, file_name
+
+def load_model(device, model_backend=DEFAULT_MODEL_BACKEND, model_name=MODEL_NAME, onnx_dir=DEFAULT_ONNX_DIR):
+    """
+    依 model_backend 載入 LaBSE，回傳的物件都是 SentenceTransformer (encode 介面相同)；
+    ONNX 只用 CPUExecutionProvider，device 固定為 "cpu"
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if model_backend == "torch":
+        model = SentenceTransformer(model_name)
+        model.to(device)
+        return model
+    if model_backend not in MODEL_BACKENDS:
+        raise ValueError(f"未知的 model_backend: {model_backend} (可用: {', '.join(MODEL_BACKENDS)})")
+
+    local_dir, file_name = export_onnx(model_name, onnx_dir, quantize=model_backend == "onnx-int8")
+    return SentenceTransformer(local_dir, backend="onnx", device="cpu",
+                               model_kwargs={"file_name": file_name, "provider": "CPUExecutionProvider"})
@@ -0,0 +1,101 @@
+import os
+import time
+import multiprocessing
+
+from align_files import DEFAULT_SPLITTER, load_aligner, load_sentence_splitters, process_chapter_alignment
+from embedding_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, CachedEncoder, EmbeddingCache
+from model_backend import DEFAULT_MODEL_BACKEND, cache_model_name, load_model
+from span_embeddings import DEFAULT_SPAN_MODE
+
+# ================= 設定區 =================
+# 子 process 啟動前設定的執行緒數環境變數 (BLAS / OpenMP)，與 torch.set_num_threads 一起避免 CPU 超額使用
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+# =========================================
+
+# 每個 worker process 各自的模型 (init_worker 載入一次)
+_worker = {}
+
+def default_config(**overrides):
+    """worker 設定：斷句方式、LaBSE 推論方式、對齊函數、span_mode、是否以錨點切段與 embedding 快取"""
+    config = {
+        "splitter": DEFAULT_SPLITTER,
+        "model_backend": DEFAULT_MODEL_BACKEND,
+        "aligner": "greedy",
+        "span_mode": DEFAULT_SPAN_MODE,
+        "segment": False,
+        "use_cache": True,
+        "cache_dir": DEFAULT_CACHE_DIR,
+        "cache_max_bytes": DEFAULT_MAX_BYTES,
+    }
+    config.update(overrides)
+    return config
+
+def threads_per_worker(n_workers):
+    """CPU 核心平均分給每個 worker"""
+    return max(1, (os.cpu_count() or 1) // n_workers)
+
+def init_worker(config, n_threads):
+    """
+    Pool initializer：設定 torch 執行緒數後載入一次模型 (只用 CPU)。
+    EmbeddingCache 同一時間只能有一個寫入者，平行模式下每個 worker 以唯讀方式使用快取：
+    已快取的 embedding 照常命中，新算出的不會寫回 (需要時先以單一 process 跑一次建立快取)
+    """
+    import torch
+    torch.set_num_threads(n_threads)
+
+    nlp_en, nlp_zh = load_sentence_splitters(config["splitter"], "cpu")
+    model = load_model("cpu", config["model_backend"])
+    if config["use_cache"]:
+        model = CachedEncoder(model, EmbeddingCache(cache_model_name(config["model_backend"]), config["cache_dir"],
+                                                    config["cache_max_bytes"], read_only=True))
+    _worker.update(
+        nlp_en=nlp_en,
+        nlp_zh=nlp_zh,
+        model=model,
+        span_mode=config["span_mode"],
+        segment=config["segment"],
+        align_function=load_aligner(config["aligner"], "cpu", config["span_mode"]),
+    )
+
+def align_chapter_job(job):
+    """job: (en_path, zh_path, output_path) -> (output_path, 句對數, 耗時秒數)"""
+    en_path, zh_path, output_path = job
+    start_time = time.perf_counter()
+    pairs = process_chapter_alignment(_worker["nlp_en"], _worker["nlp_zh"], en_path, zh_path, output_path,
+                                      _worker["align_function"], _worker["model"], "cpu", _worker["span_mode"],
+                                      _worker["segment"])
+    return output_path, len(pairs), time.perf_counter() - start_time
+
+def create_pool(n_workers, config):
+    """
+    建立 n_workers 個 process (spawn，不繼承父 process 的 torch 狀態)，每個 worker 載入一次模型，
+    BLAS / OpenMP 與 torch 的執行緒數設為 CPU 核心數 / n_workers
+    """
+    n_threads = threads_per_worker(n_workers)
+    saved_env = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    os.environ.update({name: str(n_threads) for name in THREAD_ENV_VARS})
+    try:
+        # Pool 建立時就啟動所有 process，環境變數在這之後即可還原
+        return multiprocessing.get_context("spawn").Pool(n_workers, initializer=init_worker,
+                                                         initargs=(config, n_threads))
+    finally:
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def align_chapters_parallel(pool, jobs, on_done=None):
+    """
+    把章節分給 pool 中的 worker 對齊 (每個 worker 一次一章，做完就拿下一章)，
+    輸出檔與逐章執行相同；回傳依 jobs 順序的 [(output_path, 句對數, 耗時秒數)]
+    on_done(job, 句對數): 每完成一章就呼叫 (例如寫入 RunJournal)
+    """
+    jobs_by_output = {job[2]: job for job in jobs}
+    results = {}
+    for output_path, n_pairs, elapsed in pool.imap_unordered(align_chapter_job, jobs):
+        print(f"[parallel] {os.path.basename(output_path)}: {n_pairs} 句對，{elapsed:.1f}s")
+        results[output_path] = (output_path, n_pairs, elapsed)
+        if on_done is not None:
+            on_done(jobs_by_output[output_path], n_pairs)
+    return [results[output_path] for _, _, output_path in jobs]
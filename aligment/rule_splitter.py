@@ -0,0 +1,74 @@
+import re
+from collections import namedtuple
+
+# ================= 設定區 =================
+# 句末標點 (連續出現視為同一個句尾，例如「……」、「？！」)
+ZH_TERMINALS = "。！？!?…"
+EN_TERMINALS = ".!?…"
+# 句末標點後面緊接的收尾符號 (引號、括號) 算在同一句
+CLOSERS = "」』”’）)》\"'"
+# 英文縮寫：後面的句點不視為句尾 (比對時不分大小寫、不含句點)
+EN_ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "ft", "lt", "sgt", "capt", "col", "gen", "det",
+    "insp", "supt", "rev", "hon", "vs", "etc", "approx", "dept", "inc", "ltd", "co",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    "e.g", "i.e", "a.m", "p.m", "u.s", "u.k",
+}
+# 只在後面接數字時才是縮寫 (No. 5 / Vol. 2)，否則是一般單字 ("said no. This...")
+EN_NUMBER_ABBREVIATIONS = {"no", "nos", "vol", "ch", "fig", "pp"}
+# =========================================
+
+_ZH_SENTENCE = re.compile(rf"[^{re.escape(ZH_TERMINALS)}]*(?:[{re.escape(ZH_TERMINALS)}]+[{re.escape(CLOSERS)}]*|$)")
+_EN_BOUNDARY = re.compile(rf"[{re.escape(EN_TERMINALS)}]+[{re.escape(CLOSERS)}]*(?=\s)")
+_NEXT_CHAR = re.compile(r"\s*(\S?)")
+
+Sentence = namedtuple("Sentence", ["text"])
+Doc = namedtuple("Doc", ["sents"])
+
+def split_zh(text):
+    """中文：在 。！？… (含連續標點) 與其後的收尾引號 / 括號之後斷句"""
+    return [sentence.strip() for sentence in _ZH_SENTENCE.findall(text) if sentence.strip()]
+
+def _is_abbreviation(text, match, next_char):
+    """句點前的字是縮寫 (Mr. / e.g. / 單一字母的名字縮寫 J. / 接數字的 No.) 時不斷句"""
+    if match.group().rstrip(CLOSERS) != ".":
+        return False
+    word_start = match.start()
+    while word_start > 0 and not text[word_start - 1].isspace():
+        word_start -= 1
+    word = text[word_start:match.start()].lstrip(CLOSERS + "“‘([").lower()
+    if word in EN_NUMBER_ABBREVIATIONS:
+        return next_char.isdigit()
+    return word in EN_ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+def split_en(text):
+    """
+    英文：在 . ! ? … (與其後的收尾引號 / 括號) 之後、接著空白的位置斷句，
+    但句點前是縮寫，或下一個字以小寫開頭時不斷
+    """
+    sentences = []
+    start = 0
+    for match in _EN_BOUNDARY.finditer(text):
+        next_char = _NEXT_CHAR.match(text, match.end()).group(1)
+        if _is_abbreviation(text, match, next_char) or next_char.islower():
+            continue
+        sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    sentences.append(text[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+class RuleSentenceSplitter:
+    """
+    規則式斷句，與 spaCy nlp 相同的呼叫方式 (nlp(text).sents / nlp.pipe(texts))，
+    可直接取代 split_sentences_spacy / split_sentences_batch 的 nlp 參數，不需要載入 spaCy 模型
+    """
+    def __init__(self, lang):
+        self.lang = lang
+        self.split = split_en if lang == "en" else split_zh
+
+    def __call__(self, text):
+        return Doc([Sentence(sentence) for sentence in self.split(text)])
+
+    def pipe(self, texts, batch_size=None, n_process=1):
+        # 純 Python 規則，逐段處理即可 (batch_size / n_process 只為了相容 spaCy 的介面)
+        return (self(text) for text in texts)
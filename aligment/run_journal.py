@@ -0,0 +1,63 @@
+import os
+import json
+import hashlib
+
+# ================= 設定區 =================
+# 每本書的輸出資料夾 (alignment_output) 中記錄已完成章節的檔案
+JOURNAL_NAME = "alignment_journal.json"
+JOURNAL_FORMAT_VERSION = 1
+# =========================================
+
+def file_hash(path):
+    """輸入章節檔內容的 sha1"""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+class RunJournal:
+    """
+    記錄一本書哪些章節已對齊完成：輸出檔名 -> 兩邊輸入檔的 hash 與句對數。
+    settings (對齊函數、span_mode、閾值等) 與上次不同時整份記錄作廢；
+    輸入檔內容改變、或輸出檔不存在的章節視為未完成，重跑時只處理這些章節。
+    每完成一章就寫回 (先寫暫存檔再 rename)，中斷後最多只重做進行中的章節。
+    """
+    def __init__(self, dir_path, settings):
+        self.path = os.path.join(dir_path, JOURNAL_NAME)
+        self.settings = settings
+        self.chapters = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except ValueError:
+                return
+            if data.get("version") == JOURNAL_FORMAT_VERSION and data.get("settings") == settings:
+                self.chapters = data["chapters"]
+
+    def is_done(self, en_path, zh_path, output_path):
+        entry = self.chapters.get(os.path.basename(output_path))
+        return (entry is not None and os.path.exists(output_path)
+                and entry["en"] == file_hash(en_path) and entry["zh"] == file_hash(zh_path))
+
+    def pending(self, chapter_pairs, output_paths):
+        """回傳尚未完成 (或輸入已改變) 的 (chapter_pairs, output_paths)"""
+        todo = [(chapter_pair, output_path) for chapter_pair, output_path in zip(chapter_pairs, output_paths)
+                if not self.is_done(*chapter_pair, output_path)]
+        return [chapter_pair for chapter_pair, _ in todo], [output_path for _, output_path in todo]
+
+    def mark_done(self, en_path, zh_path, output_path, n_pairs):
+        self.chapters[os.path.basename(output_path)] = {
+            "en": file_hash(en_path),
+            "zh": file_hash(zh_path),
+            "pairs": n_pairs,
+        }
+        self.save()
+
+    def save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": JOURNAL_FORMAT_VERSION,
+                "settings": self.settings,
+                "chapters": self.chapters,
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
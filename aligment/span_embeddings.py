@@ -0,0 +1,170 @@
+import torch
+
+# ================= 設定區 =================
+# 合併片段的連接方式 (與對齊函數輸出的 en / zh 文字相同)
+EN_JOINER = " "
+ZH_JOINER = ""
+# 合併片段 (1:k / k:1 候選) 的 embedding 計算方式
+# "loop": 對齊迴圈中逐一編碼合併後的文字 (原本的做法)
+# "batch": 迴圈前一次編碼所有合併片段，結果與 "loop" 相同
+# "approx": 不再編碼合併文字，以單句 embedding 依長度加權平均後重新正規化 (vecalign 的做法)，不需要額外的模型計算
+SPAN_MODES = ("loop", "batch", "approx")
+DEFAULT_SPAN_MODE = "batch"
+# =========================================
+
+def span_texts(sentences, max_merge_window, joiner):
+    """
+    列出所有長度 1 ~ max_merge_window 的連續片段文字
+    回傳: (texts, layout)，layout[k - 1] = (片段 k 在 texts 中的起點, 數量)
+    """
+    texts = []
+    layout = []
+    for k in range(1, max_merge_window + 1):
+        count = max(0, len(sentences) - k + 1)
+        layout.append((len(texts), count))
+        texts.extend(joiner.join(sentences[start:start + k]) for start in range(count))
+    return texts, layout
+
+def encode_spans(model, en_sentences, zh_sentences, max_merge_window, **encode_kwargs):
+    """
+    在對齊迴圈開始前，把兩邊所有單句與合併片段 (1:k / k:1 的候選) 一次送進 model.encode，
+    由 SentenceTransformer 依長度排序後分成大 batch 計算；迴圈中的計分只剩查表 + 內積。
+    回傳: (en_spans, zh_spans)，spans[k - 1][start] 為 sentences[start : start + k] 合併後的 embedding
+    """
+    en_texts, en_layout = span_texts(en_sentences, max_merge_window, EN_JOINER)
+    zh_texts, zh_layout = span_texts(zh_sentences, max_merge_window, ZH_JOINER)
+    embeddings = model.encode(en_texts + zh_texts, convert_to_tensor=True, **encode_kwargs)
+
+    en_spans = [embeddings[offset:offset + count] for offset, count in en_layout]
+    zh_spans = [embeddings[len(en_texts) + offset:len(en_texts) + offset + count] for offset, count in zh_layout]
+    return en_spans, zh_spans
+
+def compose_spans(embeddings, sentences, max_merge_window):
+    """
+    由單句 embedding 組出合併片段的近似 embedding：以字數加權平均後重新正規化，
+    用前綴和計算，每種長度 k 只需一次向量運算。
+    回傳: spans，spans[k - 1][start] 對應 sentences[start : start + k] (格式同 encode_spans)
+    """
+    spans = [embeddings]
+    if not sentences:
+        return spans + [embeddings[:0]] * (max_merge_window - 1)
+    weights = torch.tensor([max(len(s), 1) for s in sentences], dtype=embeddings.dtype, device=embeddings.device)
+    weighted = torch.nn.functional.normalize(embeddings, dim=-1) * weights[:, None]
+    prefix = torch.cat([torch.zeros_like(weighted[:1]), torch.cumsum(weighted, dim=0)])
+    for k in range(2, max_merge_window + 1):
+        # prefix[start + k] - prefix[start] = sentences[start : start + k] 的加權和，正規化後即為平均方向
+        spans.append(torch.nn.functional.normalize(prefix[k:] - prefix[:-k], dim=-1))
+    return spans
+
+def approximate_spans(model, en_sentences, zh_sentences, max_merge_window, **encode_kwargs):
+    """只編碼單句 (一次 model.encode)，合併片段以 compose_spans 近似；回傳格式同 encode_spans"""
+    embeddings = model.encode(list(en_sentences) + list(zh_sentences), convert_to_tensor=True, **encode_kwargs)
+    en_embeddings, zh_embeddings = embeddings[:len(en_sentences)], embeddings[len(en_sentences):]
+    return (compose_spans(en_embeddings, en_sentences, max_merge_window),
+            compose_spans(zh_embeddings, zh_sentences, max_merge_window))
+
+def prepare_spans(model, en_sentences, zh_sentences, max_merge_window, span_mode=DEFAULT_SPAN_MODE, **encode_kwargs):
+    """
+    依 span_mode 準備對齊迴圈要用的 embedding
+    回傳: (en_spans, zh_spans)；"loop" 模式只有單句 (spans 長度為 1)，合併片段由呼叫端在迴圈中編碼
+    """
+    if span_mode == "batch":
+        return encode_spans(model, en_sentences, zh_sentences, max_merge_window, **encode_kwargs)
+    if span_mode == "approx":
+        return approximate_spans(model, en_sentences, zh_sentences, max_merge_window, **encode_kwargs)
+    if span_mode == "loop":
+        return ([model.encode(en_sentences, convert_to_tensor=True, **encode_kwargs)],
+                [model.encode(zh_sentences, convert_to_tensor=True, **encode_kwargs)])
+    raise ValueError(f"未知的 span_mode: {span_mode} (可用: {', '.join(SPAN_MODES)})")
+
+def similarity_tables(en_spans, zh_spans):
+    """
+    對齊迴圈會用到的所有 cos 相似度一次算好：單句英文 vs 所有中文片段、英文合併片段 vs 單句中文，
+    各一次矩陣乘法，再合併成一個 tensor 搬回 CPU (每次呼叫只有一次 device -> host 同步)，
+    迴圈中只剩 Python list 查表，不再有逐對的 cos_sim kernel 與 .item() 同步。
+    回傳: (one_to_k, k_to_one)，Python float 的巢狀 list
+        one_to_k[k - 1][i][j] = cos(en[i], zh[j : j + k])
+        k_to_one[k - 1][i][j] = cos(en[i : i + k], zh[j])  (k_to_one[0] 即 one_to_k[0])
+    """
+    normalize = torch.nn.functional.normalize
+    en_units = [normalize(spans, dim=-1) for spans in en_spans]
+    zh_units = [normalize(spans, dim=-1) for spans in zh_spans]
+    n, m = len(en_units[0]), len(zh_units[0])
+    zh_counts = [len(spans) for spans in zh_units]
+    en_counts = [len(spans) for spans in en_units[1:]]
+
+    # [n, 所有中文片段] 與 [所有英文合併片段, m]
+    one_to_k_matrix = en_units[0] @ torch.cat(zh_units).T
+    blocks = [one_to_k_matrix.flatten()]
+    if en_counts:
+        blocks.append((torch.cat(en_units[1:]) @ zh_units[0].T).flatten())
+    values = torch.cat(blocks).cpu().tolist()
+
+    one_to_k = [[] for _ in zh_counts]
+    width = sum(zh_counts)
+    for i in range(n):
+        row = values[i * width:(i + 1) * width]
+        offset = 0
+        for table, count in zip(one_to_k, zh_counts):
+            table.append(row[offset:offset + count])
+            offset += count
+
+    k_to_one = [one_to_k[0]]
+    offset = n * width
+    for count in en_counts:
+        k_to_one.append([values[offset + start * m:offset + (start + 1) * m] for start in range(count)])
+        offset += count * m
+    return one_to_k, k_to_one
+
+def span_requests(en_sentences, zh_sentences, max_merge_window, span_mode=DEFAULT_SPAN_MODE):
+    """
+    prepare_spans 會送進 model.encode 的所有文字，讓呼叫端可以先跨多次對齊一起批次編碼
+    ("loop" 模式保留原本逐一編碼的行為作為 benchmark 基準，不預先編碼)
+    """
+    if span_mode == "loop":
+        return []
+    if span_mode == "approx":
+        return list(en_sentences) + list(zh_sentences)
+    return span_texts(en_sentences, max_merge_window, EN_JOINER)[0] + span_texts(zh_sentences, max_merge_window, ZH_JOINER)[0]
+
+class PrefetchEncoder:
+    """
+    包裝 SentenceTransformer (或 CachedEncoder)，與 model.encode 相同的呼叫方式：
+    prefetch() 先把一整批文字一次編碼 (SentenceTransformer 會依長度排序後切成大 batch)，
+    之後 encode() 只要文字都在裡面就直接取出，不再呼叫模型；
+    有沒預先編碼的文字或 normalize_embeddings=True 時照常交給原本的模型。
+    """
+    def __init__(self, model):
+        self.model = model
+        self.clear()
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def clear(self):
+        self.index = {}  # 文字 -> embeddings 的列號
+        self.embeddings = None
+
+    def prefetch(self, texts, **encode_kwargs):
+        new_texts = [text for text in dict.fromkeys(texts) if text not in self.index]
+        if not new_texts:
+            return
+        embeddings = self.model.encode(new_texts, convert_to_tensor=True, **encode_kwargs)
+        offset = 0 if self.embeddings is None else len(self.embeddings)
+        self.index.update((text, offset + row) for row, text in enumerate(new_texts))
+        self.embeddings = embeddings if self.embeddings is None else torch.cat([self.embeddings, embeddings])
+
+    def encode(self, sentences, convert_to_tensor=False, device=None, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if normalize_embeddings or not texts or any(text not in self.index for text in texts):
+            return self.model.encode(sentences, convert_to_tensor=convert_to_tensor, device=device,
+                                     normalize_embeddings=normalize_embeddings, **kwargs)
+
+        embeddings = self.embeddings[[self.index[text] for text in texts]]
+        if device is not None:
+            embeddings = embeddings.to(device)
+        if not convert_to_tensor:
+            embeddings = embeddings.cpu().numpy()
+        return embeddings[0] if single else embeddings
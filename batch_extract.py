@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(REPO_ROOT, "English"), os.path.join(REPO_ROOT, "Chinese")]
+from process_pdf_to_chapter import process_pdf_to_chapters
+from clean_texts_and_split import process_all_files
+from pdf_layout.pdf_backend import BACKENDS, DEFAULT_BACKEND
+from pdf_layout.catalog import DEFAULT_CATALOG_PATH, LANGUAGES, load_catalog, select_books
+from pdf_layout.page_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, PageLayoutCache, get_page_count, peak_rss_mb
+
+# ================= 設定區 =================
+# 每個 process 預估的峰值記憶體 (MB)，用來把 --memory-mb 換算成可同時執行的 process 數
+# (開啟逐頁釋放後單本約 70 MB，保留餘裕)
+PROCESS_MEMORY_MB = 256
+# 批次模式預設使用低記憶體模式，單一 process 的記憶體不隨書的頁數成長
+BATCH_PAGE_WINDOW = 50
+# 每個工作的完整 log 寫到這裡，終端機只印各書摘要
+LOG_DIR = os.path.join(REPO_ROOT, ".batch_logs")
+# =========================================
+
+def plan_budget(n_jobs, workers, memory_mb):
+    """
+    全域預算 -> (同時執行的工作數, 每個工作內部的 worker 數)
+    總 process 數 (工作數 x 內部 worker 數) 不超過 workers，也不超過 memory_mb / PROCESS_MEMORY_MB
+    """
+    max_processes = max(1, min(workers, int(memory_mb // PROCESS_MEMORY_MB)))
+    concurrent_jobs = max(1, min(n_jobs, max_processes))
+    return concurrent_jobs, max(1, max_processes // concurrent_jobs)
+
+def run_extraction_job(job):
+    """
+    子 process 入口：提取一本書的一個語言版本，log 導向 LOG_DIR
+    回傳: 摘要 dict (頁數、耗時、峰值 RSS)
+    """
+    logging.getLogger('pdfminer.pdffont').setLevel(logging.ERROR)
+    cache = PageLayoutCache(job["cache_dir"], job["cache_max_bytes"]) if job["cache_dir"] else None
+    edition = job["edition"]
+    os.makedirs(edition["output"], exist_ok=True)
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f"{job['book_id']}_{job['lang']}.log")
+
+    start_time = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        if job["lang"] == "en":
+            n_pages = process_pdf_to_chapters(edition["input"], edition["output"], workers=job["workers"], cache=cache,
+                                              use_profile=job["use_profile"], force=job["force"],
+                                              page_window=job["page_window"], backend=job["backend"])
+        else:
+            processed = process_all_files(edition["input"], edition["output"], workers=job["workers"], cache=cache,
+                                          use_profile=job["use_profile"], force=job["force"],
+                                          book_rules=edition["rules"], backend=job["backend"])
+            n_pages = sum(get_page_count(os.path.join(edition["input"], f), cache, backend=job["backend"])
+                          for f in processed)
+    elapsed = time.perf_counter() - start_time
+
+    own_rss, children_rss = peak_rss_mb()
+    return {
+        "book_id": job["book_id"],
+        "lang": job["lang"],
+        "pages": n_pages,
+        "seconds": elapsed,
+        "peak_rss_mb": max(own_rss, children_rss),
+        "log_path": log_path,
+    }
+
+def print_job_summary(result):
+    label = f"[{result['book_id']}/{result['lang']}]"
+    if result["pages"] == 0:
+        print(f"{label} 已是最新，跳過 ({result['seconds']:.1f} 秒)")
+        return
+    print(f"{label} {result['pages']} 頁，耗時 {result['seconds']:.1f} 秒 "
+          f"({result['pages'] / result['seconds']:.1f} pages/sec)，峰值 RSS {result['peak_rss_mb']:.0f} MB")
+
+def run_batch(books, langs=LANGUAGES, workers=1, memory_mb=4096, cache=None, use_profile=True, force=False,
+              page_window=BATCH_PAGE_WINDOW, backend=DEFAULT_BACKEND):
+    """
+    依書目批次提取：每本書的每個語言版本是一個工作，在全域 worker / 記憶體預算下同時執行
+    回傳: 各工作的摘要 dict list (依完成順序)
+    """
+    jobs = [
+        {"book_id": book["id"], "lang": lang, "edition": book["editions"][lang]}
+        for book in books for lang in langs if lang in book["editions"]
+    ]
+    if not jobs:
+        print("沒有需要處理的書籍")
+        return []
+
+    concurrent_jobs, job_workers = plan_budget(len(jobs), workers, memory_mb)
+    print(f"共 {len(jobs)} 個工作 ({len(books)} 本書)，同時執行 {concurrent_jobs} 個，每個工作 {job_workers} 個 worker "
+          f"(預算: {workers} workers / {memory_mb:.0f} MB)")
+
+    for job in jobs:
+        job.update({
+            "workers": job_workers,
+            "cache_dir": cache.cache_dir if cache else None,
+            "cache_max_bytes": cache.max_bytes if cache else None,
+            "use_profile": use_profile,
+            "force": force,
+            "page_window": page_window,
+            "backend": backend,
+        })
+
+    start_time = time.perf_counter()
+    results = []
+    # max_tasks_per_child=1：每個工作使用新的 process，峰值 RSS 才是這本書自己的
+    with ProcessPoolExecutor(max_workers=concurrent_jobs, max_tasks_per_child=1) as executor:
+        futures = [executor.submit(run_extraction_job, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            print_job_summary(result)
+            results.append(result)
+    wall_time = time.perf_counter() - start_time
+
+    total_pages = sum(r["pages"] for r in results)
+    print(f"\n全部完成：{total_pages} 頁，耗時 {wall_time:.1f} 秒 ({total_pages / wall_time:.1f} pages/sec)，"
+          f"log: {LOG_DIR}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="依 catalog.json 批次提取所有書籍的 EN / ZH 文字")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--books", nargs="*", help="只處理這些書籍 id (預設全部)")
+    parser.add_argument("--langs", nargs="*", default=list(LANGUAGES), choices=LANGUAGES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="全域 process 數上限")
+    parser.add_argument("--memory-mb", type=float,
+                        default=os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 2 / 2,
+                        help="全域記憶體預算 (預設為實體記憶體的一半)")
+    parser.add_argument("--page-window", type=int, default=BATCH_PAGE_WINDOW, help="EN 每 N 頁重新開啟一次 PDF")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS, help="PDF 解析方式")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="頁面幾何快取資料夾")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2)
+    parser.add_argument("--no-cache", action="store_true", help="不使用頁面快取，每次都重新解析 PDF")
+    parser.add_argument("--no-profile", action="store_true", help="不使用版面 profile")
+    parser.add_argument("--force", action="store_true", help="忽略 manifest，全部重新產生")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else PageLayoutCache(args.cache_dir, int(args.cache_max_mb * 1024 ** 2))
+    books = select_books(load_catalog(args.catalog), args.books)
+
+    run_batch(books, args.langs, workers=args.workers, memory_mb=args.memory_mb, cache=cache,
+              use_profile=not args.no_profile, force=args.force, page_window=args.page_window,
+              backend=args.backend)
@@ -0,0 +1,3 @@
+"""
+EN / ZH PDF 提取共用的版面工具
+"""
@@ -0,0 +1,158 @@
+import io
+import os
+import sys
+import glob
+import time
+import difflib
+import logging
+import argparse
+import contextlib
+
+import pdfplumber
+
+from pdf_layout import layout_engine
+from pdf_layout.page_cache import get_page_count
+from pdf_layout.pdf_backend import BACKENDS, CHAR_FIELDS, DEFAULT_BACKEND, WORD_FIELDS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO_ROOT, "English"), os.path.join(REPO_ROOT, "Chinese")]
+# 參數直接取自 English/ Chinese/ 兩支程式，benchmark 量的一定是實際使用的設定
+from process_pdf_to_chapter import CONTENT_WORD_PARAMS as EN_WORD_PARAMS, FONT_SIZE_THRESHOLD, iter_pdf_chapter_paragraphs
+from clean_texts_and_split import GAP_THRESHOLD, WORD_PARAMS as ZH_WORD_PARAMS, iter_chinese_paragraphs
+
+# 抑制 pdfminer.pdffont 的警告訊息
+logging.getLogger('pdfminer.pdffont').setLevel(logging.ERROR)
+
+# ================= 設定區 =================
+BOOK_DIR = os.path.join(REPO_ROOT, "BOOK")
+EN_PDF = os.path.join(BOOK_DIR, "PAUL CLEAVE_EN", "Trust_No_One.pdf")
+ZH_DIR = os.path.join(BOOK_DIR, "PAUL CLEAVE_ZH")
+# =========================================
+
+def load_pages(pdf_path, max_pages=None):
+    """先讓 pdfminer 解析完 page.chars，benchmark 只計算之後的版面分析時間"""
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[:max_pages]:
+            _ = page.chars
+            pages.append(page)
+        # pdf 關閉後 page.chars 仍保留在記憶體中
+    return pages
+
+def run_loops(pages, word_params, line_tolerance):
+    """原本的做法：get_chapter_header 掃一次 chars + extract_words 再掃一次 + Python 迴圈分行"""
+    results = []
+    for page in pages:
+        large_chars = [c for c in page.chars if c["size"] > FONT_SIZE_THRESHOLD]
+        header = "".join([c["text"] for c in large_chars]) if large_chars else None
+        words = page.extract_words(**word_params)
+        n_lines = 0
+        if words:
+            n_lines = 1
+            for prev, word in zip(words, words[1:]):
+                if abs(word['top'] - prev['top']) >= line_tolerance:
+                    n_lines += 1
+        results.append((header, [{f: w[f] for f in WORD_FIELDS} for w in words], n_lines))
+    return results
+
+def run_engine(pages, word_params, line_tolerance):
+    """layout_engine：每頁 chars 轉一次陣列，標題 / words / 行都以向量化運算完成"""
+    results = []
+    for page in pages:
+        chars = {field: [c[field] for c in page.chars] for field in CHAR_FIELDS}
+        arrays = layout_engine.chars_to_arrays(chars)
+        header, _ = layout_engine.find_header(arrays, FONT_SIZE_THRESHOLD)
+        words = layout_engine.extract_words(arrays, **word_params)
+        results.append((header, words, len(layout_engine.group_lines(words, line_tolerance))))
+    return results
+
+def bench_layout(label, pages, word_params, line_tolerance):
+    t0 = time.perf_counter()
+    expected = run_loops(pages, word_params, line_tolerance)
+    t_loops = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    actual = run_engine(pages, word_params, line_tolerance)
+    t_engine = time.perf_counter() - t0
+
+    mismatched = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    print(f"[{label}] {len(pages)} 頁 | 原始迴圈 {t_loops:.2f}s ({len(pages) / t_loops:.0f} pages/sec) | "
+          f"layout_engine {t_engine:.2f}s ({len(pages) / t_engine:.0f} pages/sec) | "
+          f"加速 {t_loops / t_engine:.2f}x | 不一致頁數 {len(mismatched)}")
+    if mismatched:
+        print(f"[{label}] 不一致頁碼: {mismatched[:20]}")
+
+def paragraph_match_rate(expected, actual):
+    """以 difflib 對齊兩份段落序列，回傳 (完全相同的段落數 / 基準段落數, 不同段落的範例)"""
+    matcher = difflib.SequenceMatcher(None, expected, actual, autojunk=False)
+    matched = sum(block.size for block in matcher.get_matching_blocks())
+    examples = [(expected[i1:i2], actual[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+    return matched / max(len(expected), 1), examples
+
+def run_backend(label, backend, extract):
+    """
+    不使用快取與 profile，完整跑一次提取 (PDF 解析 + 版面分析 + 分段)
+    extract: backend -> (頁數, 段落 list)
+    回傳: (段落 list, 耗時秒數)
+    """
+    t0 = time.perf_counter()
+    # 提取程式本身的進度訊息 (發現新章節...) 不印出
+    with contextlib.redirect_stdout(io.StringIO()):
+        n_pages, paragraphs = extract(backend)
+    elapsed = time.perf_counter() - t0
+    print(f"[{label}] {backend:<10} {n_pages} 頁 | {elapsed:.2f}s ({n_pages / elapsed:.1f} pages/sec) | "
+          f"{len(paragraphs)} 段")
+    return paragraphs, elapsed
+
+def bench_backends(label, extract, show_diffs=3):
+    """各 backend 的端對端速度，以及段落輸出與 DEFAULT_BACKEND 的一致率"""
+    expected, t_base = run_backend(label, DEFAULT_BACKEND, extract)
+    for backend in BACKENDS:
+        if backend == DEFAULT_BACKEND:
+            continue
+        actual, elapsed = run_backend(label, backend, extract)
+        rate, examples = paragraph_match_rate(expected, actual)
+        print(f"[{label}] {backend} 加速 {t_base / elapsed:.2f}x | 段落一致率 {rate:.2%} "
+              f"({len(examples)} 處不同)")
+        for old, new in examples[:show_diffs]:
+            print(f"    {DEFAULT_BACKEND}: {[p[:60] for p in old]}")
+            print(f"    {backend}: {[p[:60] for p in new]}")
+
+def extract_en(backend):
+    """English/process_pdf_to_chapter.py 的段落 (含章節 id)"""
+    events = list(iter_pdf_chapter_paragraphs(EN_PDF, use_profile=False, backend=backend))
+    return get_page_count(EN_PDF, backend=backend), events
+
+def extract_zh(backend, max_files=None):
+    """Chinese/clean_texts_and_split.py 的段落 (未套用特殊檔案 / 去除開頭段落規則)"""
+    n_pages, paragraphs = 0, []
+    for path in sorted(glob.glob(os.path.join(ZH_DIR, "*.pdf")))[:max_files]:
+        n_pages += get_page_count(path, backend=backend)
+        chapter = os.path.splitext(os.path.basename(path))[0]
+        paragraphs.extend((chapter, p) for p in iter_chinese_paragraphs(path, GAP_THRESHOLD, backend=backend))
+    return n_pages, paragraphs
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 版面分析 benchmark")
+    parser.add_argument("--max-pages", type=int, default=None, help="每本最多測試的頁數")
+    parser.add_argument("--backends", action="store_true",
+                        help=f"改為比較 PDF backend ({', '.join(BACKENDS)}) 的端對端速度與段落一致率")
+    parser.add_argument("--max-files", type=int, default=None, help="--backends 時 ZH 最多測試的檔案數")
+    args = parser.parse_args()
+
+    if args.backends:
+        bench_backends("EN", extract_en)
+        bench_backends("ZH", lambda backend: extract_zh(backend, args.max_files))
+        return
+
+    print("解析 PDF 中 (不計入 benchmark 時間)...")
+    en_pages = load_pages(EN_PDF, args.max_pages)
+    zh_pages = []
+    for path in sorted(glob.glob(os.path.join(ZH_DIR, "*.pdf"))):
+        zh_pages.extend(load_pages(path, args.max_pages))
+
+    bench_layout("EN", en_pages, EN_WORD_PARAMS, 10)
+    bench_layout("ZH", zh_pages, ZH_WORD_PARAMS, 5)
+
+if __name__ == "__main__":
+    main()
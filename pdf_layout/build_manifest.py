@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+
+# ================= 設定區 =================
+# manifest 存放於各輸出資料夾 (output_text_EN / output_text_ZH) 內
+MANIFEST_NAME = "manifest.json"
+# manifest 格式版本，欄位有變動時要 +1，舊 manifest 視為不存在 (全部重建)
+MANIFEST_VERSION = 1
+# =========================================
+
+def rules_digest(rules):
+    """規則 / 參數 dict -> 穩定的短 hash"""
+    text = json.dumps(rules, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+class BuildManifest:
+    """
+    記錄每個輸出檔由哪個輸入 (內容 hash)、哪組規則、哪個版本的提取程式產生，
+    重跑時輸入與規則都沒變、輸出檔也還在的項目即可跳過。
+    entries: key -> {"input": 輸入 hash, "rules": 規則 hash, "extractor": 提取程式版本,
+                     "outputs": {輸出檔名: 內容 hash}}
+    """
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == MANIFEST_VERSION:
+            self.entries = data.get("entries", {})
+
+    def is_up_to_date(self, key, input_hash, rules, extractor_version):
+        """輸入、規則、提取程式版本都相同，且上次的輸出檔都還在"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if (entry["input"], entry["rules"], entry["extractor"]) != (input_hash, rules_digest(rules), extractor_version):
+            return False
+        return all(os.path.exists(os.path.join(self.output_dir, name)) for name in entry["outputs"])
+
+    def output_digests(self, key):
+        """上次產生的 {輸出檔名: 內容 hash}，沒有紀錄回傳空 dict"""
+        entry = self.entries.get(key)
+        return dict(entry["outputs"]) if entry else {}
+
+    def record(self, key, input_hash, rules, extractor_version, outputs):
+        self.entries[key] = {
+            "input": input_hash,
+            "rules": rules_digest(rules),
+            "extractor": extractor_version,
+            "outputs": dict(outputs),
+        }
+
+    def prune(self, keys):
+        """移除不在 keys 中的項目 (輸入檔已刪除或改名)"""
+        for key in set(self.entries) - set(keys):
+            del self.entries[key]
+
+    def save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+def write_if_changed(path, chunks, previous_digest=None):
+    """
+    將文字逐段寫入暫存檔並同時計算內容 hash (串流，不需要整份內容留在記憶體)：
+    - 內容與 previous_digest 相同且原檔還在 -> 丟棄暫存檔，原檔 (含 mtime) 不變
+    - 否則以 rename 取代原檔，中斷時不會留下寫到一半的輸出
+    回傳: (內容 hash, 是否有寫入)
+    """
+    h = hashlib.sha1()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                h.update(chunk.encode("utf-8"))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    digest = h.hexdigest()
+    if digest == previous_digest and os.path.exists(path):
+        os.remove(tmp_path)
+        return digest, False
+    os.replace(tmp_path, path)
+    return digest, True
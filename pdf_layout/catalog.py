@@ -0,0 +1,85 @@
+import os
+import json
+
+# ================= 設定區 =================
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 書目檔：列出每本書的各語言版本、輸出位置與清理規則
+DEFAULT_CATALOG_PATH = os.path.join(REPO_ROOT, "catalog.json")
+# en: 單一 PDF，依章節標題切分 (English/process_pdf_to_chapter.py)
+# zh: 每章一個 PDF 的資料夾 (Chinese/clean_texts_and_split.py)
+LANGUAGES = ("en", "zh")
+# catalog 未指定的 ZH 規則：不做特殊內容替換、不去除開頭段落
+EMPTY_BOOK_RULES = {"special_content": {}, "skip_paragraphs": {}, "default_skip": 0}
+# =========================================
+
+def _resolve(base_dir, path):
+    """相對路徑以 catalog 檔所在資料夾為基準"""
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(base_dir, path))
+
+def load_catalog(path=DEFAULT_CATALOG_PATH):
+    """
+    讀取書目檔，路徑轉為絕對路徑並補上預設值，格式錯誤時丟出 ValueError。
+    回傳: list of book dict
+      {"id", "title", "chapters": [第一章, 最後一章] 或 None, "alignment_output",
+       "editions": {"en": {"input", "output"}, "zh": {"input", "output", "rules"}}}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    books = []
+    seen_ids = set()
+    for book in data.get("books", []):
+        book_id = book.get("id")
+        if not book_id:
+            raise ValueError(f"{path}: 每本書都需要 id")
+        if book_id in seen_ids:
+            raise ValueError(f"{path}: 書籍 id 重複: {book_id}")
+        seen_ids.add(book_id)
+
+        editions = {}
+        for lang, edition in book.get("editions", {}).items():
+            if lang not in LANGUAGES:
+                raise ValueError(f"{path}: [{book_id}] 不支援的語言版本 {lang} (支援: {', '.join(LANGUAGES)})")
+            if "input" not in edition or "output" not in edition:
+                raise ValueError(f"{path}: [{book_id}/{lang}] 需要 input 與 output")
+            edition = dict(edition)
+            edition["input"] = _resolve(base_dir, edition["input"])
+            edition["output"] = _resolve(base_dir, edition["output"])
+            if lang == "zh":
+                edition["rules"] = {**EMPTY_BOOK_RULES, **edition.get("rules", {})}
+            editions[lang] = edition
+
+        alignment_output = book.get("alignment_output", os.path.join("aligment", "pairs_sentence", book_id))
+        books.append({
+            "id": book_id,
+            "title": book.get("title", book_id),
+            "chapters": book.get("chapters"),
+            "alignment_output": _resolve(base_dir, alignment_output),
+            "editions": editions,
+        })
+    return books
+
+def select_books(books, book_ids=None):
+    """依 id 篩選書籍 (None 代表全部)，找不到的 id 丟出 ValueError"""
+    if not book_ids:
+        return books
+    known = {book["id"] for book in books}
+    unknown = [book_id for book_id in book_ids if book_id not in known]
+    if unknown:
+        raise ValueError(f"catalog 中沒有這些書籍: {', '.join(unknown)}")
+    return [book for book in books if book["id"] in book_ids]
+
+def chapter_numbers(book):
+    """catalog 的 chapters [第一章, 最後一章] -> range，未指定回傳 None (由檔名推得)"""
+    if not book["chapters"]:
+        return None
+    first, last = book["chapters"]
+    return range(first, last + 1)
+
+def zh_rules(book_id, path=DEFAULT_CATALOG_PATH):
+    """catalog 中一本書的 ZH 清理規則 (唯一的來源；未指定的項目為 EMPTY_BOOK_RULES)，沒有 ZH 版本時丟出 ValueError"""
+    book = select_books(load_catalog(path), [book_id])[0]
+    if "zh" not in book["editions"]:
+        raise ValueError(f"catalog 中 [{book_id}] 沒有 ZH 版本")
+    return book["editions"]["zh"]["rules"]
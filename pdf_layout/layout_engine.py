@@ -0,0 +1,155 @@
+import numpy as np
+
+# 與 pdfplumber.utils.text.LIGATURES 相同，確保輸出文字一致
+LIGATURES = {
+    "ﬀ": "ff",
+    "ﬃ": "ffi",
+    "ﬄ": "ffl",
+    "ﬁ": "fi",
+    "ﬂ": "fl",
+    "ﬆ": "st",
+    "ﬅ": "st",
+}
+
+def chars_to_arrays(chars):
+    """
+    頁面字元 (欄位格式 {'text': [...], 'x0': [...], ...}) -> NumPy 陣列
+    每頁只轉換一次，之後標題、words、行的判斷都在陣列上完成
+    """
+    return {
+        "text": chars["text"],
+        "x0": np.asarray(chars["x0"], dtype=np.float64),
+        "x1": np.asarray(chars["x1"], dtype=np.float64),
+        "top": np.asarray(chars["top"], dtype=np.float64),
+        "bottom": np.asarray(chars["bottom"], dtype=np.float64),
+        "size": np.asarray(chars["size"], dtype=np.float64),
+        "upright": np.asarray(chars["upright"], dtype=bool),
+    }
+
+def find_header(arrays, size_threshold):
+    """
+    找出字體大於 size_threshold 的字元 (依原始順序)
+    回傳: (標題原始文字, 標題底端Y座標)，沒有則回傳 (None, 0)
+    """
+    large = np.flatnonzero(arrays["size"] > size_threshold)
+    if large.size == 0:
+        return None, 0
+    text = arrays["text"]
+    header_text = "".join([text[i] for i in large])
+    return header_text, float(arrays["bottom"][large].max())
+
+def _cluster_ids(values, tolerance):
+    """
+    與 pdfplumber cluster_objects 相同的一維分群：
+    排序後相鄰 (去重後) 值差距 <= tolerance 即屬同一群
+    """
+    uniq = np.unique(values)
+    if tolerance == 0:
+        return np.searchsorted(uniq, values)
+    # 寫成 x > last + tolerance (而非 x - last > tolerance)，浮點數結果才與 pdfplumber 一致
+    group_of_uniq = np.concatenate(([0], np.cumsum(uniq[1:] > uniq[:-1] + tolerance)))
+    return group_of_uniq[np.searchsorted(uniq, values)]
+
+def _words_from_run(arrays, idx, x_tolerance, y_tolerance, keep_blank_chars, upright):
+    """
+    處理一段 upright 值相同的連續字元 (idx 為原始索引)
+    直書 (upright=False) 依 pdfplumber 預設：依 x0 分行，行內由上而下
+    """
+    text = arrays["text"]
+    x0 = arrays["x0"][idx]
+    x1 = arrays["x1"][idx]
+    top = arrays["top"][idx]
+    bottom = arrays["bottom"][idx]
+
+    if upright:
+        # 行方向 ttb / 字方向 ltr
+        line_key, line_tol = top, y_tolerance
+        sort_keys = (x0,)
+        a, b, c, intra_tol, inter_tol = x0, x1, top, x_tolerance, y_tolerance
+    else:
+        # 行方向 ltr / 字方向 ttb，x/y 容忍值互換
+        line_key, line_tol = x0, x_tolerance
+        sort_keys = (bottom, top)
+        a, b, c, intra_tol, inter_tol = top, bottom, x0, y_tolerance, x_tolerance
+
+    # 1. 分行，行內排序 (lexsort 為穩定排序，與 pdfplumber 的 sorted 結果相同)
+    line_id = _cluster_ids(line_key, line_tol)
+    order = np.lexsort(sort_keys + (line_id,))
+    x0, x1, top, bottom, line_id = x0[order], x1[order], top[order], bottom[order], line_id[order]
+    a, b, c = a[order], b[order], c[order]
+    chars_text = [text[i] or "" for i in idx[order]]
+
+    if keep_blank_chars:
+        is_space = np.zeros(len(chars_text), dtype=bool)
+    else:
+        is_space = np.fromiter((t.isspace() for t in chars_text), dtype=bool, count=len(chars_text))
+
+    # 2. 與前一個字元比較，決定是否開始新 word (同 WordExtractor.char_begins_new_word)
+    starts = np.ones(len(chars_text), dtype=bool)
+    if len(chars_text) > 1:
+        starts[1:] = (
+            (line_id[1:] != line_id[:-1])
+            | is_space[:-1]                                  # 前一個是空白 -> current_word 已清空
+            | (a[1:] < a[:-1])                               # intraline: cx < ax
+            | (a[1:] > b[:-1] + intra_tol)                   # intraline: cx > bx + x
+            | (np.abs(c[1:] - c[:-1]) > inter_tol)           # interline
+        )
+
+    keep = ~is_space
+    if not keep.any():
+        return []
+    word_id = np.cumsum(starts & keep)[keep]
+    x0, x1, top, bottom = x0[keep], x1[keep], top[keep], bottom[keep]
+    kept_text = [t for t, k in zip(chars_text, keep) if k]
+
+    # 3. 以 reduceat 計算每個 word 的外框
+    bounds = np.flatnonzero(np.diff(word_id)) + 1
+    seg_starts = np.concatenate(([0], bounds))
+    seg_ends = np.concatenate((bounds, [len(kept_text)]))
+    w_x0 = np.minimum.reduceat(x0, seg_starts).tolist()
+    w_x1 = np.maximum.reduceat(x1, seg_starts).tolist()
+    w_top = np.minimum.reduceat(top, seg_starts).tolist()
+    w_bottom = np.maximum.reduceat(bottom, seg_starts).tolist()
+
+    words = []
+    for k, (s, e) in enumerate(zip(seg_starts.tolist(), seg_ends.tolist())):
+        words.append({
+            "text": "".join([LIGATURES.get(t, t) for t in kept_text[s:e]]),
+            "x0": w_x0[k],
+            "x1": w_x1[k],
+            "top": w_top[k],
+            "bottom": w_bottom[k],
+        })
+    return words
+
+def extract_words(arrays, x_tolerance=3, y_tolerance=3, keep_blank_chars=False):
+    """
+    向量化版的 page.extract_words()，只支援本專案用到的參數，
+    輸出欄位為 text / x0 / x1 / top / bottom，數值與 pdfplumber 完全相同。
+    """
+    n = len(arrays["text"])
+    if n == 0:
+        return []
+
+    # pdfplumber 先依 upright 將「連續」字元分組 (itertools.groupby)
+    upright = arrays["upright"]
+    run_bounds = np.flatnonzero(upright[1:] != upright[:-1]) + 1
+    run_starts = np.concatenate(([0], run_bounds))
+    run_ends = np.concatenate((run_bounds, [n]))
+
+    words = []
+    for s, e in zip(run_starts.tolist(), run_ends.tolist()):
+        words.extend(_words_from_run(arrays, np.arange(s, e), x_tolerance, y_tolerance,
+                                     keep_blank_chars, bool(upright[s])))
+    return words
+
+def group_lines(words, tolerance):
+    """
+    依序比較相鄰 word 的 top，差距 >= tolerance 即換行
+    回傳: list of (start, end) 索引區間 (words[start:end] 為同一行)
+    """
+    if not words:
+        return []
+    top = np.fromiter((w["top"] for w in words), dtype=np.float64, count=len(words))
+    breaks = (np.flatnonzero(np.abs(np.diff(top)) >= tolerance) + 1).tolist()
+    return list(zip([0] + breaks, breaks + [len(words)]))
@@ -0,0 +1,137 @@
+import os
+import json
+import hashlib
+from collections import Counter
+
+from pdf_layout import layout_engine
+from pdf_layout.pdf_backend import DEFAULT_BACKEND
+
+# ================= 設定區 =================
+# 每本 PDF 的版面 profile 存放位置：專案根目錄下的 .layout_profiles/
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".layout_profiles")
+PROFILE_VERSION = 1
+# 直方圖的分箱寬度
+FONT_SIZE_BIN = 0.1
+LINE_GAP_BIN = 0.5
+# =========================================
+
+def _bin(value, width):
+    return round(round(value / width) * width, 3)
+
+class LayoutProfiler:
+    """
+    在主流程逐頁處理時順便累積版面直方圖 (字體大小、行首 x0、行距)，
+    不需要另外掃描 PDF；結束後由 derive() 推算閾值。
+    """
+    def __init__(self, line_tolerance):
+        self.line_tolerance = line_tolerance
+        self.font_sizes = Counter()    # 字體大小 -> 字元數
+        self.left_margins = Counter()  # 行首 x0 (取整數) -> 行數
+        self.line_gaps = Counter()     # 同頁相鄰兩行的間距 -> 次數
+        self.n_pages = 0
+
+    def add_page(self, geometry):
+        self.n_pages += 1
+        self.font_sizes.update(_bin(size, FONT_SIZE_BIN) for size in geometry["chars"]["size"])
+
+        words = geometry["words"]
+        prev_bottom = None
+        for start, end in layout_engine.group_lines(words, self.line_tolerance):
+            line = words[start:end]
+            self.left_margins[int(line[0]["x0"])] += 1
+            line_top = min(w["top"] for w in line)
+            if prev_bottom is not None:
+                self.line_gaps[_bin(line_top - prev_bottom, LINE_GAP_BIN)] += 1
+            prev_bottom = max(w["bottom"] for w in line)
+
+    def merge(self, other):
+        """合併另一個 profiler (平行 worker 各自累積的結果)"""
+        self.font_sizes.update(other.font_sizes)
+        self.left_margins.update(other.left_margins)
+        self.line_gaps.update(other.line_gaps)
+        self.n_pages += other.n_pages
+        return self
+
+    def to_dict(self):
+        return {
+            "version": PROFILE_VERSION,
+            "line_tolerance": self.line_tolerance,
+            "n_pages": self.n_pages,
+            "font_sizes": {str(k): v for k, v in self.font_sizes.items()},
+            "left_margins": {str(k): v for k, v in self.left_margins.items()},
+            "line_gaps": {str(k): v for k, v in self.line_gaps.items()},
+            "derived": self.derive(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        profiler = cls(data["line_tolerance"])
+        profiler.n_pages = data["n_pages"]
+        profiler.font_sizes = Counter({float(k): v for k, v in data["font_sizes"].items()})
+        profiler.left_margins = Counter({int(k): v for k, v in data["left_margins"].items()})
+        profiler.line_gaps = Counter({float(k): v for k, v in data["line_gaps"].items()})
+        return profiler
+
+    def derive(self):
+        """
+        由直方圖推算閾值，資料不足的項目回傳 None
+        - body_font_size: 字元數最多的字體大小 (內文)
+        - font_size_threshold: 內文與下一個較大字體的中點，大於它視為章節標題
+        - left_margin: 最常見的行首 x0
+        - line_gap / paragraph_gap: 行距眾數 / 大於 2 倍行距的間距眾數
+        - gap_threshold: 兩者中點，大於它視為新段落
+        """
+        derived = {
+            "body_font_size": None, "font_size_threshold": None, "left_margin": None,
+            "line_gap": None, "paragraph_gap": None, "gap_threshold": None,
+        }
+
+        if self.font_sizes:
+            body = self.font_sizes.most_common(1)[0][0]
+            larger = [size for size in self.font_sizes if size > body + 0.5]
+            derived["body_font_size"] = body
+            derived["font_size_threshold"] = round((body + min(larger)) / 2, 3) if larger else body + 1
+
+        if self.left_margins:
+            derived["left_margin"] = self.left_margins.most_common(1)[0][0]
+
+        positive_gaps = Counter({gap: n for gap, n in self.line_gaps.items() if gap > 0})
+        if positive_gaps:
+            line_gap = positive_gaps.most_common(1)[0][0]
+            paragraph_gaps = Counter({gap: n for gap, n in positive_gaps.items() if gap > 2 * line_gap})
+            derived["line_gap"] = line_gap
+            if paragraph_gaps:
+                paragraph_gap = paragraph_gaps.most_common(1)[0][0]
+                derived["paragraph_gap"] = paragraph_gap
+                derived["gap_threshold"] = round((line_gap + paragraph_gap) / 2, 3)
+            else:
+                derived["gap_threshold"] = 2 * line_gap
+
+        return derived
+
+def _profile_path(profile_dir, pdf_hash, word_params, backend=DEFAULT_BACKEND):
+    # 不同 backend 的座標略有差異 (例如左邊界取整數後可能差 1)，profile 分開存放；
+    # 預設 backend 不寫入 key，既有 profile 仍然有效
+    key = word_params if backend == DEFAULT_BACKEND else {"words": word_params, "backend": backend}
+    params = json.dumps(key, sort_keys=True)
+    params_key = hashlib.sha1(params.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(profile_dir, f"{pdf_hash[:16]}_{params_key}.json")
+
+def load_profile(pdf_hash, word_params, profile_dir=DEFAULT_PROFILE_DIR, backend=DEFAULT_BACKEND):
+    """讀取已儲存的 profile，沒有 (或版本不符) 回傳 None"""
+    try:
+        with open(_profile_path(profile_dir, pdf_hash, word_params, backend), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != PROFILE_VERSION:
+        return None
+    return LayoutProfiler.from_dict(data)
+
+def save_profile(pdf_hash, word_params, profiler, profile_dir=DEFAULT_PROFILE_DIR, backend=DEFAULT_BACKEND):
+    os.makedirs(profile_dir, exist_ok=True)
+    path = _profile_path(profile_dir, pdf_hash, word_params, backend)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profiler.to_dict(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
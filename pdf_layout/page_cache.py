@@ -0,0 +1,249 @@
+import os
+import json
+import pickle
+import hashlib
+import argparse
+import resource
+import sys
+
+from pdf_layout.pdf_backend import DEFAULT_BACKEND, open_backend
+
+# ================= 設定區 =================
+# 預設快取位置：專案根目錄下的 .page_cache/
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".page_cache")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+# 快取內容格式版本，欄位有變動時要 +1，舊快取會自動失效
+CACHE_FORMAT_VERSION = 2
+# words 的產生方式: "numpy" (pdf_layout.layout_engine) 或 "pdfplumber" (page.extract_words，只適用 pdfplumber backend)
+DEFAULT_ENGINE = "numpy"
+# =========================================
+
+def file_sha256(path, chunk_size=1 << 20):
+    """計算檔案內容的 sha256 (快取以內容而非路徑為 key)"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _params_key(word_params, engine, backend=DEFAULT_BACKEND):
+    """extract_words 參數 -> 穩定的短 hash"""
+    params = {"v": CACHE_FORMAT_VERSION, "words": word_params, "engine": engine}
+    # 預設 backend 不寫入 key，加入 backend 選項前建立的快取仍然有效
+    if backend != DEFAULT_BACKEND:
+        params["backend"] = backend
+    text = json.dumps(params, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+class PageLayoutCache:
+    """
+    以 (PDF 內容 hash, 頁碼, extract_words 參數) 為 key 的頁面幾何磁碟快取。
+    超過 max_bytes 時依最近使用時間 (mtime) 淘汰最舊的頁面。
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _page_path(self, pdf_hash, page_index, word_params, engine, backend):
+        params_key = _params_key(word_params, engine, backend)
+        return os.path.join(self.cache_dir, pdf_hash[:16], f"p{page_index:05d}_{params_key}.pkl")
+
+    def _meta_path(self, pdf_hash):
+        return os.path.join(self.cache_dir, pdf_hash[:16], "meta.json")
+
+    def _write_atomic(self, path, data):
+        # 先寫暫存檔再 rename，多個 process 同時寫入也不會讀到半個檔案
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get_page_count(self, pdf_hash):
+        """回傳快取中記錄的頁數，沒有記錄則回傳 None"""
+        try:
+            with open(self._meta_path(pdf_hash), "r", encoding="utf-8") as f:
+                return json.load(f)["n_pages"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set_page_count(self, pdf_hash, n_pages):
+        self._write_atomic(self._meta_path(pdf_hash), json.dumps({"n_pages": n_pages}).encode("utf-8"))
+
+    def get(self, pdf_hash, page_index, word_params, engine=DEFAULT_ENGINE, backend=DEFAULT_BACKEND):
+        path = self._page_path(pdf_hash, page_index, word_params, engine, backend)
+        try:
+            with open(path, "rb") as f:
+                geometry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return None
+        # 更新 mtime 作為 LRU 的使用時間
+        os.utime(path)
+        self.hits += 1
+        return geometry
+
+    def put(self, pdf_hash, page_index, word_params, geometry, engine=DEFAULT_ENGINE, backend=DEFAULT_BACKEND):
+        path = self._page_path(pdf_hash, page_index, word_params, engine, backend)
+        self._write_atomic(path, pickle.dumps(geometry, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _entries(self):
+        """列出所有頁面快取檔: [(mtime, size, path)]"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".pkl"):
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """總大小超過 max_bytes 時，從最久沒用到的頁面開始刪除"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def print_stats(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        n_books = len({os.path.dirname(path) for _, _, path in entries})
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        print(f"[page cache] {self.cache_dir}")
+        print(f"[page cache] 命中 {self.hits} / 未命中 {self.misses} (命中率 {hit_rate:.1f}%)，淘汰 {self.evictions} 頁")
+        print(f"[page cache] {len(entries)} 頁 / {n_books} 本 PDF，"
+              f"{total / 1024 ** 2:.1f} MB / 上限 {self.max_bytes / 1024 ** 2:.0f} MB")
+
+class _PageSource:
+    """
+    依需要開啟 PDF (pdf_backend) 並提取單頁幾何，backend 提取完立即釋放該頁的 chars / layout 快取。
+    page_window 有給時每 page_window 頁重新開啟一次 PDF (只建立該區間的頁面)，
+    連 pdfminer 文件層累積的物件 / 串流快取也一併釋放，記憶體上限與總頁數無關。
+    """
+    def __init__(self, pdf_path, page_window=None, backend=DEFAULT_BACKEND):
+        self.pdf_path = pdf_path
+        self.page_window = page_window
+        self.backend = backend
+        self.pdf = None
+        self.window_start = None
+
+    def _open(self, window_start):
+        self.close()
+        if self.page_window:
+            page_indices = range(window_start, window_start + self.page_window)
+            self.pdf = open_backend(self.backend, self.pdf_path, page_indices)
+        else:
+            self.pdf = open_backend(self.backend, self.pdf_path)
+        self.window_start = window_start
+
+    def n_pages(self):
+        if self.page_window:
+            return get_page_count(self.pdf_path, backend=self.backend)
+        if self.pdf is None:
+            self._open(0)
+        return self.pdf.n_pages()
+
+    def extract(self, page_index, word_params, engine=DEFAULT_ENGINE):
+        window_start = page_index - page_index % self.page_window if self.page_window else 0
+        if self.pdf is None or window_start != self.window_start:
+            self._open(window_start)
+        return self.pdf.page_geometry(page_index, word_params, engine)
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.close()
+            self.pdf = None
+
+def iter_page_geometry(pdf_path, word_params, cache=None, pages=None, pdf_hash=None, engine=DEFAULT_ENGINE,
+                       page_window=None, backend=DEFAULT_BACKEND):
+    """
+    依頁序 yield (頁碼, 頁面幾何)。
+    cache 命中時不需要開啟 PDF，全部命中則完全跳過 PDF 解析。
+    pages: 要處理的頁碼 range/list，None 代表全部
+    page_window: 低記憶體模式，每 page_window 頁重新開啟 PDF (見 _PageSource)
+    backend: PDF 解析方式 (見 pdf_backend.BACKENDS)，不同 backend 的快取分開存放
+    """
+    source = _PageSource(pdf_path, page_window, backend)
+    try:
+        if cache is None:
+            indices = range(source.n_pages()) if pages is None else pages
+            for i in indices:
+                yield i, source.extract(i, word_params, engine)
+            return
+
+        pdf_hash = pdf_hash or file_sha256(pdf_path)
+        n_pages = cache.get_page_count(pdf_hash)
+        if n_pages is None:
+            n_pages = source.n_pages()
+            cache.set_page_count(pdf_hash, n_pages)
+
+        indices = range(n_pages) if pages is None else pages
+        for i in indices:
+            geometry = cache.get(pdf_hash, i, word_params, engine, backend)
+            if geometry is None:
+                # 未命中才開啟 PDF (整份檔案只開一次)
+                geometry = source.extract(i, word_params, engine)
+                cache.put(pdf_hash, i, word_params, geometry, engine, backend)
+            yield i, geometry
+    finally:
+        source.close()
+
+def get_page_count(pdf_path, cache=None, pdf_hash=None, backend=DEFAULT_BACKEND):
+    """取得 PDF 頁數，快取有記錄時不開啟 PDF"""
+    if cache is not None:
+        pdf_hash = pdf_hash or file_sha256(pdf_path)
+        n_pages = cache.get_page_count(pdf_hash)
+        if n_pages is not None:
+            return n_pages
+    pdf = open_backend(backend, pdf_path)
+    try:
+        n_pages = pdf.n_pages()
+    finally:
+        pdf.close()
+    if cache is not None:
+        cache.set_page_count(pdf_hash, n_pages)
+    return n_pages
+
+def peak_rss_mb():
+    """
+    回傳 (本 process 峰值 RSS, 已結束子 process 中最大的峰值 RSS)，單位 MB
+    ru_maxrss 在 Linux 為 KB、macOS 為 bytes
+    """
+    scale = 1024 ** 2 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+def print_peak_rss(label, with_workers=False):
+    own, children = peak_rss_mb()
+    line = f"[memory] {label} 峰值 RSS: {own:.0f} MB"
+    if with_workers:
+        line += f" (worker 最大 {children:.0f} MB)"
+    print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="頁面幾何快取統計 / 清理")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2)
+    parser.add_argument("--evict", action="store_true", help="依上限淘汰舊頁面")
+    args = parser.parse_args()
+
+    cache = PageLayoutCache(args.cache_dir, int(args.max_mb * 1024 ** 2))
+    if args.evict:
+        cache.evict()
+    cache.print_stats()
@@ -0,0 +1,126 @@
+import math
+import ctypes
+
+from pdf_layout import layout_engine
+
+# ================= 設定區 =================
+# "pdfplumber": pdfminer (純 Python)，原本的解析方式，輸出為基準
+# "pdfium": pypdfium2 的 text page API (C++)，解析速度快很多，words 一律由 layout_engine 算出
+BACKENDS = ("pdfplumber", "pdfium")
+DEFAULT_BACKEND = "pdfplumber"
+# 每個字元保留的幾何欄位
+CHAR_FIELDS = ("text", "x0", "x1", "top", "bottom", "size", "upright")
+WORD_FIELDS = ("text", "x0", "x1", "top", "bottom")
+# =========================================
+
+def geometry_from_chars(width, height, chars, word_params, engine="numpy"):
+    """欄位格式的 chars -> 頁面幾何 (words 由 layout_engine 算出)"""
+    if engine != "numpy":
+        raise ValueError(f"engine={engine} 只能搭配 pdfplumber backend")
+    return {
+        "width": width,
+        "height": height,
+        "chars": chars,
+        "words": layout_engine.extract_words(layout_engine.chars_to_arrays(chars), **word_params),
+    }
+
+class PdfplumberBackend:
+    """
+    pdfplumber / pdfminer。page_indices 有給時只建立這些頁面 (pdfplumber 的 pages 參數)，
+    每頁提取完立即 page.close() 釋放 chars / layout 快取。
+    """
+    name = "pdfplumber"
+
+    def __init__(self, pdf_path, page_indices=None):
+        import pdfplumber
+        if page_indices is None:
+            self.pdf = pdfplumber.open(pdf_path)
+            self.first_index = 0
+        else:
+            # pdfplumber 的 pages 參數為 1-based 頁碼
+            self.pdf = pdfplumber.open(pdf_path, pages=[i + 1 for i in page_indices])
+            self.first_index = page_indices[0]
+
+    def n_pages(self):
+        return len(self.pdf.pages)
+
+    def page_geometry(self, page_index, word_params, engine="numpy"):
+        page = self.pdf.pages[page_index - self.first_index]
+        chars = {field: [c[field] for c in page.chars] for field in CHAR_FIELDS}
+        if engine == "numpy":
+            geometry = geometry_from_chars(page.width, page.height, chars, word_params)
+        else:
+            words = [{field: w[field] for field in WORD_FIELDS} for w in page.extract_words(**word_params)]
+            geometry = {"width": page.width, "height": page.height, "chars": chars, "words": words}
+        page.close()
+        return geometry
+
+    def close(self):
+        self.pdf.close()
+
+class PdfiumBackend:
+    """
+    pypdfium2 text page。字元座標換算成與 pdfminer 相同的定義：
+    - x0 / x1 / bottom 取 loose char box (依字型 ascent / descent，與 pdfminer 的字元框相同)
+    - size = 字型大小 x 文字矩陣的縮放，top = bottom - size
+    - 略過 pdfium 自行產生的換行字元 (\\r \\n)；產生的空白保留 (只影響斷字，不會寫入 words)，
+      其字元框為 0，大小沿用前一個字元，才會與前後文字分在同一行
+    - 行尾斷字的連字號 pdfium 回傳 U+0002，還原為 "-"
+    pdfium 以 float32 計算、字寬也可能與 pdfminer 略有不同，x 座標可能差到 0.3 左右，
+    段落結果與 pdfplumber 的一致率見 pdf_layout/benchmark.py --backends。
+    """
+    name = "pdfium"
+
+    def __init__(self, pdf_path, page_indices=None):
+        import pypdfium2
+        # 直接從路徑開啟，頁面按需載入，不需要依 page_indices 分段
+        self.doc = pypdfium2.PdfDocument(pdf_path)
+
+    def n_pages(self):
+        return len(self.doc)
+
+    def page_geometry(self, page_index, word_params, engine="numpy"):
+        import pypdfium2.raw as pdfium_c
+
+        page = self.doc[page_index]
+        textpage = page.get_textpage()
+        width, height = page.get_width(), page.get_height()
+        chars = {field: [] for field in CHAR_FIELDS}
+        matrix = pdfium_c.FS_MATRIX()
+        size = 0
+        try:
+            for i in range(textpage.count_chars()):
+                text = chr(pdfium_c.FPDFText_GetUnicode(textpage, i))
+                generated = pdfium_c.FPDFText_IsGenerated(textpage, i) == 1
+                if generated and text in "\r\n":
+                    continue
+                if text == "\x02":
+                    text = "-"
+                left, bottom, right, _ = textpage.get_charbox(i, loose=True)
+                pdfium_c.FPDFText_GetMatrix(textpage, i, ctypes.byref(matrix))
+                upright = matrix.a * matrix.d > 0 and matrix.b * matrix.c <= 0
+                if not generated:
+                    scale = math.hypot(matrix.c, matrix.d) if upright else math.hypot(matrix.a, matrix.b)
+                    size = pdfium_c.FPDFText_GetFontSize(textpage, i) * scale
+                chars["text"].append(text)
+                chars["x0"].append(left)
+                chars["x1"].append(right)
+                chars["top"].append(height - bottom - size)
+                chars["bottom"].append(height - bottom)
+                chars["size"].append(size)
+                chars["upright"].append(upright)
+        finally:
+            textpage.close()
+            page.close()
+        return geometry_from_chars(width, height, chars, word_params, engine)
+
+    def close(self):
+        self.doc.close()
+
+def open_backend(name, pdf_path, page_indices=None):
+    """依名稱開啟 PDF backend，page_indices 為要處理的頁碼 (0-based，None 代表全部)"""
+    if name == "pdfplumber":
+        return PdfplumberBackend(pdf_path, page_indices)
+    if name == "pdfium":
+        return PdfiumBackend(pdf_path, page_indices)
+    raise ValueError(f"未知的 PDF backend: {name} (可用: {', '.join(BACKENDS)})")